@@ -13,11 +13,22 @@
       To receive:
         $stop: it will stop experiment
         $status: it asks for the current state (VARIABLES)
+        $binary: it asks to use binary frames instead of JSON lines
 
       To send: 
         $recived -> it notifies the data were recived
         $status, ok -> response status of the system is ok
         $status, error:msg  -> response system has some error
+        $binary,ok -> binary frames will be used from now on
+        $error,line too long -> a line didn't fit on the serial buffer, it was dropped
+
+    Binary frames (see utils/serialprotocol.py):
+      0xFE | COBS(kind, body..., crc16) XOR 0x0A | '\n'
+      kind 0x01 variables: fields (type << 6 | index) + value, type 0 bool, 1 int32, 2 float32.
+      kind 0x02 event: ASCII text, the same events without the '$'.
+
+    Variables could carry a sequence number ("seq" on JSON, the field 63 on frames),
+    then they are acknowledged with $received,<seq>.
 */
 
 #include <ArduinoJson.h>
@@ -38,6 +49,28 @@ String serialMessage = "";
 String event = "";
 bool serialMessageReceived = false; 
 
+/* ===============================  VARIABLES FOR BINARY FRAMES  ============================= */
+
+const uint8_t FRAME_MARKER = 0xFE;
+const uint8_t FRAME_VARIABLES = 0x01;
+const uint8_t FRAME_EVENT = 0x02;
+const uint8_t TYPE_BOOL = 0;
+const uint8_t TYPE_INT = 1;
+const uint8_t TYPE_FLOAT = 2;
+
+// Variable indexes, the same order of the "schema" on settings.py
+const uint8_t VAR_PLAY = 0;
+const uint8_t VAR_DIRECTION = 1;
+const uint8_t VAR_SPEED = 2;
+const uint8_t VAR_SEQ = 63;
+
+// the largest message is a JSON line with every variable and the seq (~70 bytes)
+const int SERIAL_BUFFER_SIZE = 128;
+uint8_t serialBuffer[SERIAL_BUFFER_SIZE];
+int serialLength = 0;
+bool serialOverflow = false;
+bool binaryMode = false;
+
 /* ================================  VARIABLES FOR EXPERIMENT  ============================== */
 
 // INITIALIZE A JSON OBJECT -------------------<
@@ -100,9 +133,114 @@ void resetStopTimer(){
 /* ================================  SERIAL CALLBACKS / AUX FUNCTIONS =================================== */
 
 /*
-* It sends the control variables as JSON object thorugh the serial.
+* CRC-16/CCITT-FALSE of some bytes.
+*/
+uint16_t crc16(const uint8_t *data, int length){
+  uint16_t crc = 0xFFFF;
+  for(int i = 0; i < length; i++){
+    crc ^= (uint16_t) data[i] << 8;
+    for(int j = 0; j < 8; j++){
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+/*
+* Sends a payload as a frame: COBS encoded, masked with '\n' and ended by '\n'.
+*/
+void sendFrame(uint8_t *payload, int length){
+  uint16_t crc = crc16(payload, length);
+  payload[length++] = crc >> 8;
+  payload[length++] = crc & 0xFF;
+
+  Serial.write(FRAME_MARKER);
+  int start = 0;
+  while(start <= length){
+    int end = start;
+    while(end < length && payload[end] != 0 && end - start < 254){
+      end++;
+    }
+    Serial.write((uint8_t) ((end - start + 1) ^ '\n'));
+    for(int i = start; i < end; i++){
+      Serial.write(payload[i] ^ '\n');
+    }
+    if(end - start == 254 && end < length){
+      start = end;
+    }else{
+      start = end + 1;
+    }
+  }
+  Serial.write('\n');
+}
+
+/*
+* Decodes a received frame (without the marker and the '\n') on the same buffer.
+* Returns the payload length without the CRC, or -1 if the frame is corrupted.
+*/
+int decodeFrame(uint8_t *data, int length){
+  int out = 0;
+  int i = 0;
+  while(i < length){
+    uint8_t code = data[i] ^ '\n';
+    if(code == 0 || i + code > length){
+      return -1;
+    }
+    for(int j = 1; j < code; j++){
+      data[out++] = data[i + j] ^ '\n';
+    }
+    i += code;
+    if(code < 255 && i < length){
+      data[out++] = 0;
+    }
+  }
+  if(out < 3){
+    return -1;
+  }
+  uint16_t crc = ((uint16_t) data[out - 2] << 8) | data[out - 1];
+  if(crc != crc16(data, out - 2)){
+    return -1;
+  }
+  return out - 2;
+}
+
+/*
+* Sends an event (without the '$'), as a frame or as a line.
+*/
+void sendEvent(const char *text){
+  if(binaryMode){
+    uint8_t payload[48];
+    int length = 0;
+    payload[length++] = FRAME_EVENT;
+    while(*text && length < 45){
+      payload[length++] = *text++;
+    }
+    sendFrame(payload, length);
+  }else{
+    Serial.print('$');
+    Serial.println(text);
+  }
+}
+
+/*
+* It sends the control variables as JSON object thorugh the serial, or as a frame.
 */
 void sendControlVariables(){
+  if(binaryMode){
+    uint8_t payload[16];
+    int length = 0;
+    long speed = stepSpeed;
+    payload[length++] = FRAME_VARIABLES;
+    payload[length++] = TYPE_BOOL << 6 | VAR_PLAY;
+    payload[length++] = play;
+    payload[length++] = TYPE_BOOL << 6 | VAR_DIRECTION;
+    payload[length++] = direction;
+    payload[length++] = TYPE_INT << 6 | VAR_SPEED;
+    memcpy(payload + length, &speed, 4);
+    length += 4;
+    sendFrame(payload, length);
+    return;
+  }
   variables["play"] = play;
   variables["direction"] = direction;
   variables["speed"] = stepSpeed;
@@ -111,10 +249,83 @@ void sendControlVariables(){
 }
 
 /*
-* It notifies some data were received.
+* It notifies some data were received, with their sequence number if they had it.
+*/
+void notifyDataWereReceived(long seq){
+  if(seq < 0){
+    sendEvent("received");
+    return;
+  }
+  char text[24];
+  snprintf(text, sizeof(text), "received,%ld", seq);
+  sendEvent(text);
+}
+
+/*
+* Returns the size of the value of a field, by its type.
 */
-void notifyDataWereReceived(){
-  Serial.println("$received");
+int fieldSize(uint8_t field){
+  return (field >> 6) == TYPE_BOOL ? 1 : 4;
+}
+
+/*
+* It reads the control variables of a binary frame, only the fields on the frame are updated.
+* Frames with a truncated field are ignored.
+*/
+void readControlVariablesFrame(const uint8_t *body, int length){
+  for(int i = 0; i < length; i += 1 + fieldSize(body[i])){
+    if(i + 1 + fieldSize(body[i]) > length){
+      return;
+    }
+  }
+
+  long seq = -1;
+  int i = 0;
+  while(i < length){
+    uint8_t type = body[i] >> 6;
+    uint8_t index = body[i] & 0x3F;
+    float value = 0;
+    long number = 0;
+    if(type == TYPE_BOOL){
+      value = body[i + 1];
+      i += 2;
+    }else if(type == TYPE_INT){
+      memcpy(&number, body + i + 1, 4);
+      value = number;
+      i += 5;
+    }else{
+      memcpy(&value, body + i + 1, 4);
+      i += 5;
+    }
+    if(index == VAR_PLAY) play = value != 0;
+    if(index == VAR_DIRECTION) direction = value != 0;
+    if(index == VAR_SPEED) stepSpeed = (int) value;
+    if(index == VAR_SEQ) seq = number;
+  }
+
+  configureExperiment();
+  notifyDataWereReceived(seq);
+}
+
+/*
+* It reads a binary frame, corrupted frames are ignored.
+* Events are left on serialMessage, so they are read like the $event lines.
+*/
+void readFrame(){
+  int length = decodeFrame(serialBuffer + 1, serialLength - 2);
+  if(length < 1){
+    return;
+  }
+  uint8_t *payload = serialBuffer + 1;
+  if(payload[0] == FRAME_VARIABLES){
+    readControlVariablesFrame(payload + 1, length - 1);
+  }
+  if(payload[0] == FRAME_EVENT){
+    serialMessage = "$";
+    for(int i = 1; i < length; i++){
+      serialMessage += (char) payload[i];
+    }
+  }
 }
 
 /*
@@ -132,7 +343,7 @@ void readControlVariables(){
   stepSpeed = variables["speed"];
 
   configureExperiment();
-  notifyDataWereReceived();
+  notifyDataWereReceived(variables["seq"] | -1L);
 }
 
 /*
@@ -141,10 +352,27 @@ void readControlVariables(){
 void serialEvent() {
   while (Serial.available()) {
 
-    char inChar = (char) Serial.read();
-    serialMessage += inChar;
+    uint8_t inByte = Serial.read();
+    if (serialLength < SERIAL_BUFFER_SIZE) {
+      serialBuffer[serialLength++] = inByte;
+    } else {
+      serialOverflow = true;
+    }
 
-    if (inChar == '\n') {
+    if (inByte == '\n') {
+
+      if(serialOverflow){
+        // a cut line would fail to parse, or worse parse as something else
+        sendEvent("error,line too long");
+      }else if(serialBuffer[0] == FRAME_MARKER){
+        readFrame();
+      }else{
+        // the '\n' is replaced by the string terminator
+        serialBuffer[serialLength - 1] = 0;
+        serialMessage = (char *) serialBuffer;
+        // the host was restarted, it sends JSON lines until it asks for binary again
+        binaryMode = binaryMode && serialMessage[0] != '{';
+      }
 
       if(serialMessage[0] == '$'){
         readEvents();
@@ -156,6 +384,8 @@ void serialEvent() {
       
       serialMessageReceived = true;
       serialMessage = "";
+      serialLength = 0;
+      serialOverflow = false;
       event = "";
 
     }
@@ -184,6 +414,12 @@ void readEvents(){
       emitStatus();
       return;
     }
+
+    if(event == "binary"){
+      Serial.println("$binary,ok");
+      binaryMode = true;
+      return;
+    }
 }
 
 /* ===========================  FUNCTIONS FOR CHECK SYSTEM =========================== */
@@ -194,9 +430,9 @@ void emitStatus(){
   
   // check if are there any error on the system
   if(ok){
-    Serial.println("$status,ok");
+    sendEvent("status,ok");
   }else{
-    Serial.println("$status, error: " + error);
+    sendEvent(("status, error: " + error).c_str());
   }
 }
 
@@ -204,7 +440,7 @@ void emitStatus(){
 SimpleTimer speedControlTimer(2000);
 
 void speedWasSet() {
-  Serial.println("$speedReady");  
+  sendEvent("speedReady");
 }
 
 void speedControl(){
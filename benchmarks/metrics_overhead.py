@@ -0,0 +1,48 @@
+"""Measures the overhead of the video path metrics.
+
+Usage:
+    python -m benchmarks.metrics_overhead --clients 100
+"""
+import argparse
+import time
+from utils.metrics import Registry
+
+
+def perCall(fn, n: int) -> float:
+    """Returns the mean time of a call in nanoseconds."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--fps", type=int, default=12)
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    histogram = registry.histogram("send_seconds", "", ["camera", "client"])
+    counter = registry.counter("frames_total", "", ["camera"]).labels("webcam")
+    children = [histogram.labels("webcam", str(i)) for i in range(args.clients)]
+
+    observe = perCall(lambda: children[0].observe(0.003), args.calls)
+    inc = perCall(counter.inc, args.calls)
+    t0 = time.perf_counter()
+    text = registry.render()
+    render = (time.perf_counter() - t0) * 1000
+
+    # Per frame: encode + interval + counter, and a send observation for every client.
+    perFrame = (2 * observe + inc + args.clients * observe) / 1e3
+    budget = perFrame * args.fps / 1e6 * 100
+
+    print(f"histogram observe:  {observe:8.1f} ns")
+    print(f"counter inc:        {inc:8.1f} ns")
+    print(f"render ({args.clients} clients): {render:8.2f} ms, {len(text)} bytes")
+    print(f"per frame overhead: {perFrame:8.1f} us ({budget:.4f} % of a core at {args.fps} fps)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measures the JPEG encode cost of the MJPEG server as the number of clients grows.
+
+Usage:
+    python -m benchmarks.mjpeg_fanout --clients 1 10 50 100 --seconds 3
+"""
+import argparse
+import asyncio
+import time
+import numpy as np
+import simplejpeg
+from utils.broadcaster import FrameBroadcaster
+
+
+class FakeCamera:
+    """A camera replacement that encodes a static noisy frame and counts the encodes."""
+
+    def __init__(self, size: tuple = (600, 400)):
+        width, height = size
+        self.frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+        self.encodes = 0
+
+    def getFrame(self):
+        """Returns a new view each time, like a camera faster than the stream."""
+        return self.frame[:]
+
+    def jpeg(self, quality: int = 30, colorspace: str = "bgr", **kwargs):
+        self.encodes += 1
+        return simplejpeg.encode_jpeg(self.frame, quality, colorspace)
+
+
+async def perClientReader(camera: FakeCamera, fps: int, counter: list):
+    """The previous behaviour: every client encodes its own frames."""
+    while True:
+        camera.jpeg(quality=30, colorspace="bgr")
+        counter[0] += 1
+        await asyncio.sleep(1 / fps)
+
+
+async def sharedReader(broadcaster: FrameBroadcaster, counter: list):
+    """A client of the shared broadcaster."""
+    async for _ in broadcaster.subscribe():
+        counter[0] += 1
+
+
+async def measure(clients: int, seconds: float, fps: int, shared: bool):
+    camera = FakeCamera()
+    broadcaster = FrameBroadcaster(camera, fps=fps)
+    counters = [[0] for _ in range(clients)]
+    if shared:
+        tasks = [asyncio.create_task(sharedReader(broadcaster, c)) for c in counters]
+    else:
+        tasks = [asyncio.create_task(perClientReader(camera, fps, c)) for c in counters]
+    t0 = time.process_time()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - t0
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    delivered = sum(c[0] for c in counters) / clients / seconds
+    encodes = broadcaster.frameId if shared else camera.encodes
+    return encodes / seconds, cpu / seconds * 1000, delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--fps", type=int, default=12)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'clients':>8}{'encodes/s':>12}{'cpu ms/s':>14}{'fps/client':>12}")
+    for shared in (False, True):
+        mode = "shared" if shared else "per-client"
+        for clients in args.clients:
+            encodes, cpu, delivered = asyncio.run(measure(clients, args.seconds, args.fps, shared))
+            print(f"{mode:<10}{clients:>8}{encodes:>12.1f}{cpu:>14.1f}{delivered:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compares the time to display a frame on a QImageLabel: the previous path (full
+frame conversion to RGB, QImage.scaled) against the resize-first path.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.qt_display --size 1280 720 --frames 300
+"""
+import argparse
+import time
+import numpy as np
+import cv2
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QApplication, QLabel
+from utils.widgets import QImageLabel
+
+
+def previousPixmap(array: np.ndarray, width: int, height: int) -> QPixmap:
+    """The previous QImageLabel.arrayToPixmap."""
+    rgb = cv2.cvtColor(array, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb.shape
+    qimage = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
+    qimage = qimage.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+    return QPixmap.fromImage(qimage)
+
+
+def perFrame(fn, frames: list) -> float:
+    """Returns the mean time of a call in milliseconds."""
+    t0 = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    return (time.perf_counter() - t0) / len(frames) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, nargs=2, default=[1280, 720], help="frame width and height")
+    parser.add_argument("--target", type=int, nargs=2, default=[400, 300], help="label width and height")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    width, height = args.size
+    frames = [np.random.randint(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+    frames = [frames[i % len(frames)].copy() for i in range(args.frames)]
+    label = QLabel()
+    image = QImageLabel(label, nativeBGR=False)
+    native = QImageLabel(label)
+
+    previous = perFrame(lambda f: label.setPixmap(previousPixmap(f, *args.target)), frames)
+    current = perFrame(lambda f: image.setImage(f, *args.target), frames)
+    bgr = perFrame(lambda f: native.setImage(f, *args.target), frames)
+    repeated = perFrame(lambda f: image.setImage(frames[0], *args.target, frameId=0), frames)
+
+    print(f"frame {width}x{height} -> label {args.target[0]}x{args.target[1]}")
+    print(f"previous path:      {previous:7.3f} ms/frame")
+    print(f"resize-first path:  {current:7.3f} ms/frame ({previous / current:.1f}x)")
+    if native.nativeBGR:
+        print(f"resize-first, BGR888: {bgr:5.3f} ms/frame ({previous / bgr:.1f}x)")
+    print(f"same frame id:      {repeated:7.3f} ms/frame")
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
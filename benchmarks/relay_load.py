@@ -0,0 +1,260 @@
+"""Load test of the socketio relay with simulated experiments and web clients.
+
+It starts ``run_server.py`` (the server/app.py relay) and N experiments, each one on its
+own room, with M web clients spread over those rooms. Web clients drive the variables
+round-trip of the GUI: a web sends data (``WEB_SENDS_DATA_SERVER``), the experiment gets it
+(``SERVER_SENDS_DATA_EXPERIMENT``) and acknowledges it, and the web gets the notification
+(``SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB``). Like the GUI, which is locked until then,
+each room has a single round-trip at a time, the web clients of a room take turns.
+
+The report is a JSON document (stdout, or ``--output``) with the round-trip latency
+percentiles, the messages per second received by the clients, and the CPU and peak RSS
+of the server processes (read from /proc, so they are null out of Linux).
+
+Usage:
+    python -m benchmarks.relay_load --experiments 10 --webs 20 --seconds 10 --output load.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import socketio
+from benchmarks.relay_rooms import freePort
+from benchmarks.relay_workers import startServer
+from server.routes import (
+    EXPERIMENT_JOINS_ROOM_SERVER,
+    EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER,
+    SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB,
+    SERVER_SENDS_DATA_EXPERIMENT,
+    SERVER_SENDS_DATA_WEB,
+    WEB_JOINS_ROOM_SERVER,
+    WEB_SENDS_DATA_SERVER,
+)
+
+
+async def room(address: str, name: str, webs: int, start: float, end: float, timeout: float) -> dict:
+    """An experiment and its web clients, the webs send data in turns until ``end``. Only
+    the round-trips started after ``start`` (wall clock) are measured."""
+    experiment = socketio.AsyncClient()
+    clients = [socketio.AsyncClient() for _ in range(webs)]
+    result = {"latencies": [], "messages": 0, "lost": 0}
+    measuring = [False]
+    sender = [None]
+    notified = asyncio.Event()
+
+    def count():
+        if measuring[0]:
+            result["messages"] += 1
+
+    @experiment.on(SERVER_SENDS_DATA_EXPERIMENT)
+    async def receiveData(data):
+        count()
+        await experiment.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
+
+    def webHandlers(client: socketio.AsyncClient):
+        @client.on(SERVER_SENDS_DATA_WEB)
+        async def receiveData(data):
+            count()
+
+        @client.on(SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB)
+        async def receiveNotification(*args):
+            count()
+            if sender[0] is client:
+                notified.set()
+
+    try:
+        await experiment.connect(address, transports=["websocket"])
+        await experiment.emit(EXPERIMENT_JOINS_ROOM_SERVER, name)
+        for client in clients:
+            webHandlers(client)
+            await client.connect(address, transports=["websocket"])
+            await client.emit(WEB_JOINS_ROOM_SERVER, name)
+
+        i = 0
+        while clients and time.time() < end:
+            measuring[0] = time.time() >= start
+            sender[0] = clients[i % webs]
+            notified.clear()
+            sent = time.perf_counter()
+            await sender[0].emit(WEB_SENDS_DATA_SERVER, {"play": True, "direction": i % 2 == 0, "speed": i % 100})
+            i += 1
+            try:
+                await asyncio.wait_for(notified.wait(), timeout)
+            except asyncio.TimeoutError:
+                if measuring[0]:
+                    result["lost"] += 1
+                continue
+            if measuring[0]:
+                result["latencies"].append((time.perf_counter() - sent) * 1000)
+        if not clients:
+            await asyncio.sleep(max(0, end - time.time()))
+    finally:
+        # clients that failed to connect have an aiohttp session too
+        for client in [experiment, *clients]:
+            await client.disconnect()
+    return result
+
+
+def clientProcess(address: str, rooms: list, start: float, end: float, timeout: float) -> dict:
+    """Runs some rooms like (name, webs) on this process, it returns their merged results."""
+
+    async def run():
+        return await asyncio.gather(*(room(address, name, webs, start, end, timeout) for name, webs in rooms))
+
+    results = asyncio.run(run())
+    return {
+        "latencies": [value for result in results for value in result["latencies"]],
+        "messages": sum(result["messages"] for result in results),
+        "lost": sum(result["lost"] for result in results),
+    }
+
+
+def processTree(pid: int) -> list:
+    """Returns a process and its descendants, Linux only."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree = [pid]
+    for parent in tree:
+        tree.extend(child for child, ppid in parents.items() if ppid == parent)
+    return tree
+
+
+def usage(pid: int) -> tuple:
+    """Returns the CPU seconds and RSS bytes of a process tree, or Nones out of Linux."""
+    if not os.path.exists("/proc"):
+        return None, None
+    ticks, pageSize = os.sysconf("SC_CLK_TCK"), os.sysconf("SC_PAGE_SIZE")
+    cpu, rss = 0, 0
+    for process in processTree(pid):
+        try:
+            with open(f"/proc/{process}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+        rss += int(fields[21]) * pageSize
+    return cpu, rss
+
+
+def percentiles(values: list) -> dict:
+    if len(values) < 2:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    cuts = statistics.quantiles(values, n=100)
+    return {
+        "p50": round(cuts[49], 3),
+        "p95": round(cuts[94], 3),
+        "p99": round(cuts[98], 3),
+        "mean": round(statistics.fmean(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(experiments: int, webs: int, workers: int, maxRate: float, processes: int, seconds: float, warmup: float, timeout: float) -> dict:
+    port = freePort()
+    server = startServer(port, workers, "--max-rate", str(maxRate), "--log-level", "WARNING")
+    address = f"http://127.0.0.1:{port}"
+    rooms = [(f"load-{r}", len(range(r, webs, experiments))) for r in range(experiments)]
+    processes = max(1, min(processes, experiments))
+    start = time.time() + warmup
+    end = start + seconds
+
+    # peak RSS, sampled during the measured window
+    peak = [0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.2):
+            if time.time() >= start:
+                peak[0] = max(peak[0], usage(server.pid)[1] or 0)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [
+                pool.submit(clientProcess, address, rooms[p::processes], start, end, timeout)
+                for p in range(processes)
+            ]
+            time.sleep(max(0, start - time.time()))
+            cpuStart, _ = usage(server.pid)
+            time.sleep(max(0, end - time.time()))
+            cpuEnd, _ = usage(server.pid)
+            results = [future.result() for future in futures]
+    finally:
+        done.set()
+        sampler.join()
+        server.terminate()
+        server.wait(10)
+
+    latencies = [value for result in results for value in result["latencies"]]
+    messages = sum(result["messages"] for result in results)
+    return {
+        "benchmark": "relay_load",
+        "commit": commit(),
+        "python": platform.python_version(),
+        "cores": os.cpu_count(),
+        "config": {
+            "experiments": experiments,
+            "webs": webs,
+            "workers": workers,
+            "maxRate": maxRate,
+            "clientProcesses": processes,
+            "seconds": seconds,
+        },
+        "latencyMs": percentiles(latencies),
+        "roundTrips": len(latencies),
+        "roundTripsPerSecond": round(len(latencies) / seconds, 1),
+        "messagesPerSecond": round(messages / seconds, 1),
+        "lost": sum(result["lost"] for result in results),
+        "server": {
+            "cpuPercent": round((cpuEnd - cpuStart) / seconds * 100, 1) if cpuStart is not None else None,
+            "rssPeakMB": round(peak[0] / 2 ** 20, 1) if cpuStart is not None else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--experiments", type=int, default=5, help="experiments, one room each")
+    parser.add_argument("--webs", type=int, default=10, help="web clients, spread over the rooms")
+    parser.add_argument("--workers", type=int, default=1, help="relay worker processes")
+    parser.add_argument("--max-rate", type=float, default=0, help="relay --max-rate, 0 relays every message")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="client processes")
+    parser.add_argument("--seconds", type=float, default=10, help="measured time")
+    parser.add_argument("--warmup", type=float, default=3, help="time to connect the clients and warm up")
+    parser.add_argument("--timeout", type=float, default=2, help="a round-trip is lost after it")
+    parser.add_argument("--output", help="JSON file for the report, stdout by default")
+    args = parser.parse_args()
+
+    report = measure(
+        args.experiments, args.webs, args.workers, args.max_rate,
+        args.processes, args.seconds, args.warmup, args.timeout,
+    )
+    document = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+    print(document)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Checks that the socketio relay routes messages only inside each room.
+
+It starts the relay server (run_server.py app) on a subprocess and connects N rooms,
+each one with an experiment and K web clients. Every experiment sends M patches, and
+the messages received by each client are counted: with room scoped routing they are
+the same for any number of rooms.
+
+Usage:
+    python -m benchmarks.relay_rooms --rooms 1 5 10 20 --webs 2 --patches 50
+"""
+from collections import Counter
+import argparse
+import asyncio
+import inspect
+import os
+import socket
+import subprocess
+import sys
+import time
+import socketio
+from server.routes import (
+    EXPERIMENT_JOINS_ROOM_SERVER,
+    EXPERIMENT_SENDS_PATCH_SERVER,
+    EXPERIMENT_SENDS_SNAPSHOT_SERVER,
+    WEB_JOINS_ROOM_SERVER,
+)
+
+
+def freePort() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(port: int):
+    """Runs the relay server, on a single process where Sanic supports it."""
+    from server.app import app
+
+    options = {"access_log": False}
+    if "single_process" in inspect.signature(app.run).parameters:
+        options["single_process"] = True
+    app.run(host="127.0.0.1", port=port, **options)
+
+
+def startServer(port: int) -> subprocess.Popen:
+    """Runs the relay on a subprocess, its logs are discarded."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.relay_rooms", "--serve", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=os.getcwd(),
+    )
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("the relay server didn't start")
+
+
+class Client:
+    """A socketio client that counts the events it receives."""
+
+    def __init__(self, role: str, room: str):
+        self.role = role
+        self.room = room
+        self.counts = Counter()
+        self.sio = socketio.AsyncClient()
+        self.sio.on("*", self.count)
+
+    async def count(self, event, *args):
+        self.counts[event] += 1
+
+    async def connect(self, address: str):
+        await self.sio.connect(address, transports=["websocket"])
+        route = EXPERIMENT_JOINS_ROOM_SERVER if self.role == "experiment" else WEB_JOINS_ROOM_SERVER
+        await self.sio.emit(route, self.room)
+
+
+async def measure(address: str, rooms: int, webs: int, patches: int, settle: float) -> dict:
+    clients = []
+    for r in range(rooms):
+        room = f"room-{rooms}-{r}"
+        clients.append(Client("experiment", room))
+        clients += [Client("web", room) for _ in range(webs)]
+    await asyncio.gather(*(client.connect(address) for client in clients))
+    await asyncio.sleep(settle)
+    experiments = [client for client in clients if client.role == "experiment"]
+    await asyncio.gather(*(e.sio.emit(EXPERIMENT_SENDS_SNAPSHOT_SERVER, {"speed": 0}) for e in experiments))
+    await asyncio.sleep(settle)
+    for client in clients:
+        client.counts.clear()
+
+    t0 = time.perf_counter()
+    for i in range(patches):
+        await asyncio.gather(
+            *(e.sio.emit(EXPERIMENT_SENDS_PATCH_SERVER, {"changes": {"speed": i}}) for e in experiments)
+        )
+    expected = patches * (webs + 1)
+    deadline = time.time() + 30
+    while sum(sum(c.counts.values()) for c in clients) < expected * rooms and time.time() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    await asyncio.sleep(settle)  # anything that leaks from other rooms arrives now
+
+    await asyncio.gather(*(client.sio.disconnect() for client in clients))
+    webCounts = [sum(c.counts.values()) for c in clients if c.role == "web"]
+    experimentCounts = [sum(c.counts.values()) for c in experiments]
+    return {
+        "rooms": rooms,
+        "clients": len(clients),
+        "web": max(webCounts) if webCounts else 0,
+        "experiment": max(experimentCounts),
+        "room": sum(webCounts + experimentCounts) / rooms,
+        "expected": expected,
+        "rate": sum(webCounts + experimentCounts) / elapsed,
+    }
+
+
+async def run(args):
+    print(f"{'rooms':>6} {'clients':>8} {'msgs/web':>9} {'msgs/exp':>9} {'msgs/room':>10} {'expected':>9} {'msgs/s':>9}")
+    for rooms in args.rooms:
+        r = await measure(args.address, rooms, args.webs, args.patches, args.settle)
+        print(
+            f"{r['rooms']:>6} {r['clients']:>8} {r['web']:>9} {r['experiment']:>9} "
+            f"{r['room']:>10.1f} {r['expected']:>9} {r['rate']:>9.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--webs", type=int, default=2, help="web clients by room")
+    parser.add_argument("--patches", type=int, default=50, help="patches sent by each experiment")
+    parser.add_argument("--settle", type=float, default=0.5, help="seconds to wait for late messages")
+    parser.add_argument("--address", default=None, help="a running relay, ex. http://localhost:3000")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        return serve(args.serve)
+    server = None
+    if args.address is None:
+        port = freePort()
+        server = startServer(port)
+        args.address = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Measures the message throughput of the socketio relay with several worker processes.
+
+For each number of workers it starts ``run_server.py --workers N`` and some client
+processes. Each process connects a few rooms (an experiment and K web clients), and each
+experiment sends patches in a closed loop: a new one when the relay echoes the last one.
+Every message received by any client is counted. The messages of rooms with clients on
+several workers also cross the bus, so workers only pay off with spare cores; on a single
+core 2 workers relayed about 0.65x the messages of 1 worker.
+
+Usage:
+    python -m benchmarks.relay_workers --workers 1 2 4 --processes 4 --rooms 5 --seconds 5
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import socketio
+from benchmarks.relay_rooms import freePort
+from server.routes import (
+    EXPERIMENT_JOINS_ROOM_SERVER,
+    EXPERIMENT_SENDS_PATCH_SERVER,
+    SERVER_SENDS_PATCH_EXPERIMENT,
+    WEB_JOINS_ROOM_SERVER,
+)
+
+
+def startServer(port: int, workers: int, *options: str) -> subprocess.Popen:
+    """Runs the relay with some workers (and other run_server.py options), it waits until
+    it accepts socketio clients."""
+    process = subprocess.Popen(
+        [sys.executable, "run_server.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), *options],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=os.getcwd(),
+    )
+    address = f"http://127.0.0.1:{port}"
+
+    async def probe() -> bool:
+        client = socketio.AsyncClient()
+        try:
+            await client.connect(address, transports=["websocket"])
+            return True
+        except Exception:
+            return False
+        finally:
+            # a failed connection leaves an open aiohttp session too
+            await client.disconnect()
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if asyncio.run(probe()):
+            return process
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("the relay server didn't start")
+
+
+async def room(address: str, name: str, webs: int, seconds: float, counter: list):
+    """An experiment sending patches in a closed loop and its web clients."""
+    clients = [socketio.AsyncClient() for _ in range(webs + 1)]
+    experiment = clients[0]
+    echo = asyncio.Event()
+
+    async def count(event, *args):
+        counter[0] += 1
+        if event == SERVER_SENDS_PATCH_EXPERIMENT:
+            echo.set()
+
+    try:
+        for i, client in enumerate(clients):
+            client.on("*", count)
+            await client.connect(address, transports=["websocket"])
+            await client.emit(EXPERIMENT_JOINS_ROOM_SERVER if i == 0 else WEB_JOINS_ROOM_SERVER, name)
+        await asyncio.sleep(0.5)
+        counter[0] = 0
+
+        i = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            echo.clear()
+            await experiment.emit(EXPERIMENT_SENDS_PATCH_SERVER, {"changes": {"speed": i}})
+            i += 1
+            try:
+                await asyncio.wait_for(echo.wait(), 2)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for client in clients:
+            await client.disconnect()
+
+
+def clientProcess(address: str, prefix: str, rooms: int, webs: int, seconds: float) -> int:
+    """Runs some rooms on this process, it returns the received messages."""
+    counters = [[0] for _ in range(rooms)]
+
+    async def run():
+        await asyncio.gather(*(
+            room(address, f"{prefix}-{r}", webs, seconds, counters[r]) for r in range(rooms)
+        ))
+
+    asyncio.run(run())
+    return sum(counter[0] for counter in counters)
+
+
+def measure(workers: int, processes: int, rooms: int, webs: int, seconds: float) -> dict:
+    port = freePort()
+    server = startServer(port, workers)
+    address = f"http://127.0.0.1:{port}"
+    try:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [
+                pool.submit(clientProcess, address, f"w{workers}-p{p}", rooms, webs, seconds)
+                for p in range(processes)
+            ]
+            received = sum(future.result() for future in futures)
+    finally:
+        server.terminate()
+        server.wait(10)
+    return {"workers": workers, "clients": processes * rooms * (webs + 1), "rate": received / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="client processes")
+    parser.add_argument("--rooms", type=int, default=5, help="rooms by client process")
+    parser.add_argument("--webs", type=int, default=2, help="web clients by room")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'clients':>8} {'msgs/s':>9} {'speedup':>8}")
+    base = None
+    for workers in args.workers:
+        r = measure(workers, args.processes, args.rooms, args.webs, args.seconds)
+        base = base or r["rate"]
+        print(f"{r['workers']:>8} {r['clients']:>8} {r['rate']:>9.0f} {r['rate'] / base:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compares JSON lines and binary frames on the serial link, through a pty loopback.
+
+A fake device on the other side of a pseudo terminal acts like the sketch: it answers
+"$binary" and acknowledges each variables message with "received". The link speed is
+emulated by the fake device (it waits the transfer time of each message at --baud).
+
+Usage:
+    python -m benchmarks.serial_loopback --messages 200 --baud 9600
+"""
+import argparse
+import os
+import threading
+import time
+import tty
+from utils.serialprotocol import FrameCodec, FramedSerial
+
+
+SCHEMA = ["play", "direction", "speed"]
+VARIABLES = {"play": True, "direction": False, "speed": 20}
+
+
+class FakeDevice:
+    """Emulates the sketch at the master side of a pty."""
+
+    def __init__(self, fd: int, baud: int = 9600):
+        self.fd = fd
+        self.baud = baud
+        self.codec = FrameCodec(SCHEMA)
+        self.binary = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def transfer(self, size: int):
+        """Waits the time of sending some bytes at the emulated baud rate (10 bits/byte)."""
+        if self.baud > 0:
+            time.sleep(size * 10 / self.baud)
+
+    def send(self, data: bytes):
+        self.transfer(len(data))
+        os.write(self.fd, data)
+
+    def run(self):
+        buffer = b""
+        while True:
+            try:
+                buffer += os.read(self.fd, 4096)
+            except OSError:
+                return
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                self.transfer(len(line) + 1)
+                kind, value, _ = self.codec.decode(line + b"\n")
+                if kind == "event" and value == "binary":
+                    self.send(b"$binary,ok\n")
+                    self.binary = True
+                elif kind == "variables":
+                    self.send(self.codec.encodeEvent("received") if self.binary else b"$received\n")
+
+
+def measure(binary: bool, messages: int, baud: int) -> dict:
+    """Measures a link, using the binary protocol or JSON lines."""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    device = FakeDevice(master, baud)
+    serial = FramedSerial(
+        name="arduino", port=os.ttyname(slave), baudrate=baud or 9600, timeout=0.1,
+        schema=SCHEMA, binary=binary, negotiationInterval=0.2, reconnectDelay=0.1, emitAsDict=False,
+    )
+    acks = []
+    received = threading.Event()
+    serial.on("event", lambda event: (acks.append(time.perf_counter()), received.set()))
+    serial.start()
+    deadline = time.time() + 3
+    while not serial.isConnected() and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(serial.reconnectDelay)
+    while binary and not serial.isBinary() and time.time() < deadline:
+        time.sleep(0.05)
+
+    # round trip latency, one message at a time
+    latencies = []
+    for _ in range(messages):
+        received.clear()
+        t0 = time.perf_counter()
+        serial.writeVariables(VARIABLES)
+        if received.wait(2):
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    # throughput, all the messages at once
+    acks.clear()
+    t0 = time.perf_counter()
+    for _ in range(messages):
+        serial.writeVariables(VARIABLES)
+    deadline = time.time() + 30
+    while len(acks) < messages and time.time() < deadline:
+        time.sleep(0.01)
+    elapsed = (acks[-1] if acks else time.perf_counter()) - t0
+
+    size = len(FrameCodec(SCHEMA).encodeVariables(VARIABLES)) if serial.isBinary() else len(
+        serial.dictToJson(VARIABLES)) + 1
+    serial.running.clear()
+    serial.thread.join()
+    serial.serial.close()
+    os.close(master)
+    latencies.sort()
+    return {
+        "protocol": "binary" if serial.isBinary() else "json",
+        "bytes": size,
+        "p50": latencies[len(latencies) // 2] if latencies else float("nan"),
+        "p99": latencies[int(len(latencies) * 0.99)] if latencies else float("nan"),
+        "rate": len(acks) / elapsed if elapsed > 0 else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--baud", type=int, default=9600, help="emulated baud rate, 0 for no limit")
+    args = parser.parse_args()
+
+    print(f"{'protocol':>8} {'bytes/msg':>10} {'rtt p50 ms':>11} {'rtt p99 ms':>11} {'msgs/s':>9}")
+    for binary in (False, True):
+        r = measure(binary, args.messages, args.baud)
+        print(f"{r['protocol']:>8} {r['bytes']:>10} {r['p50']:>11.2f} {r['p99']:>11.2f} {r['rate']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Compares thread count, CPU and scheduling jitter of many recurring timers: the
+previous PausableTimer (a thread per timer) against the shared TimerScheduler and
+the AsyncTimerScheduler.
+
+Jitter is the difference between the measured and the expected time between two
+executions of the same timer.
+
+Usage:
+    python -m benchmarks.timers --timers 1000 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from threading import Thread, Event
+from utils.timers import PausableTimer, TimerScheduler, AsyncTimerScheduler
+
+
+class PreviousTimer:
+    """The previous PausableTimer, one thread per timer."""
+
+    def __init__(self, interval, callback=None):
+        self.interval = interval
+        self.timeout = interval
+        self.callback = callback
+        self.running = Event()
+        self.pauseEvent = Event()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.quit = False
+
+    def run(self):
+        while True:
+            self.pauseEvent.wait()
+            self.running.wait(self.timeout)
+            self.callback()
+            if self.quit:
+                break
+
+    def resume(self, now=True):
+        self.pauseEvent.set()
+        if now:
+            self.running.set()
+
+    def pause(self, reset=False):
+        self.pauseEvent.clear()
+        if reset:
+            self.running.clear()
+
+
+class Probe:
+    """Records the time between the executions of a timer."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last = None
+        self.errors = []
+
+    def __call__(self):
+        now = time.monotonic()
+        if self.last is not None:
+            self.errors.append(abs(now - self.last - self.interval) * 1000)
+        self.last = now
+
+
+def summary(name: str, probes: list, threads: int, cpu: float, seconds: float):
+    errors = sorted(e for probe in probes for e in probe.errors)
+    pick = lambda q: errors[min(int(len(errors) * q), len(errors) - 1)] if errors else float("nan")
+    print(
+        f"{name:>10} {threads:>8} {cpu / seconds * 100:>7.1f}% {len(errors) / seconds:>9.0f}"
+        f" {pick(0.5):>8.2f} {pick(0.99):>8.2f} {errors[-1] if errors else float('nan'):>8.2f}"
+    )
+
+
+def intervals(count: int) -> list:
+    random.seed(1)
+    return [random.uniform(0.1, 1.0) for _ in range(count)]
+
+
+def runThreaded(name: str, count: int, seconds: float, makeTimer):
+    probes = [Probe(interval) for interval in intervals(count)]
+    baseline = threading.active_count()
+    timers = [makeTimer(probe) for probe in probes]
+    cpu = time.process_time()
+    for timer in timers:
+        timer.resume(now=False)
+    time.sleep(seconds)
+    threads = threading.active_count() - baseline
+    cpu = time.process_time() - cpu
+    for timer in timers:
+        timer.pause(reset=True)
+    summary(name, probes, threads, cpu, seconds)
+
+
+async def runAsync(count: int, seconds: float):
+    probes = [Probe(interval) for interval in intervals(count)]
+    baseline = threading.active_count()
+    scheduler = AsyncTimerScheduler()
+    timers = [PausableTimer(probe.interval, probe, scheduler=scheduler) for probe in probes]
+    cpu = time.process_time()
+    for timer in timers:
+        timer.resume(now=False)
+    await asyncio.sleep(seconds)
+    threads = threading.active_count() - baseline
+    cpu = time.process_time() - cpu
+    for timer in timers:
+        timer.pause(reset=True)
+    summary("asyncio", probes, threads, cpu, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--timers", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.timers} timers, intervals between 0.1 and 1 s, jitter in ms")
+    print(f"{'timers':>10} {'threads':>8} {'cpu':>8} {'calls/s':>9} {'p50':>8} {'p99':>8} {'max':>8}")
+    runThreaded("previous", args.timers, args.seconds, lambda probe: PreviousTimer(probe.interval, probe))
+    scheduler = TimerScheduler()
+    runThreaded(
+        "scheduler", args.timers, args.seconds,
+        lambda probe: PausableTimer(probe.interval, probe, scheduler=scheduler),
+    )
+    scheduler.stop()
+    asyncio.run(runAsync(args.timers, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,37 @@
 
 # OS
 import os
+import signal
 import sys
+from threading import Event
 
 ## 
 from PyQt5 import uic
 from PyQt5.QtWidgets import QMainWindow, QApplication
-from PyQt5.QtCore import QTimer
 from remio import Mockup
+from remio.camio import Cameras
+from remio.serialio import Serials
+from remio.socketSync import CustomSocketIO
+from remio.stream import SocketStreamer
 
 #
-from utils.widgets import QImageLabel
+from utils.widgets import QImageLabel, FrameNotifier
 from utils.mjpegfastapiserver import MJPEGAsyncServer
+from utils.processing import LazyCameras
+from utils.serialprotocol import FramedSerials
+from utils.tracing import Tracer, popTrace, stamp
 from server.routes import *
 from settings import (
     serverSettings,
     streamSettings,
     cameraSettings,
     serialSettings,
+    mjpegSettings,
+    historySettings,
+    displaySettings,
     config
 )
+from utils.history import History
 from utils.variables import Variables
 
 
@@ -31,10 +43,55 @@ ui_file = os.path.join(ui_path, "gui.ui")
 EXPERIMENT_ROOM = config.get("SOCKETIO_SERVER_ROOM", "ROOM_X")
 
 
-class CustomMockup(QMainWindow, Mockup):
+class SocketIO(CustomSocketIO):
+    """The remio socketio client, it connects with some transports.
+    Args:
+        transports: allowed transports, ex. ["websocket"] for a server with several workers.
+    """
+
+    def __init__(self, address: str = None, transports: list = None, *args, **kwargs):
+        super().__init__(address, *args, **kwargs)
+        self.transports = transports
+
+    def start(self):
+        if self.address is not None:
+            try:
+                self.connect(self.address, transports=self.transports, wait=True)
+            except Exception as e:
+                print("socket:: ", e)
+
+
+class SocketMockup(Mockup):
+    """A remio Mockup whose socketio client is built by createSocket, remio always
+    builds its own client (it doesn't take transports).
+    Args:
+        cameraSettings: settings for camera devices.
+        serialSettings: settings for serial devices.
+        serverSettings: settings to connect with a socketio server.
+        streamSettings: settings for stream devices.
+    """
+
+    def __init__(self, cameraSettings: dict = {}, serialSettings: dict = {}, serverSettings: dict = {},
+                 streamSettings: dict = {}, *args, **kwargs):
+        self.camera = Cameras(devices=cameraSettings)
+        self.serial = Serials(devices=serialSettings)
+        self.socket = self.createSocket(serverSettings)
+        self.streamer = SocketStreamer(socket=self.socket, reader=self.camera.read, **streamSettings)
+        self.waitEvent = Event()
+        signal.signal(signal.SIGINT, self.softStop)
+        signal.signal(signal.SIGTERM, self.softStop)
+
+    def createSocket(self, serverSettings: dict) -> SocketIO:
+        """Returns the socketio client of the mockup."""
+        return SocketIO(**serverSettings)
+
+
+class CustomMockup(QMainWindow, SocketMockup):
     """A class for manage a mockup with a local GUI."""
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.configureProcessing()
+        self.configureSerialDevices()
         uic.loadUi("gui.ui", self)
         self.configureGUI()
         self.configureVariables()
@@ -42,6 +99,7 @@ class CustomMockup(QMainWindow, Mockup):
         self.configureSocket()
         self.configureTimers()
         self.configureMJPEG()
+        self.configureTracing()
 
     # Configurations
     def configureGUI(self):
@@ -60,10 +118,16 @@ class CustomMockup(QMainWindow, Mockup):
     def configureControlButtons(self):
         """Configures the control buttons."""
 
+    def configureSerialDevices(self):
+        """Configures the serial devices, they use binary frames if the sketch supports them."""
+        self.serial = FramedSerials(devices=serialSettings)
+
     def configureSerial(self):
         """Configures serial on/emit events."""
         self.serial.on("connection", self.serialConnectionStatus)
         self.serial.on("ports", self.serialPortsUpdate)
+        self.serial.on("variables", self.serialVariablesIncoming)
+        self.serial.on("event", self.serialEventIncoming)
         self.serial.on("data", self.serialDataIncoming)
         self.serialPortsUpdate(self.serial.ports())
 
@@ -72,28 +136,42 @@ class CustomMockup(QMainWindow, Mockup):
         self.socket.on("connection", self.socketConnectionStatus)
         self.socket.on(SERVER_SENDS_DATA_EXPERIMENT, self.receiveVariables)
         self.socket.on(SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT, self.variables.streamedSucessfully)
-        self.socket.on(SERVER_REQUESTS_DATA_EXPERIMENT, lambda: self.streamVariables(lock=False))
+        self.socket.on(SERVER_SENDS_PATCH_EXPERIMENT, self.receivePatch)
+        self.socket.on(SERVER_SENDS_SNAPSHOT_EXPERIMENT, self.receiveSnapshot)
+        self.socket.on(SERVER_REQUESTS_DATA_EXPERIMENT, self.sendSnapshot)
+        self.socket.on(SERVER_REQUESTS_HISTORY_EXPERIMENT, self.sendHistory)
         self.socket.on(SERVER_STREAMER_SET_PAUSE_EXPERIMENT, lambda pause: self.updateVideoPauseState(pause))
 
     def configureTimers(self):
-        """Configures some timers."""
-        self.videoTimer = QTimer()
-        self.videoTimer.timeout.connect(self.updateVideo)
-        self.videoTimer.start(1000 // 12)  # 1000 // FPS
+        """Configures the video updates, driven by the new frame notifications of the cameras."""
+        self.frameNotifier = FrameNotifier(fps=displaySettings["fps"])
+        self.frameNotifier.frameReady.connect(self.updateVideo)
+        self.camera.on("frame-available", self.frameNotifier.notify)
+
+    def configureProcessing(self):
+        """Configures on demand processing, frames are processed once when they are read."""
+        self.frames = LazyCameras(self.camera)
+        self.streamer.setReader(self.frames.read)
 
     def configureVariables(self):
-        """Configures control variables."""
+        """Configures control variables, their changes are recorded on a history."""
+        self.history = History(**historySettings)
         self.variables = Variables({
             "speed": 0,
             "play": False,
             "direction": False 
-        }, interval=3, supervise=self.superviseVariablesStreaming)
+        }, interval=3, supervise=self.superviseVariablesStreaming, history=self.history)
 
     def configureMJPEG(self):
-        """Configures a MJPEG Server for streaming video."""
-        self.mjpegserver = MJPEGAsyncServer(self.camera["webcam"], fps=12)
+        """Configures a MJPEG Server for streaming video, one endpoint for each camera."""
+        self.mjpegserver = MJPEGAsyncServer(cameras=self.frames, **mjpegSettings)
         self.mjpegserver.start()
 
+    def configureTracing(self):
+        """Configures the latency histograms of the traced web commands, on the MJPEG /metrics."""
+        self.tracer = Tracer(self.mjpegserver.registry, name="rig_trace_hop_seconds")
+        self.serial.on("ack", self.serialAckIncoming)
+
     # GUI
     def lockGUI(self):
         """Locks the GUI elements."""
@@ -126,18 +204,26 @@ class CustomMockup(QMainWindow, Mockup):
         """Sends to the server the serial devices connection status."""
         self.ledSerial.setChecked(status.get("arduino", False))
 
-    def serialDataIncoming(self, data: str):
-        """Reads incoming data from the serial device."""
-        json = data["arduino"]
-        if "$" in json:
-            print("message: ", json)
-        elif "{" in json:
-            self.variables.update(json)
-            self.setVariablesOnGUI()
-            self.variables.setStreamingStatus(False)
-            self.streamVariables()
-        else:
-            print("Arduino says: ", json)
+    def serialVariablesIncoming(self, data: dict):
+        """Reads the variables sent by the serial device."""
+        self.variables.update(data["arduino"])
+        self.setVariablesOnGUI()
+        self.variables.setStreamingStatus(False)
+        self.streamVariables()
+
+    def serialAckIncoming(self, data: dict):
+        """Observes the serial hop of a traced command, from its write until $received."""
+        self.tracer.observeHop("serial", data["arduino"]["seconds"])
+
+    def serialEventIncoming(self, data: dict):
+        """Reads the events sent by the serial device, ex. received."""
+        print("message: ", data["arduino"])
+        self.history.recordEvent("event", data["arduino"])
+
+    def serialDataIncoming(self, data: dict):
+        """Reads other messages from the serial device."""
+        print("Arduino says: ", data["arduino"])
+        self.history.recordEvent("data", data["arduino"])
 
     def serialReconnect(self, value: bool):
         """Updates the serial port."""
@@ -154,6 +240,7 @@ class CustomMockup(QMainWindow, Mockup):
         self.ledSocket.setChecked(status)
         if status: 
             self.socket.emit(EXPERIMENT_JOINS_ROOM_SERVER, EXPERIMENT_ROOM)
+            self.sendSnapshot()
 
     def socketReconnect(self, value: bool = True):
         """Updates the socketio connection."""
@@ -161,10 +248,14 @@ class CustomMockup(QMainWindow, Mockup):
         self.ledSocket.setChecked(self.socket.isConnected())
 
     # Video
-    def updateVideo(self):
+    def updateVideo(self, name: str = None):
         """Updates video image."""
-        image = self.camera.getFrameOf("webcam")
-        self.image.setImage(image, 400, 300)
+        camera = displaySettings["camera"]
+        if name is not None and name != camera:
+            return
+        image = self.frames.getFrameOf(camera)
+        width, height = displaySettings["width"], displaySettings["height"]
+        self.image.setImage(image, width, height, frameId=self.frames[camera].frameId)
 
     def updateVideoPauseState(self, status: bool):
         """Updates video pause status."""
@@ -182,30 +273,72 @@ class CustomMockup(QMainWindow, Mockup):
     def receiveVariables(self, data: dict = {}):
         """Receives variables coming from the server."""
         # print("received: ", data)
+        trace = self.traceIncoming(data)
         self.variables.update(data)
         self.setVariablesOnGUI()
         
-        self.serial["arduino"].write(self.variables.json())
+        self.serial["arduino"].postVariables(self.variables.values(), trace and trace.get("id"))
         
         # Say to the server the data were received (OK)
-        self.socket.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
+        self.notifyDataWereReceived(trace)
 
     def updateVariables(self, key: str, value=None):
         """Updates variables values and streams they to the server."""
         # Set a new single variable value
         self.variables.set(key, value, backup=True, streamingStatus=False)
 
-        # Send changes to the serial device
-        self.serial["arduino"].write(self.variables.json())
+        # Send changes to the serial device, rapid changes are coalesced
+        self.serial["arduino"].postVariables(self.variables.values())
 
-        # Stream variables
-        self.streamVariables()
+        # Stream variables, the GUI isn't locked: patches are versioned and acks pipelined
+        self.streamVariables(lock=False)
         print("variables: ", self.variables.json())
 
+    def traceIncoming(self, data) -> dict:
+        """Takes the trace of a traced command out of its payload, None for the others."""
+        trace = popTrace(data)
+        return trace if trace is None else stamp(trace, "rigIn")
+
+    def notifyDataWereReceived(self, trace: dict = None):
+        """Says to the server the data were received, with the trace of the command."""
+        if trace is None:
+            self.socket.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
+            return
+        self.tracer.observe(stamp(trace, "rigOut"))
+        self.socket.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER, trace)
+
+    def receivePatch(self, patch: dict = {}):
+        """Receives the changed variables, only new changes are sent to the serial device."""
+        trace = self.traceIncoming(patch)
+        changes = self.variables.applyPatch(patch)
+        if changes:
+            self.setVariablesOnGUI()
+            self.serial["arduino"].postVariables(self.variables.values(), trace and trace.get("id"))
+            self.notifyDataWereReceived(trace)
+        elif changes is None and self.variables.outOfSync:
+            self.socket.emit(EXPERIMENT_REQUESTS_SNAPSHOT_SERVER)
+
+    def receiveSnapshot(self, snapshot: dict = {}):
+        """Receives all the variables and their sequence number from the server."""
+        self.variables.applySnapshot(snapshot)
+        self.setVariablesOnGUI()
+        self.serial["arduino"].postVariables(self.variables.values())
+
+    def sendSnapshot(self):
+        """Sends all the variables to the server, the experiment is the source of truth."""
+        self.socket.emit(EXPERIMENT_SENDS_SNAPSHOT_SERVER, self.variables.values())
+
+    def sendHistory(self, request: dict = {}):
+        """Sends a decimated window of the variables history, ex. {"seconds": 60, "points": 500}."""
+        self.socket.emit(EXPERIMENT_SENDS_HISTORY_SERVER, self.history.windowFromRequest(request))
+
     def streamVariables(self, lock: bool = True):
         """Streams variables to the server."""
         # Send changes to the server
-        self.socket.emit(EXPERIMENT_SENDS_DATA_SERVER, self.variables.json())
+        patch = self.variables.patch()
+        if len(patch["changes"]) == 0:
+            return
+        self.socket.emit(EXPERIMENT_SENDS_PATCH_SERVER, patch)
 
         # Lock the GUI and wait for a response
         if lock and self.variables.isEnabled():
@@ -225,7 +358,6 @@ if __name__ == "__main__":
         serverSettings=serverSettings,
         streamSettings=streamSettings,
         cameraSettings=cameraSettings,
-        serialSettings=serialSettings,
     )
     experiment.start(
         camera=True, 
@@ -1,33 +1,48 @@
-"""Example experiment."""
+"""Example experiment, without a GUI. Everything runs on a single event loop."""
 from typing import Union
-from remio import Mockup
 from server.routes import *
 from settings import (
     serverSettings,
     streamSettings,
     cameraSettings,
     serialSettings,
+    mjpegSettings,
+    historySettings,
     config
 )
 from utils.mjpegfastapiserver import MJPEGAsyncServer
+from utils.processing import LazyCameras
+from utils.runtime import AsyncMockup
+from utils.serialprotocol import FramedSerials
+from utils.tracing import Tracer, popTrace, stamp
+from utils.history import History
 from utils.variables import Variables
 
 
 EXPERIMENT_ROOM = config.get("SOCKETIO_SERVER_ROOM", "ROOM_X")
 
 
-class CustomMockup(Mockup):
+class CustomMockup(AsyncMockup):
     """A class for manage a mockup without a local GUI."""
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.configureProcessing()
+        self.configureSerialDevices()
         self.configureVariables()
         self.configureSerial()
         self.configureSocket()
         self.configureMJPEG()
+        self.configureTracing()
+
+    def configureSerialDevices(self):
+        """Configures the serial devices, they use binary frames if the sketch supports them."""
+        self.serial = FramedSerials(devices=serialSettings)
 
     def configureSerial(self):
         """Configures serial on/emit events."""
+        self.serial.on("variables", self.serialVariablesIncoming)
+        self.serial.on("event", self.serialEventIncoming)
         self.serial.on("data", self.serialDataIncoming)
 
     def configureSocket(self):
@@ -35,40 +50,76 @@ class CustomMockup(Mockup):
         self.socket.on("connection", self.socketConnectionStatus)
         self.socket.on(SERVER_SENDS_DATA_EXPERIMENT, self.receiveVariables)
         self.socket.on(SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT, self.variables.streamedSucessfully)
-        self.socket.on(SERVER_REQUESTS_DATA_EXPERIMENT, lambda: self.streamVariables(lock=False))
+        self.socket.on(SERVER_SENDS_PATCH_EXPERIMENT, self.receivePatch)
+        self.socket.on(SERVER_SENDS_SNAPSHOT_EXPERIMENT, self.receiveSnapshot)
+        self.socket.on(SERVER_REQUESTS_DATA_EXPERIMENT, self.sendSnapshot)
+        self.socket.on(SERVER_REQUESTS_HISTORY_EXPERIMENT, self.sendHistory)
         self.socket.on(SERVER_STREAMER_SET_PAUSE_EXPERIMENT, lambda pause: self.updateVideoPauseState(pause))
 
+    def configureProcessing(self):
+        """Configures on demand processing, frames are processed once when they are read."""
+        self.frames = LazyCameras(self.camera)
+        self.streamer.setReader(self.frames.read)
+
     def configureVariables(self):
-        """Configures control variables."""
+        """Configures control variables, their changes are recorded on a history."""
+        self.history = History(**historySettings)
         self.variables = Variables({
             "play": False,
             "speed": 0.00,
             "direction": False,
-        }, interval=3, supervise=self.superviseVariablesStreaming)
+        }, interval=3, supervise=self.superviseVariablesStreaming, scheduler=self.scheduler, history=self.history)
 
     def configureMJPEG(self):
-        """Configures a MJPEG Server for streaming video."""
-        self.mjpegserver = MJPEGAsyncServer(self.camera["webcam"], fps=12)
-        self.mjpegserver.start()
-
-    def serialDataIncoming(self, data: str):
-        """Reads incoming data from the serial device."""
-        json = data["arduino"]
-        if "$" in json:
-            print("message: ", json)
-        elif "{" in json:
-            self.variables.update(json)
-            self.variables.setStreamingStatus(False)
-            self.streamVariables()
-        else:
-            print("Arduino says: ", json)
+        """Configures a MJPEG Server for streaming video, one endpoint for each camera."""
+        self.mjpegserver = MJPEGAsyncServer(cameras=self.frames, **mjpegSettings)
+        self.addTask(self.mjpegserver.serve)
+
+    def configureTracing(self):
+        """Configures the latency histograms of the traced web commands, on the MJPEG /metrics."""
+        self.tracer = Tracer(self.mjpegserver.registry, name="rig_trace_hop_seconds")
+        self.serial.on("ack", self.serialAckIncoming)
+
+    def serialVariablesIncoming(self, data: dict):
+        """Reads the variables sent by the serial device."""
+        self.variables.update(data["arduino"])
+        self.variables.setStreamingStatus(False)
+        self.streamVariables()
+
+    def serialAckIncoming(self, data: dict):
+        """Observes the serial hop of a traced command, from its write until $received."""
+        self.tracer.observeHop("serial", data["arduino"]["seconds"])
+
+    def serialEventIncoming(self, data: dict):
+        """Reads the events sent by the serial device, ex. received."""
+        print("message: ", data["arduino"])
+        self.history.recordEvent("event", data["arduino"])
+
+    def serialDataIncoming(self, data: dict):
+        """Reads other messages from the serial device."""
+        print("Arduino says: ", data["arduino"])
+        self.history.recordEvent("data", data["arduino"])
 
     def socketConnectionStatus(self):
         """Shows the connection socket status."""
         if self.socket.isConnected(): 
             self.socket.emit(EXPERIMENT_JOINS_ROOM_SERVER, EXPERIMENT_ROOM)
+            self.sendSnapshot()
         print("connection: ", self.socket.isConnected())
 
+    def updateVideoPauseState(self, status: bool):
+        """Updates video pause status."""
+        if status:
+            self.camera.pauseAll()
+        else:
+            self.camera.resumeAll()
+        self.streamer.setPause(status)
+
+    def stop(self):
+        """Stops the MJPEG server and the mockup."""
+        self.mjpegserver.stop()
+        super().stop()
+
     def superviseVariablesStreaming(self):
         """"Checks the variables updated status and restores the backup if necessary."""
         self.variables.checkStreamingFail()
@@ -78,20 +129,60 @@ class CustomMockup(Mockup):
     def receiveVariables(self, data: dict = {}):
         """Receives variables coming from the server."""
         print("received: ", data)
+        trace = self.traceIncoming(data)
         self.variables.update(data)
-        self.serial["arduino"].write(self.variables.json())
+        self.serial["arduino"].postVariables(self.variables.values(), trace and trace.get("id"))
         
         # Say to the server the data were received (OK)
-        self.socket.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
+        self.notifyDataWereReceived(trace)
+
+    def traceIncoming(self, data) -> dict:
+        """Takes the trace of a traced command out of its payload, None for the others."""
+        trace = popTrace(data)
+        return trace if trace is None else stamp(trace, "rigIn")
+
+    def notifyDataWereReceived(self, trace: dict = None):
+        """Says to the server the data were received, with the trace of the command."""
+        if trace is None:
+            self.socket.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
+            return
+        self.tracer.observe(stamp(trace, "rigOut"))
+        self.socket.emit(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER, trace)
+
+    def receivePatch(self, patch: dict = {}):
+        """Receives the changed variables, only new changes are sent to the serial device."""
+        trace = self.traceIncoming(patch)
+        changes = self.variables.applyPatch(patch)
+        if changes:
+            self.serial["arduino"].postVariables(self.variables.values(), trace and trace.get("id"))
+            self.notifyDataWereReceived(trace)
+        elif changes is None and self.variables.outOfSync:
+            self.socket.emit(EXPERIMENT_REQUESTS_SNAPSHOT_SERVER)
+
+    def receiveSnapshot(self, snapshot: dict = {}):
+        """Receives all the variables and their sequence number from the server."""
+        self.variables.applySnapshot(snapshot)
+        self.serial["arduino"].postVariables(self.variables.values())
+
+    def sendSnapshot(self):
+        """Sends all the variables to the server, the experiment is the source of truth."""
+        self.socket.emit(EXPERIMENT_SENDS_SNAPSHOT_SERVER, self.variables.values())
+
+    def sendHistory(self, request: dict = {}):
+        """Sends a decimated window of the variables history, ex. {"seconds": 60, "points": 500}."""
+        self.socket.emit(EXPERIMENT_SENDS_HISTORY_SERVER, self.history.windowFromRequest(request))
 
     def streamVariables(self, lock: bool = True):
         """Streams variables to the web."""
         # Send changes to the server
-        self.socket.emit(EXPERIMENT_SENDS_DATA_SERVER, self.variables.json())
+        patch = self.variables.patch()
+        if len(patch["changes"]) == 0:
+            return
+        self.socket.emit(EXPERIMENT_SENDS_PATCH_SERVER, patch)
 
-        # Lock the GUI a wait for a response
-        if lock:
-            self.variablesTimer.resume(now=False) 
+        # Wait for a response
+        if lock and self.variables.isEnabled():
+            self.variables.waitResponse()
 
 
 if __name__ == "__main__":
@@ -99,12 +190,11 @@ if __name__ == "__main__":
         serverSettings=serverSettings,
         streamSettings=streamSettings,
         cameraSettings=cameraSettings,
-        serialSettings=serialSettings,
     )
     experiment.start(
         camera=True, 
         serial=True, 
         socket=True, 
-        streamer=False, 
+        streamer=True, # the relay sends the video to the web clients of the room
         wait=True
     )
\ No newline at end of file
@@ -4,6 +4,10 @@ const EXPERIMENT_SENDS_DATA_SERVER = "EXPERIMENT_SEND_DATA_SERVER"
 const EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER = "EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER"
 const EXPERIMENT_JOINS_ROOM_SERVER = "EXPERIMENT_JOINS_ROOM_SERVER"
 const EXPERIMENT_EMITS_EVENT_SERVER = "EXPERIMENT_EMITS_EVENT_SERVER"
+const EXPERIMENT_SENDS_PATCH_SERVER = "EXPERIMENT_SENDS_PATCH_SERVER"
+const EXPERIMENT_SENDS_SNAPSHOT_SERVER = "EXPERIMENT_SENDS_SNAPSHOT_SERVER"
+const EXPERIMENT_REQUESTS_SNAPSHOT_SERVER = "EXPERIMENT_REQUESTS_SNAPSHOT_SERVER"
+const EXPERIMENT_SENDS_HISTORY_SERVER = "EXPERIMENT_SENDS_HISTORY_SERVER"
 
 
 const SERVER_STREAMS_VIDEO_WEB = "SERVER_STREAMS_VIDEO_WEB"
@@ -13,6 +17,12 @@ const SERVER_REQUESTS_DATA_EXPERIMENT = "SERVER_REQUESTS_DATA_EXPERIMENT"
 const SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB = "SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB"
 const SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT = "SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT"
 const SERVER_EMITS_EVENT_WEB = "SERVER_EMITS_EVENT_WEB"
+const SERVER_SENDS_PATCH_EXPERIMENT = "SERVER_SENDS_PATCH_EXPERIMENT"
+const SERVER_SENDS_PATCH_WEB = "SERVER_SENDS_PATCH_WEB"
+const SERVER_SENDS_SNAPSHOT_EXPERIMENT = "SERVER_SENDS_SNAPSHOT_EXPERIMENT"
+const SERVER_SENDS_SNAPSHOT_WEB = "SERVER_SENDS_SNAPSHOT_WEB"
+const SERVER_REQUESTS_HISTORY_EXPERIMENT = "SERVER_REQUESTS_HISTORY_EXPERIMENT"
+const SERVER_SENDS_HISTORY_WEB = "SERVER_SENDS_HISTORY_WEB"
 
 
 const WEB_JOINS_ROOM_SERVER = "WEB_JOINS_ROOM_SERVER"
@@ -21,6 +31,13 @@ const WEB_SENDS_DATA_SERVER = "WEB_SENDS_DATA_SERVER"
 const WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER = "WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER"
 const WEB_EMITS_EVENT_SERVER = "WEB_EMITS_EVENT_SERVER"
 const WEB_REQUESTS_DATA_SERVER = "WEB_REQUESTS_DATA_SERVER"
+const WEB_SENDS_PATCH_SERVER = "WEB_SENDS_PATCH_SERVER"
+const WEB_REQUESTS_SNAPSHOT_SERVER = "WEB_REQUESTS_SNAPSHOT_SERVER"
+const WEB_REQUESTS_HISTORY_SERVER = "WEB_REQUESTS_HISTORY_SERVER"
+
+const CLIENT_REQUESTS_ENCODING_SERVER = "CLIENT_REQUESTS_ENCODING_SERVER"
+const SERVER_SENDS_ENCODING_CLIENT = "SERVER_SENDS_ENCODING_CLIENT"
+const TRACE_KEY = "_trace"
 
 /** EXTRA CONSTANTS */
 const MOCKUP_ROOM = "ROOM_X"
\ No newline at end of file
@@ -5,6 +5,7 @@ class CustomMockup {
         this.loadGUI();
         this.configureGUI();
         this.configureVariables();
+        this.configureTracing();
         this.configureSocket();
     }
 
@@ -43,7 +44,20 @@ class CustomMockup {
         this.socket.on("connect", this.updateConnectionStatus);
         this.socket.on("disconnect", this.updateConnectionStatus);
         this.socket.on(SERVER_SENDS_DATA_WEB, this.receiveVariables);
-        this.socket.on(SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB, this.variables.streamedSucessfully);
+        this.socket.on(SERVER_SENDS_PATCH_WEB, this.receivePatch);
+        this.socket.on(SERVER_SENDS_SNAPSHOT_WEB, this.receiveSnapshot);
+        this.socket.on(SERVER_SENDS_HISTORY_WEB, this.receiveHistory);
+        this.socket.on(SERVER_STREAMS_VIDEO_WEB, this.receiveVideo);
+        this.socket.on(SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB, this.receiveNotification);
+    }
+
+    /** Configures the tracing of the commands, it's enabled by the ?trace query param. */
+    configureTracing = () => {
+        this.tracer = null;
+        if(new URLSearchParams(window.location.search).has("trace")){
+            this.tracer = new Tracer();
+            window.tracer = this.tracer;
+        }
     }
 
     /** Configures variables */
@@ -101,6 +115,27 @@ class CustomMockup {
         }
     }
 
+    /**
+     * Receives the notification of the experiment, with the trace of the command if it had one.
+     * @param {object} trace - the trace with the stamps of each hop.
+     */
+    receiveNotification = (trace) => {
+        this.variables.streamedSucessfully();
+        this.tracer?.complete(trace);
+    }
+
+    /**
+     * Receives a video frame relayed by the server, the acknowledgment asks for the next one.
+     * @param {string|Object} frame - a base64 encoded video frame, or one by camera.
+     * @param {Function} ack - socketio acknowledgment callback.
+     */
+    receiveVideo = (frame, ack) => {
+        this.updateVideo(frame);
+        if(typeof ack === 'function'){
+            ack();
+        }
+    }
+
     /**
      * It's called when a socket connection event ocurrs.
      */
@@ -110,7 +145,7 @@ class CustomMockup {
         
         if(status){
             this.socket.volatile.emit(WEB_JOINS_ROOM_SERVER, MOCKUP_ROOM);
-            this.socket.emit(WEB_REQUESTS_DATA_SERVER);
+            this.socket.emit(WEB_REQUESTS_SNAPSHOT_SERVER);
         }
     }
 
@@ -124,12 +159,56 @@ class CustomMockup {
         this.socket.volatile.emit(WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER);
     }
 
+    /**
+     * Receives the changed variables, only new changes are confirmed to the experiment.
+     * @param {object} patch - a patch like {seq: 8, changes: {speed: 2}}.
+     */
+    receivePatch = (patch) => {
+        const changes = this.variables.applyPatch(patch);
+        if (changes && Object.keys(changes).length > 0){
+            this.setVariablesOnGUI();
+            this.socket.volatile.emit(WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER);
+        }else if(changes === null && this.variables.outOfSync){
+            this.socket.emit(WEB_REQUESTS_SNAPSHOT_SERVER);
+        }
+    }
+
+    /**
+     * Receives all the variables from the server, ex. after joining the room.
+     * @param {object} snapshot - a snapshot like {seq: 8, variables: {...}}.
+     */
+    receiveSnapshot = (snapshot) => {
+        this.variables.applySnapshot(snapshot);
+        this.setVariablesOnGUI();
+    }
+
+    /**
+     * Asks the experiment for the history of the variables, decimated for plotting.
+     * @param {number} seconds - last seconds of the history.
+     * @param {number} points - max points of each variable.
+     */
+    requestHistory = (seconds = 60, points = 500) => {
+        this.socket.emit(WEB_REQUESTS_HISTORY_SERVER, {seconds: seconds, points: points});
+    }
+
+    /**
+     * Receives a history window.
+     * @param {object} window - a window like {t: [...], columns: {speed: [...]}, events: [[t, kind, message]], start, end}.
+     */
+    receiveHistory = (window) => {
+        this.history = window;
+    }
+
     /**
      * Streams variables to the socketio server
      * @param {boolean} lock - lock the GUI?
      */
     streamVariables = (lock = true) => {
-        this.socket.emit(WEB_SENDS_DATA_SERVER, this.variables.values());
+        const patch = this.variables.patch();
+        if (Object.keys(patch.changes).length === 0){
+            return;
+        }
+        this.socket.emit(WEB_SENDS_PATCH_SERVER, this.tracer ? this.tracer.start(patch) : patch);
         if (lock && this.variables.isEnabled()){
             this.lockGUI();
             this.variables.waitResponse();
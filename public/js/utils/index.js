@@ -59,6 +59,10 @@ class Variables {
         this.backup = {...variables};
         this.enabled = enabled;
         this.streamingStatus = false;
+        this.seq = 0;
+        this.changed = new Set();
+        this.pending = new Map();
+        this.outOfSync = false;
         this.timer = new PausableTimer(interval, supervise);
     }
     /** It returns variables object. It will used when you pass a instance of this class to console.log()*/
@@ -71,6 +75,7 @@ class Variables {
      */
     restore(){
         this.variables = {...this.backup};
+        this.changed.clear();
     }
 
     /** 
@@ -92,6 +97,7 @@ class Variables {
             this.backup = {...this.variables};
         }
         this.variables[key] = value;
+        this.changed.add(key);
         this.setStreamingStatus(streamingStatus);
     }
     
@@ -130,11 +136,94 @@ class Variables {
         if (typeof variables === 'string'){
             variables = JSON.parse(variables);
         }
+        for (const key in variables){
+            if (this.variables[key] !== variables[key]){
+                this.changed.add(key);
+            }
+        }
         this.variables = {...variables};
         this.backup = {...variables};
         this.setStreamingStatus(true);
     }
 
+    /**
+     * Returns the changes since the last patch, and forgets them.
+     * The base is the last sequence number known, so the server can reject changes made over old values.
+     * @returns {object} - a patch like {base: 7, changes: {speed: 2}}.
+     */
+    patch = () => {
+        const changes = {};
+        this.changed.forEach((key) => {
+            if (key in this.variables){
+                changes[key] = this.variables[key];
+            }
+        });
+        this.changed.clear();
+        for (const key in changes){
+            this.pending.set(key, (this.pending.get(key) || 0) + 1);
+        }
+        return {base: this.seq, changes: changes};
+    }
+
+    /**
+     * Applies a patch of the server, like {seq: 8, changes: {speed: 2}}.
+     * Old patches are ignored, and if some patch was missed nothing is applied and outOfSync is set.
+     * Keys of our own patches still waiting for their echo keep the local value.
+     * @param {string | object} data - a patch.
+     * @returns {object | null} - the values that really changed (empty for the echo of our own patch), or null if it wasn't applied.
+     */
+    applyPatch = (data) => {
+        const patch = typeof data === 'string' ? JSON.parse(data) : data;
+        const seq = patch.seq || 0;
+        if (seq <= this.seq){
+            return null;
+        }
+        if (seq > this.seq + 1){
+            this.outOfSync = true;
+            return null;
+        }
+        const changed = {};
+        for (const key in patch.changes){
+            const pending = this.pending.get(key) || 0;
+            if (pending > 0){
+                // the echo of our own patch, the local value is the same or newer
+                if (pending === 1){
+                    this.pending.delete(key);
+                }else{
+                    this.pending.set(key, pending - 1);
+                }
+                continue;
+            }
+            if (this.variables[key] !== patch.changes[key]){
+                changed[key] = patch.changes[key];
+            }
+            this.variables[key] = patch.changes[key];
+            this.changed.delete(key);
+        }
+        this.backup = {...this.variables};
+        this.seq = seq;
+        return changed;
+    }
+
+    /** Returns all the variables and their sequence number. */
+    snapshot = () => {
+        return {seq: this.seq, variables: {...this.variables}};
+    }
+
+    /**
+     * Replaces all the variables by a snapshot of the server.
+     * @param {string | object} data - a snapshot like {seq: 8, variables: {...}}.
+     */
+    applySnapshot = (data) => {
+        const snapshot = typeof data === 'string' ? JSON.parse(data) : data;
+        this.variables = {...snapshot.variables};
+        this.backup = {...snapshot.variables};
+        this.seq = snapshot.seq || 0;
+        this.changed.clear();
+        this.pending.clear();
+        this.outOfSync = false;
+    }
+
     /** Returns the current streaming status */
     streamed = () => {
         return this.streamingStatus;
@@ -186,3 +275,140 @@ class Variables {
 
 }
 
+/** A video client for the binary WebSocket stream of the MJPEG server. */
+class VideoSocket {
+    /**
+     * Each message has a 12 bytes header (frame id as uint32 and capture time in ms as float64,
+     * little endian) followed by the JPEG image.
+     * @param {string} url - websocket address, ex. ws://localhost:8080/cam/webcam/ws
+     * @param {HTMLImageElement} image - element where frames are displayed.
+     * @param {number} maxLatency - frames older than this time (ms) are dropped.
+     */
+    constructor(url, image, maxLatency=500){
+        this.url = url;
+        this.image = image;
+        this.maxLatency = maxLatency;
+        this.frameId = 0;
+        this.latency = 0;
+        this.dropped = 0;
+        this.socket = null;
+        this.objectURL = null;
+    }
+
+    /** Opens the websocket connection */
+    start(){
+        this.socket = new WebSocket(this.url);
+        this.socket.binaryType = "arraybuffer";
+        this.socket.onmessage = (event) => this.receiveFrame(event.data);
+    }
+
+    /**
+     * Reads a frame message and displays it if it isn't late.
+     * @param {ArrayBuffer} data - header and JPEG image.
+     */
+    receiveFrame(data){
+        const header = new DataView(data, 0, 12);
+        const frameId = header.getUint32(0, true);
+        const captureTime = header.getFloat64(4, true);
+        this.latency = Date.now() - captureTime;
+        if(this.latency > this.maxLatency){
+            this.dropped++;
+            return;
+        }
+        this.frameId = frameId;
+        if(this.objectURL){
+            URL.revokeObjectURL(this.objectURL);
+        }
+        this.objectURL = URL.createObjectURL(new Blob([data.slice(12)], {type: "image/jpeg"}));
+        this.image.src = this.objectURL;
+    }
+
+    /** Closes the websocket connection */
+    stop(){
+        if(this.socket){
+            this.socket.close();
+        }
+    }
+}
+
+/** Opt-in tracing of the commands sent to the experiment, see utils/tracing.py. */
+class Tracer {
+    /**
+     * Each traced command carries an id and the time (ms) when it passed each hop, every
+     * hop is measured with stamps of the same clock.
+     * @param {number} capacity - last durations kept for each hop, and traces waiting for their ack.
+     */
+    constructor(capacity=500){
+        this.capacity = capacity;
+        this.pending = new Map();
+        this.durations = {};
+        this.count = 0;
+    }
+
+    /**
+     * Adds a new trace to a payload.
+     * @param {object} payload - a patch or a data message.
+     * @returns {object} the same payload.
+     */
+    start(payload){
+        const trace = {id: `${Date.now().toString(36)}-${(this.count++).toString(36)}`, webSent: Date.now()};
+        payload[TRACE_KEY] = trace;
+        this.pending.set(trace.id, trace.webSent);
+        if(this.pending.size > this.capacity){
+            this.pending.delete(this.pending.keys().next().value);
+        }
+        return payload;
+    }
+
+    /**
+     * Completes a trace that came back with the notification of the experiment, the traces
+     * of other clients are ignored.
+     * @param {object} trace - the trace with the stamps of each hop.
+     * @returns {object} the trace, or null if it isn't from this client.
+     */
+    complete(trace){
+        if(!trace || !this.pending.has(trace.id)){
+            return null;
+        }
+        this.pending.delete(trace.id);
+        trace.webAck = Date.now();
+        const hops = {
+            webRoundTrip: trace.webAck - trace.webSent,
+            webNetwork: trace.webAck - trace.webSent - (trace.relayAck - trace.relayIn),
+            relay: trace.relayOut - trace.relayIn,
+            rig: trace.rigOut - trace.rigIn,
+            rigNetwork: trace.relayAck - trace.relayOut - (trace.rigOut - trace.rigIn),
+        };
+        for(const hop in hops){
+            if(!isNaN(hops[hop])){
+                this.observe(hop, Math.max(0, hops[hop]));
+            }
+        }
+        console.debug("trace: ", trace, hops);
+        return trace;
+    }
+
+    /**
+     * Records the duration of a hop.
+     * @param {string} hop - name of the hop.
+     * @param {number} ms - duration in ms.
+     */
+    observe(hop, ms){
+        const durations = this.durations[hop] ??= [];
+        durations.push(ms);
+        if(durations.length > this.capacity){
+            durations.shift();
+        }
+    }
+
+    /** Returns the count, p50, p95 and max latency (ms) of each hop, ex. tracer.summary() on the console. */
+    summary(){
+        const summary = {};
+        for(const hop in this.durations){
+            const sorted = [...this.durations[hop]].sort((a, b) => a - b);
+            const at = (q) => sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))];
+            summary[hop] = {count: sorted.length, p50: at(0.5), p95: at(0.95), max: sorted[sorted.length - 1]};
+        }
+        return summary;
+    }
+}
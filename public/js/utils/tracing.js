@@ -0,0 +1,81 @@
+/** Opt-in tracing of the commands sent to the experiment, see utils/tracing.py. */
+export class Tracer {
+    /**
+     * Each traced command carries an id and the time (ms) when it passed each hop, every
+     * hop is measured with stamps of the same clock.
+     * @param {number} capacity - last durations kept for each hop, and traces waiting for their ack.
+     */
+    constructor(capacity=500){
+        this.capacity = capacity;
+        this.pending = new Map();
+        this.durations = {};
+        this.count = 0;
+    }
+
+    /**
+     * Adds a new trace to a payload.
+     * @param {object} payload - a patch or a data message.
+     * @returns {object} the same payload.
+     */
+    start(payload){
+        const trace = {id: `${Date.now().toString(36)}-${(this.count++).toString(36)}`, webSent: Date.now()};
+        payload[TRACE_KEY] = trace;
+        this.pending.set(trace.id, trace.webSent);
+        if(this.pending.size > this.capacity){
+            this.pending.delete(this.pending.keys().next().value);
+        }
+        return payload;
+    }
+
+    /**
+     * Completes a trace that came back with the notification of the experiment, the traces
+     * of other clients are ignored.
+     * @param {object} trace - the trace with the stamps of each hop.
+     * @returns {object} the trace, or null if it isn't from this client.
+     */
+    complete(trace){
+        if(!trace || !this.pending.has(trace.id)){
+            return null;
+        }
+        this.pending.delete(trace.id);
+        trace.webAck = Date.now();
+        const hops = {
+            webRoundTrip: trace.webAck - trace.webSent,
+            webNetwork: trace.webAck - trace.webSent - (trace.relayAck - trace.relayIn),
+            relay: trace.relayOut - trace.relayIn,
+            rig: trace.rigOut - trace.rigIn,
+            rigNetwork: trace.relayAck - trace.relayOut - (trace.rigOut - trace.rigIn),
+        };
+        for(const hop in hops){
+            if(!isNaN(hops[hop])){
+                this.observe(hop, Math.max(0, hops[hop]));
+            }
+        }
+        console.debug("trace: ", trace, hops);
+        return trace;
+    }
+
+    /**
+     * Records the duration of a hop.
+     * @param {string} hop - name of the hop.
+     * @param {number} ms - duration in ms.
+     */
+    observe(hop, ms){
+        const durations = this.durations[hop] ??= [];
+        durations.push(ms);
+        if(durations.length > this.capacity){
+            durations.shift();
+        }
+    }
+
+    /** Returns the count, p50, p95 and max latency (ms) of each hop, ex. tracer.summary() on the console. */
+    summary(){
+        const summary = {};
+        for(const hop in this.durations){
+            const sorted = [...this.durations[hop]].sort((a, b) => a - b);
+            const at = (q) => sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))];
+            summary[hop] = {count: sorted.length, p50: at(0.5), p95: at(0.95), max: sorted[sorted.length - 1]};
+        }
+        return summary;
+    }
+}
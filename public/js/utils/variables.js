@@ -14,6 +14,10 @@ export class Variables {
         this.backup = {...variables};
         this.enabled = enabled;
         this.streamingStatus = false;
+        this.seq = 0;
+        this.changed = new Set();
+        this.pending = new Map();
+        this.outOfSync = false;
         this.timer = new PausableTimer(interval, supervise);
     }
     /** It returns variables object. It will used when you pass a instance of this class to console.log()*/
@@ -26,6 +30,7 @@ export class Variables {
      */
     restore(){
         this.variables = {...this.backup};
+        this.changed.clear();
     }
 
     /** 
@@ -47,6 +52,7 @@ export class Variables {
             this.backup = {...this.variables};
         }
         this.variables[key] = value;
+        this.changed.add(key);
         this.setStreamingStatus(streamingStatus);
     }
     
@@ -85,11 +91,94 @@ export class Variables {
         if (typeof variables === 'string'){
             variables = JSON.parse(variables);
         }
+        for (const key in variables){
+            if (this.variables[key] !== variables[key]){
+                this.changed.add(key);
+            }
+        }
         this.variables = {...variables};
         this.backup = {...variables};
         this.setStreamingStatus(true);
     }
 
+    /**
+     * Returns the changes since the last patch, and forgets them.
+     * The base is the last sequence number known, so the server can reject changes made over old values.
+     * @returns {object} - a patch like {base: 7, changes: {speed: 2}}.
+     */
+    patch = () => {
+        const changes = {};
+        this.changed.forEach((key) => {
+            if (key in this.variables){
+                changes[key] = this.variables[key];
+            }
+        });
+        this.changed.clear();
+        for (const key in changes){
+            this.pending.set(key, (this.pending.get(key) || 0) + 1);
+        }
+        return {base: this.seq, changes: changes};
+    }
+
+    /**
+     * Applies a patch of the server, like {seq: 8, changes: {speed: 2}}.
+     * Old patches are ignored, and if some patch was missed nothing is applied and outOfSync is set.
+     * Keys of our own patches still waiting for their echo keep the local value.
+     * @param {string | object} data - a patch.
+     * @returns {object | null} - the values that really changed (empty for the echo of our own patch), or null if it wasn't applied.
+     */
+    applyPatch = (data) => {
+        const patch = typeof data === 'string' ? JSON.parse(data) : data;
+        const seq = patch.seq || 0;
+        if (seq <= this.seq){
+            return null;
+        }
+        if (seq > this.seq + 1){
+            this.outOfSync = true;
+            return null;
+        }
+        const changed = {};
+        for (const key in patch.changes){
+            const pending = this.pending.get(key) || 0;
+            if (pending > 0){
+                // the echo of our own patch, the local value is the same or newer
+                if (pending === 1){
+                    this.pending.delete(key);
+                }else{
+                    this.pending.set(key, pending - 1);
+                }
+                continue;
+            }
+            if (this.variables[key] !== patch.changes[key]){
+                changed[key] = patch.changes[key];
+            }
+            this.variables[key] = patch.changes[key];
+            this.changed.delete(key);
+        }
+        this.backup = {...this.variables};
+        this.seq = seq;
+        return changed;
+    }
+
+    /** Returns all the variables and their sequence number. */
+    snapshot = () => {
+        return {seq: this.seq, variables: {...this.variables}};
+    }
+
+    /**
+     * Replaces all the variables by a snapshot of the server.
+     * @param {string | object} data - a snapshot like {seq: 8, variables: {...}}.
+     */
+    applySnapshot = (data) => {
+        const snapshot = typeof data === 'string' ? JSON.parse(data) : data;
+        this.variables = {...snapshot.variables};
+        this.backup = {...snapshot.variables};
+        this.seq = snapshot.seq || 0;
+        this.changed.clear();
+        this.pending.clear();
+        this.outOfSync = false;
+    }
+
     /** Returns the current streaming status */
     streamed = () => {
         return this.streamingStatus;
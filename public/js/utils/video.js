@@ -0,0 +1,55 @@
+/** A video client for the binary WebSocket stream of the MJPEG server. */
+export class VideoSocket {
+    /**
+     * Each message has a 12 bytes header (frame id as uint32 and capture time in ms as float64,
+     * little endian) followed by the JPEG image.
+     * @param {string} url - websocket address, ex. ws://localhost:8080/cam/webcam/ws
+     * @param {HTMLImageElement} image - element where frames are displayed.
+     * @param {number} maxLatency - frames older than this time (ms) are dropped.
+     */
+    constructor(url, image, maxLatency=500){
+        this.url = url;
+        this.image = image;
+        this.maxLatency = maxLatency;
+        this.frameId = 0;
+        this.latency = 0;
+        this.dropped = 0;
+        this.socket = null;
+        this.objectURL = null;
+    }
+
+    /** Opens the websocket connection */
+    start(){
+        this.socket = new WebSocket(this.url);
+        this.socket.binaryType = "arraybuffer";
+        this.socket.onmessage = (event) => this.receiveFrame(event.data);
+    }
+
+    /**
+     * Reads a frame message and displays it if it isn't late.
+     * @param {ArrayBuffer} data - header and JPEG image.
+     */
+    receiveFrame(data){
+        const header = new DataView(data, 0, 12);
+        const frameId = header.getUint32(0, true);
+        const captureTime = header.getFloat64(4, true);
+        this.latency = Date.now() - captureTime;
+        if(this.latency > this.maxLatency){
+            this.dropped++;
+            return;
+        }
+        this.frameId = frameId;
+        if(this.objectURL){
+            URL.revokeObjectURL(this.objectURL);
+        }
+        this.objectURL = URL.createObjectURL(new Blob([data.slice(12)], {type: "image/jpeg"}));
+        this.image.src = this.objectURL;
+    }
+
+    /** Closes the websocket connection */
+    stop(){
+        if(this.socket){
+            this.socket.close();
+        }
+    }
+}
@@ -1,6 +1,51 @@
-"""Executes a test server."""
-from server.app import app
+"""Executes a test server.
+
+Usage:
+    python run_server.py --port 3000 --workers 4
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from server.app import app, useBus
+
+
+def startHub() -> tuple:
+    """Starts the bus of the workers on its own process, it returns the process and its address."""
+    address = os.path.join(tempfile.mkdtemp(prefix="relay-"), "bus.sock")
+    # a subprocess, so the multiprocessing start method is left to Sanic
+    hub = subprocess.Popen([sys.executable, "-m", "server.bus", address])
+    deadline = time.time() + 5
+    while not os.path.exists(address) and time.time() < deadline:
+        time.sleep(0.05)
+    return hub, address
 
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=3000)
+    parser = argparse.ArgumentParser(description="socketIO relay server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, they accept websocket clients only (slower without spare cores, see README)")
+    parser.add_argument("--max-rate", type=float, default=20, help="max data messages/s by room, 0 to relay all")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG logs every message")
+    args = parser.parse_args()
+
+    # read by each worker when it starts
+    os.environ["RELAY_MAX_RATE"] = str(args.max_rate)
+    os.environ["RELAY_LOG_LEVEL"] = args.log_level
+
+    hub = None
+    if args.workers > 1:
+        hub, address = startHub()
+        # forked workers inherit the manager, spawned ones import the app with this variable
+        os.environ["RELAY_BUS_ADDRESS"] = address
+        useBus(address)
+    try:
+        app.run(host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if hub is not None:
+            hub.terminate()
+            shutil.rmtree(os.path.dirname(address), ignore_errors=True)
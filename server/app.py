@@ -1,8 +1,36 @@
-"""A socketIO server."""
+"""A socketIO server.
+
+It runs on a single process, or on several workers (``run_server.py --workers``) that
+share the emits and the state of the rooms with clients on several workers through a
+local bus (``server/bus.py``). A room whose clients are all on one worker is handled by
+that worker alone, it doesn't use the bus. The video of each experiment is sent once to
+each worker of its room, which fans it out to its web clients (``server/video.py``). Traced commands of the web clients (see
+``utils/tracing.py``) are stamped on their way, and their hops are on ``/metrics``.
+
+Settings are taken from environment variables, set by ``run_server.py``:
+    RELAY_MAX_RATE: max data messages per second relayed for each room, faster ones
+        are merged (latest value of each key). 0 relays every message.
+    RELAY_LOG_LEVEL: the messages themselves are logged on DEBUG.
+"""
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import logging
+import os
+import queue
 import socketio
 from sanic import Sanic
 from sanic.response import text
+from server.bus import LocalBusManager
+from server.coalescing import Coalescer
 from server.routes import *
+from server.state import RoomState
+from server.video import VideoRelay
+from utils.tracing import Tracer, popTrace, stamp
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 
 sio = socketio.AsyncServer(async_mode='sanic', cors_allowed_origins=[])
@@ -11,51 +39,563 @@ app.config['CORS_AUTOMATIC_OPTIONS'] = True
 app.config['CORS_SUPPORTS_CREDENTIALS'] = True
 sio.attach(app)
 
+# set by run_server.py when there are several workers
+BUS_ADDRESS = os.environ.get("RELAY_BUS_ADDRESS")
+
+logger = logging.getLogger("server")
+
+
+def setupLogging(level: str = "INFO") -> QueueListener:
+    """Logs from a thread: the event loop only puts the records on a queue, so it doesn't
+    wait for the terminal. Per message logs are on DEBUG, so they cost nothing above it."""
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s server: %(message)s"))
+    listener = QueueListener(records, handler)
+    logger.handlers = [QueueHandler(records)]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+# room, role ("web" or "experiment") and encoding of each client (sid), and the versioned
+# variables of each room (until its last client leaves). Messages are routed only inside a
+# room, and by role: each room has a sub-room for its experiments and another for its web
+# clients (and one more for each role with the clients that negotiated msgpack).
+clientRooms = {}
+clientRoles = {}
+clientEncodings = {}
+states = {}
+
+WEB = "web"
+EXPERIMENT = "experiment"
+
+JSON = "json"
+MSGPACK = "msgpack"
+ENCODINGS = [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+def roleRoom(room: str, role: str, encoding: str = JSON) -> str:
+    """Returns the sub-room of the clients of a room with some role and encoding."""
+    return f"{room}/{role}" if encoding == JSON else f"{room}/{role}/{encoding}"
+
+
+def encode(data, encoding: str = JSON):
+    """Encodes a payload for a client, msgpack payloads are sent as binary."""
+    if encoding == MSGPACK and data is not None:
+        return msgpack.packb(data)
+    return data
+
+
+def decode(data):
+    """Decodes the payload of a client, binary payloads are msgpack."""
+    if msgpack is not None and isinstance(data, (bytes, bytearray)):
+        return msgpack.unpackb(data)
+    return data
+
+
+def stateOf(sid) -> tuple:
+    """Returns the room of a client and the variables state of that room, or None."""
+    room = clientRooms.get(sid)
+    return room, states.get(room)
+
+
+async def joinRoom(sid, room: str, role: str):
+    """Moves a client to a room (or to the sub-room of its new encoding), it leaves its
+    previous rooms."""
+    previous = clientRooms.get(sid)
+    for name in sio.rooms(sid):
+        if name != sid:
+            sio.leave_room(sid, name)
+    if previous is not None and previous != room:
+        await replicate("removeMember", previous, sid)
+    encoding = clientEncodings.get(sid, JSON)
+    sio.enter_room(sid, room)
+    sio.enter_room(sid, roleRoom(room, role, encoding))
+    clientRooms[sid] = room
+    clientRoles[sid] = role
+    if role == WEB:
+        video.add(sid, room)
+    else:
+        video.remove(sid)
+    await replicate("addMember", room, sid, role, None if encoding == JSON else encoding, hostId())
+
+
+async def emitToRoom(event: str, data, room: str, role: str = None):
+    """Emits an event to a room, or only to the clients of that room with some role. The
+    payload is encoded once for each encoding used by those clients."""
+    local = not isShared(room)
+    if role is None:
+        await sio.emit(event, data, room=room, ignore_queue=local)
+        return
+    await sio.emit(event, data, room=roleRoom(room, role), ignore_queue=local)
+    state = states.get(room)
+    if msgpack is not None and data is not None and state is not None and state.hasEncoding(role, MSGPACK):
+        await sio.emit(event, encode(data, MSGPACK), room=roleRoom(room, role, MSGPACK), ignore_queue=local)
+
+
+async def emitTo(event: str, data=None, sid=None, role: str = None):
+    """Emits an event to the room of a client (sid), or only to the clients of that room
+    with some role. Clients out of a room don't reach anybody."""
+    room = clientRooms.get(sid)
+    if room is not None:
+        await emitToRoom(event, data, room, role)
+
+
+async def emitToClient(event: str, data, sid, state: RoomState = None):
+    """Emits an event to a client with its encoding, the state of its room tells the
+    encoding of clients of other workers."""
+    encoding = clientEncodings.get(sid) or (state.encodings.get(sid) if state is not None else None) or JSON
+    await sio.emit(event, encode(data, encoding), to=sid, ignore_queue=sid in clientRooms)
+
+
+async def sendData(key: tuple, data):
+    """Relays the (coalesced) data messages of a room, the experiment data is cached.
+    Traces of the web data only go to the experiment."""
+    room, role = key
+    if role == EXPERIMENT:
+        await replicate("setData", room, None, data)
+        await emitToRoom(SERVER_SENDS_DATA_WEB, data, room, WEB)
+        return
+    trace = popTrace(data)
+    if trace is None:
+        await emitToRoom(SERVER_SENDS_DATA_EXPERIMENT, data, room, EXPERIMENT)
+    else:
+        await emitToRoom(SERVER_SENDS_DATA_EXPERIMENT, {**data, TRACE_KEY: stamp(trace, "relayOut")}, room, EXPERIMENT)
+    await emitToRoom(SERVER_SENDS_DATA_WEB, data, room, WEB)
+
+
+# data messages by (room, sender role)
+coalescer = Coalescer(sendData)
+
+
+async def sendFrame(sid, frame, callback):
+    """Sends a video frame to a local web client, its acknowledgment calls the callback."""
+    await sio.emit(SERVER_STREAMS_VIDEO_WEB, frame, to=sid, callback=callback, ignore_queue=True)
+
+
+# video frames of each room for the web clients of this worker
+video = VideoRelay(sendFrame)
+
+
+async def receiveFrame(message: dict):
+    await video.push(message["room"], message["frame"])
+
+
+# latency of the hops of the traced commands, every worker observes every trace
+tracer = Tracer(name="relay_trace_hop_seconds")
+
+
+async def receiveTrace(message: dict):
+    tracer.observe(message["trace"])
+
+
+@app.route("/metrics")
+async def metrics(request):
+    """Latency histograms of the traced commands, on the Prometheus text format."""
+    return text(tracer.registry.render(), content_type="text/plain; version=0.0.4")
+
+
+@app.listener("before_server_start")
+async def configure(app, *args):
+    """Applies the settings of the environment, on each worker. Workers listen to the bus
+    from the start (socketio would start with the first client), so the ones without
+    clients yet don't miss the state of the rooms."""
+    setupLogging(os.environ.get("RELAY_LOG_LEVEL", "INFO"))
+    coalescer.rate = float(os.environ.get("RELAY_MAX_RATE", 20))
+    if isDistributed() and not sio.manager_initialized:
+        sio.manager_initialized = True
+        sio.manager.initialize()
+        await sio.manager.connectBus()
+
+
+def useBus(address: str):
+    """Shares the emits and the state of the rooms with other workers through a BusHub.
+    Args:
+        address: path of the hub unix socket.
+    """
+    manager = LocalBusManager(address)
+    manager.on("state", receiveStateMessage)
+    manager.on("video", receiveFrame)
+    manager.on("trace", receiveTrace)
+    sio.manager = manager
+    manager.set_server(sio)
+
+
+def isDistributed() -> bool:
+    """Checks if the server is one of several workers."""
+    return isinstance(sio.manager, LocalBusManager)
+
+
+def hostId() -> str:
+    """Returns the id of this worker on the bus, or None."""
+    return sio.manager.host_id if isDistributed() else None
+
+
+def isShared(room: str) -> bool:
+    """Checks if a room has clients on other workers (or it could have them soon), only
+    then its operations and emits go through the bus."""
+    if not isDistributed():
+        return False
+    if room in syncing or room in inFlight:
+        return True
+    state = states.get(room)
+    return state is not None and len(state.workers() - {hostId()}) > 0
+
+
+@app.on_request
+async def websocketOnly(request):
+    """The requests of a polling client could reach different workers, so only websocket
+    clients (a single connection, it stays on its worker) are accepted by several workers."""
+    if isDistributed() and request.path.startswith("/socket.io") and request.args.get("transport") == "polling":
+        return text("Use the websocket transport, the server has several workers.", status=400)
+
+
+# Operations on the state of the rooms. Each worker has a copy of the states. Operations
+# on a room with clients on several workers go through the bus, so every copy applies the
+# same operations in the same order, and only the worker of the client who started the
+# operation (local) emits its results. A room with clients on one worker only is changed
+# by that worker alone, its copy is sent to the next worker that gets a client of the
+# room (see shareRoom). Clients join and leave through the bus, so every worker knows
+# where the clients of each room are.
+stateOperations = {}
+membershipOperations = ("addMember", "removeMember")
+
+# rooms whose state is on its way from another worker, with their operations received
+# meanwhile; the number of own operations still on the bus by room (later ones go through
+# the bus too, so they can't overtake them); and the workers waiting for the state of
+# each room
+syncing = {}
+inFlight = {}
+awaiting = {}
+
+
+def stateOperation(function):
+    """Registers a coroutine like ``function(state, sid, *args, local)``."""
+    stateOperations[function.__name__] = function
+    return function
+
+
+async def replicate(operation: str, room: str, sid, *args):
+    """Applies an operation on the state of a room, on every worker.
+    Args:
+        operation: name of the operation.
+        room: name of the room.
+        sid: client who started the operation.
+    """
+    message = {"method": "state", "operation": operation, "room": room, "sid": sid, "args": args}
+    if isShared(room) or (isDistributed() and operation in membershipOperations):
+        await publishState(message)
+    else:
+        await applyStateMessage(message, local=True)
+
+
+async def publishState(message: dict):
+    """Sends a state operation to every worker through the bus."""
+    room = message["room"]
+    inFlight[room] = inFlight.get(room, 0) + 1
+    await sio.manager.publish({**message, "host_id": hostId()})
+
+
+async def receiveStateMessage(message: dict):
+    """Applies an operation of the bus. The operations on a room whose state is on its
+    way from another worker wait for it."""
+    room = message["room"]
+    local = message["host_id"] == hostId()
+    if local:
+        inFlight[room] = inFlight.get(room, 1) - 1
+        if inFlight[room] == 0:
+            del inFlight[room]
+    if room not in syncing:
+        await applyStateMessage(message, local)
+    elif message["operation"] == "restore" and message["args"][0] == hostId():
+        waiting = syncing.pop(room)
+        await applyStateMessage(message, local)
+        for message, local in waiting:
+            if room in syncing:
+                syncing[room].append((message, local))
+            else:
+                await applyStateMessage(message, local)
+    else:
+        syncing[room].append((message, local))
+
+
+async def applyStateMessage(message: dict, local: bool):
+    room = message["room"]
+    if room not in states:
+        states[room] = RoomState()
+    state = states[room]
+    if message["operation"] == "restore":
+        restore(room, state, *message["args"])
+        return
+    if message["operation"] == "addMember" and isDistributed():
+        await shareRoom(room, state, message["args"][-1])
+    await stateOperations[message["operation"]](state, message["sid"], *message["args"], local=local)
+    if message["operation"] == "removeMember" and len(state.members) == 0:
+        forgetRoom(room)
+
+
+def forgetRoom(room: str):
+    """Drops the state of a room after its last client left."""
+    states.pop(room, None)
+    awaiting.pop(room, None)
+    coalescer.discard((room, WEB))
+    coalescer.discard((room, EXPERIMENT))
+
+
+async def shareRoom(room: str, state: RoomState, host: str):
+    """Called before a client of a worker (host) joins a room. If that worker has no
+    client of the room yet but others have, one of them sends it the state of the room,
+    and it keeps the operations on the room until the state arrives."""
+    workers = state.workers()
+    senders = workers - awaiting.get(room, set())
+    if host in workers or len(senders) == 0:
+        return
+    awaiting.setdefault(room, set()).add(host)
+    if host == hostId():
+        syncing[room] = []
+    elif len(senders) > 0 and min(senders) == hostId():
+        await publishState({"method": "state", "operation": "restore", "room": room, "sid": None, "args": (host, state.dump())})
+
+
+def restore(room: str, state: RoomState, host: str, dump: dict):
+    """Takes the state of a room sent to a worker (host), if it's this one."""
+    waiting = awaiting.get(room, set())
+    waiting.discard(host)
+    if len(waiting) == 0:
+        awaiting.pop(room, None)
+    if host == hostId():
+        state.load(dump)
+
+
+@stateOperation
+async def addMember(state: RoomState, sid, role: str, encoding: str, host: str, local: bool):
+    state.join(sid, role, encoding, host)
+
+
+@stateOperation
+async def removeMember(state: RoomState, sid, local: bool):
+    # the cached state is valid while an experiment of the room is connected
+    if state.leave(sid) == EXPERIMENT and not state.hasMember(EXPERIMENT):
+        state.evict()
+
+
+@stateOperation
+async def setSnapshot(state: RoomState, sid, variables: dict, local: bool):
+    state.setVariables(variables, sid)
+    state.touch()
+    if local:
+        await emitToClient(SERVER_SENDS_SNAPSHOT_EXPERIMENT, state.snapshot(), sid)
+        await emitTo(SERVER_SENDS_SNAPSHOT_WEB, state.snapshot(), sid=sid, role=WEB)
+
+
+@stateOperation
+async def applyPatch(state: RoomState, sid, patch: dict, snapshotRoute: str, experiment: bool, trace: dict, local: bool):
+    """Applies a patch and relays the accepted changes. If some change was stale, the
+    sender gets a snapshot to resynchronize. A trace of the sender goes to the experiments."""
+    accepted, rejected = state.applyPatch(patch, sid)
+    if experiment:
+        state.touch()
+    if not local:
+        return
+    if len(rejected) > 0:
+        await emitToClient(snapshotRoute, state.snapshot(), sid)
+    if accepted is not None:
+        if trace is None:
+            await emitTo(SERVER_SENDS_PATCH_EXPERIMENT, accepted, sid=sid, role=EXPERIMENT)
+        else:
+            await emitTo(SERVER_SENDS_PATCH_EXPERIMENT, {**accepted, TRACE_KEY: stamp(trace, "relayOut")}, sid=sid, role=EXPERIMENT)
+        await emitTo(SERVER_SENDS_PATCH_WEB, accepted, sid=sid, role=WEB)
+
+
+@stateOperation
+async def setData(state: RoomState, sid, data, local: bool):
+    state.setData(data)
+
+
+@stateOperation
+async def sendWebSnapshot(state: RoomState, sid, local: bool):
+    """Answers a web client from the last known state, or asks the experiment for it."""
+    if not local:
+        return
+    if not state.isCached():
+        await emitTo(SERVER_REQUESTS_DATA_EXPERIMENT, sid=sid, role=EXPERIMENT)
+        return
+    # the snapshot tells how old it is
+    if not state.isEmpty():
+        await emitToClient(SERVER_SENDS_SNAPSHOT_WEB, state.snapshot(), sid)
+    if state.data is not None:
+        await emitToClient(SERVER_SENDS_DATA_WEB, state.data, sid)
+
+
+@stateOperation
+async def sendExperimentSnapshot(state: RoomState, sid, local: bool):
+    if local:
+        await emitToClient(SERVER_SENDS_SNAPSHOT_EXPERIMENT, state.snapshot(), sid)
+
 
 @sio.on("connect")
 async def connect(sid, environ):
-    print("connected sid :", sid)
+    logger.info("connected sid: %s", sid)
 
 
 @sio.on("disconnect")
-async def disconnect(environ):
-    print("disconneted sid: ", environ)
+async def disconnect(sid):
+    logger.info("disconnected sid: %s", sid)
+    room = clientRooms.pop(sid, None)
+    role = clientRoles.pop(sid, None)
+    clientEncodings.pop(sid, None)
+    video.remove(sid)
+    if room is not None:
+        # its last data goes before it leaves (and maybe evicts the cache)
+        await coalescer.flush((room, role))
+        await replicate("removeMember", room, sid)
 
 
 @sio.on(WEB_JOINS_ROOM_SERVER)
 async def web_joins_room(sid, room):
-    print(f"web sid: {sid}, room: {room}")
-    sio.enter_room(sid, room)
-    await sio.emit(SERVER_REQUESTS_DATA_EXPERIMENT)
+    logger.info("web sid: %s, room: %s", sid, room)
+    await joinRoom(sid, room, WEB)
+    await web_requests_snapshot(sid)
 
 
 @sio.on(EXPERIMENT_JOINS_ROOM_SERVER)
 async def experiment_joins_room(sid, room):
-    sio.enter_room(sid, room)
+    logger.info("experiment sid: %s, room: %s", sid, room)
+    await joinRoom(sid, room, EXPERIMENT)
+
+
+@sio.on(CLIENT_REQUESTS_ENCODING_SERVER)
+async def client_requests_encoding(sid, encodings=[JSON]):
+    """Picks the first encoding of a client list that the server supports, ex. ["msgpack", "json"]."""
+    encoding = next((value for value in encodings if value in ENCODINGS), JSON)
+    clientEncodings[sid] = encoding
+    if sid in clientRooms:
+        await joinRoom(sid, clientRooms[sid], clientRoles[sid])
+    await sio.emit(SERVER_SENDS_ENCODING_CLIENT, encoding, to=sid)
+
+
+@sio.on(WEB_REQUESTS_SNAPSHOT_SERVER)
+async def web_requests_snapshot(sid, *args):
+    """Answered in the order of the operations on the room, see sendWebSnapshot."""
+    room = clientRooms.get(sid)
+    if room is not None:
+        await replicate("sendWebSnapshot", room, sid)
+
+
+@sio.on(EXPERIMENT_REQUESTS_SNAPSHOT_SERVER)
+async def experiment_requests_snapshot(sid, *args):
+    room = clientRooms.get(sid)
+    if room is not None:
+        await replicate("sendExperimentSnapshot", room, sid)
+
+
+@sio.on(EXPERIMENT_SENDS_SNAPSHOT_SERVER)
+async def experiment_sends_snapshot(sid, variables):
+    room = clientRooms.get(sid)
+    if room is not None:
+        await replicate("setSnapshot", room, sid, decode(variables))
+
+
+async def relay_patch(sid, patch: dict, snapshotRoute: str):
+    """Applies a patch to the room state, see applyPatch."""
+    room = clientRooms.get(sid)
+    if room is not None:
+        patch = decode(patch)
+        trace = popTrace(patch)
+        if trace is not None:
+            stamp(trace, "relayIn")
+        await replicate("applyPatch", room, sid, patch, snapshotRoute, clientRoles.get(sid) == EXPERIMENT, trace)
+
+
+@sio.on(EXPERIMENT_SENDS_PATCH_SERVER)
+async def experiment_sends_patch(sid, patch):
+    logger.debug("experiment %s sends patch: %s", sid, patch)
+    await relay_patch(sid, patch, SERVER_SENDS_SNAPSHOT_EXPERIMENT)
+
+
+@sio.on(WEB_SENDS_PATCH_SERVER)
+async def web_sends_patch(sid, patch):
+    logger.debug("web %s sends patch: %s", sid, patch)
+    await relay_patch(sid, patch, SERVER_SENDS_SNAPSHOT_WEB)
+
+
+@sio.on(WEB_REQUESTS_HISTORY_SERVER)
+async def web_requests_history(sid, request={}):
+    """Asks the experiment for a decimated window of its history, ex. {"seconds": 60, "points": 500}."""
+    await emitTo(SERVER_REQUESTS_HISTORY_EXPERIMENT, {**(decode(request) or {}), "sid": sid}, sid=sid, role=EXPERIMENT)
+
+
+@sio.on(EXPERIMENT_SENDS_HISTORY_SERVER)
+async def experiment_sends_history(sid, window):
+    """Sends a history window to the web client that asked for it, if it's on the same room."""
+    room, state = stateOf(sid)
+    if state is None:
+        return
+    window = decode(window)
+    to = window.pop("sid", None)
+    if to is None:
+        await emitTo(SERVER_SENDS_HISTORY_WEB, window, sid=sid, role=WEB)
+    elif state.members.get(to) == WEB:
+        await emitToClient(SERVER_SENDS_HISTORY_WEB, window, to, state)
 
 
 @sio.on(EXPERIMENT_SENDS_DATA_SERVER)
-async def callback(sid, data):
-    print("Experiment: ", data)
-    await sio.emit(SERVER_SENDS_DATA_WEB, data)
+async def experiment_sends_data(sid, data):
+    logger.debug("experiment %s sends data: %s", sid, data)
+    room = clientRooms.get(sid)
+    if room is not None:
+        await coalescer.post((room, EXPERIMENT), decode(data))
 
 
 @sio.on(WEB_SENDS_DATA_SERVER)
-async def server_receives_data(sid, data):
-    print("Web: ", data)
-    await sio.emit(SERVER_SENDS_DATA_EXPERIMENT, data)
-    await sio.emit(SERVER_SENDS_DATA_WEB, data)
+async def web_sends_data(sid, data):
+    logger.debug("web %s sends data: %s", sid, data)
+    room = clientRooms.get(sid)
+    if room is not None:
+        data = decode(data)
+        if isinstance(data, dict) and TRACE_KEY in data:
+            # merged data keep the trace of the latest message
+            stamp(data[TRACE_KEY], "relayIn")
+        await coalescer.post((room, WEB), data)
+
+
+@sio.on(EXPERIMENT_STREAMS_VIDEO_SERVER)
+async def experiment_streams_video(sid, frame):
+    """Relays an encoded frame (or a dict of frames by camera) to the web clients of the
+    room, each worker gets it once (if the room is shared). Frames are not decoded."""
+    room = clientRooms.get(sid)
+    if room is None or clientRoles.get(sid) != EXPERIMENT:
+        return
+    message = {"method": "video", "room": room, "frame": frame}
+    if isShared(room):
+        await sio.manager.publish(message)
+    else:
+        await receiveFrame(message)
 
 
 @sio.on(EXPERIMENT_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
-async def callback(sid):
-    await sio.emit(SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB)
+async def experiment_notifies_data_were_received(sid, trace=None):
+    """Notifies the web clients, a trace goes back to them with its hops observed."""
+    if trace is None:
+        await emitTo(SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB, sid=sid, role=WEB)
+        return
+    trace = stamp(decode(trace), "relayAck")
+    if isDistributed():
+        await sio.manager.publish({"method": "trace", "trace": trace})
+    else:
+        tracer.observe(trace)
+    await emitTo(SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB, trace, sid=sid, role=WEB)
 
 
 @sio.on(WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER)
-async def callback(sid):
-    await sio.emit(SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT)
+async def web_notifies_data_were_received(sid):
+    await emitTo(SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT, sid=sid, role=EXPERIMENT)
+
 
+if BUS_ADDRESS is not None:
+    useBus(BUS_ADDRESS)
 
 # if __name__ == '__main__':
 #     app.run(host="0.0.0.0", port=3000)
\ No newline at end of file
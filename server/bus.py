@@ -0,0 +1,162 @@
+"""A local message bus, so the socketIO server could run on several worker processes.
+
+A hub process listens on a unix socket and forwards every message to all the workers,
+the sender included, so all of them see the messages in the same order. Each worker
+uses a LocalBusManager as the socketio client manager: emits are published on the bus
+and every worker delivers them to its own clients. No external broker is needed.
+"""
+from typing import Callable
+import asyncio
+import logging
+import os
+import pickle
+import struct
+from socketio.asyncio_pubsub_manager import AsyncPubSubManager
+
+
+HEADER = struct.Struct("!I")
+
+logger = logging.getLogger("server.bus")
+
+
+def pack(message: dict) -> bytes:
+    """Frames a message: its size (4 bytes) and the pickled message."""
+    data = pickle.dumps(message)
+    return HEADER.pack(len(data)) + data
+
+
+async def readFrame(reader: asyncio.StreamReader) -> bytes:
+    """Reads a framed message, without unpickling it."""
+    header = await reader.readexactly(HEADER.size)
+    return await reader.readexactly(HEADER.unpack(header)[0])
+
+
+class BusHub:
+    """Forwards the messages of each peer to every peer. It waits until every peer has
+    taken a message before it reads the next one of the same sender, so a slow worker
+    slows the publishers down instead of growing the buffers of the hub.
+    Args:
+        address: path of the unix socket.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self.peers = set()
+
+    async def attend(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.peers.add(writer)
+        try:
+            while True:
+                data = await readFrame(reader)
+                frame = HEADER.pack(len(data)) + data
+                peers = list(self.peers)
+                for peer in peers:
+                    peer.write(frame)
+                for peer in peers:
+                    try:
+                        await peer.drain()
+                    except ConnectionError as e:
+                        logger.warning("peer lost :: %s", e)
+                        self.peers.discard(peer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+
+    async def serve(self):
+        """Serves until the process ends, only the owner could use the socket."""
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        server = await asyncio.start_unix_server(self.attend, path=self.address)
+        os.chmod(self.address, 0o600)
+        async with server:
+            await server.serve_forever()
+
+
+def runHub(address: str):
+    """Runs a hub, it's the target of the hub process."""
+    try:
+        asyncio.run(BusHub(address).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+class LocalBusManager(AsyncPubSubManager):
+    """A socketio client manager that shares the emits of several workers through a BusHub.
+
+    Other kinds of messages could go through the bus too: ``on(method, handler)``
+    registers a coroutine for the messages with that ``method``, ex. to replicate a state.
+    They are handled on every worker, in the order of the bus.
+
+    Args:
+        address: path of the hub unix socket.
+        reconnectDelay: wait time between connection attempts.
+    """
+
+    name = "localbus"
+
+    def __init__(self, address: str, channel: str = "socketio", write_only: bool = False, logger=None,
+                 reconnectDelay: float = 0.5):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = address
+        self.reconnectDelay = reconnectDelay
+        self.handlers = {}
+        self.reader = None
+        self.writer = None
+        self.connecting = None
+        self.listener = None
+
+    def on(self, method: str, handler: Callable):
+        """Handles the messages like {"method": method, ...} with a coroutine."""
+        self.handlers[method] = handler
+
+    async def connectBus(self):
+        """Connects with the hub, retrying until it's available."""
+        if self.connecting is None:
+            self.connecting = asyncio.Lock()
+        async with self.connecting:
+            while self.writer is None or self.writer.is_closing():
+                try:
+                    self.reader, self.writer = await asyncio.open_unix_connection(self.address)
+                except OSError as e:
+                    logger.warning("can't connect :: %s", e)
+                    await asyncio.sleep(self.reconnectDelay)
+
+    async def publish(self, message: dict):
+        """Sends a message to every worker, this one included."""
+        await self._publish(message)
+
+    async def _publish(self, data: dict):
+        await self.connectBus()
+        self.writer.write(pack(data))
+        # the handlers of the bus messages don't wait for the hub, it could be waiting
+        # for this worker to read
+        if asyncio.current_task() is not self.listener:
+            await self.writer.drain()
+
+    async def _listen(self):
+        self.listener = asyncio.current_task()
+        while True:
+            await self.connectBus()
+            try:
+                message = pickle.loads(await readFrame(self.reader))
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                logger.warning("connection lost :: %r", e)
+                self.writer.close()
+                await asyncio.sleep(self.reconnectDelay)
+                continue
+            handler = self.handlers.get(message.get("method"))
+            if handler is None:
+                yield message
+                continue
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.exception("%s message failed :: %s", message.get("method"), e)
+
+
+if __name__ == "__main__":
+    import sys
+
+    runHub(sys.argv[1])
@@ -0,0 +1,81 @@
+"""Coalescing of the messages relayed at a high rate, ex. telemetry of an experiment."""
+from typing import Callable, Hashable, Union
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("server.coalescing")
+
+
+class Coalescer:
+    """Relays the messages of each key (ex. a room and a route) at most ``rate`` times per second.
+
+    Messages arriving faster are merged while they wait: dicts keep the latest value of
+    each of their keys, other payloads are replaced by the newest one. The first message
+    after a quiet period is sent right away, so it only adds latency under load.
+
+    Args:
+        send: a coroutine function like ``send(key, data)``.
+        rate: max messages per second for each key, 0 to send every message right away.
+    """
+
+    def __init__(self, send: Callable, rate: Union[int, float] = 20):
+        self.send = send
+        self.rate = rate
+        self.pending = {}
+        self.lastSent = {}
+        self.timers = {}
+        self.tasks = set()
+        self.received = 0
+        self.sent = 0
+
+    async def post(self, key: Hashable, data):
+        """Sends a message now, or merges it with the pending one of its key."""
+        self.received += 1
+        if self.rate <= 0:
+            self.sent += 1
+            await self.send(key, data)
+            return
+        pending = self.pending.get(key)
+        if isinstance(pending, dict) and isinstance(data, dict):
+            pending.update(data)
+        else:
+            self.pending[key] = dict(data) if isinstance(data, dict) else data
+        if key in self.timers:
+            return
+        delay = self.lastSent.get(key, 0) + 1 / self.rate - time.monotonic()
+        if delay <= 0:
+            await self.flush(key)
+        else:
+            self.timers[key] = asyncio.get_running_loop().call_later(delay, self.schedule, key)
+
+    def schedule(self, key: Hashable):
+        """Flushes a key on a task, the task is kept until it's done."""
+        task = asyncio.get_running_loop().create_task(self.flush(key))
+        self.tasks.add(task)
+        task.add_done_callback(self.finished)
+
+    def finished(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("flush failed :: %r", task.exception())
+
+    async def flush(self, key: Hashable):
+        """Sends the pending message of a key."""
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if key not in self.pending:
+            return
+        data = self.pending.pop(key)
+        self.lastSent[key] = time.monotonic()
+        self.sent += 1
+        await self.send(key, data)
+
+    def discard(self, key: Hashable):
+        """Forgets a key and its pending message, ex. when nobody could get it."""
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self.pending.pop(key, None)
+        self.lastSent.pop(key, None)
@@ -6,6 +6,10 @@ EXPERIMENT_JOINS_ROOM_SERVER = "EXPERIMENT_JOINS_ROOM_SERVER"
 EXPERIMENT_EMITS_EVENT_SERVER = "EXPERIMENT_EMITS_EVENT_SERVER"
 EXPERIMENT_IS_STREAMING_SERVER = "EXPERIMENT_IS_STREAMING"
 EXPERIMENT_STREAMER_SET_PAUSE_SERVER = "EXPERIMENT_STREAMER_SET_PAUSE_SERVER"
+EXPERIMENT_SENDS_PATCH_SERVER = "EXPERIMENT_SENDS_PATCH_SERVER"
+EXPERIMENT_SENDS_SNAPSHOT_SERVER = "EXPERIMENT_SENDS_SNAPSHOT_SERVER"
+EXPERIMENT_REQUESTS_SNAPSHOT_SERVER = "EXPERIMENT_REQUESTS_SNAPSHOT_SERVER"
+EXPERIMENT_SENDS_HISTORY_SERVER = "EXPERIMENT_SENDS_HISTORY_SERVER"
 
 
 SERVER_STREAMS_VIDEO_WEB = "SERVER_STREAMS_VIDEO_WEB"
@@ -16,9 +20,24 @@ SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB = "SERVER_NOTIFIES_DATA_WERE_RECEIVED_WEB
 SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT = "SERVER_NOTIFIES_DATA_WERE_RECEIVED_EXPERIMENT"
 SERVER_EMITS_EVENT_WEB = "SERVER_EMITS_EVENT_WEB"
 SERVER_STREAMER_SET_PAUSE_EXPERIMENT = "SERVER_STREAMER_SET_PAUSE_EXPERIMENT"
+SERVER_SENDS_PATCH_EXPERIMENT = "SERVER_SENDS_PATCH_EXPERIMENT"
+SERVER_SENDS_PATCH_WEB = "SERVER_SENDS_PATCH_WEB"
+SERVER_SENDS_SNAPSHOT_EXPERIMENT = "SERVER_SENDS_SNAPSHOT_EXPERIMENT"
+SERVER_SENDS_SNAPSHOT_WEB = "SERVER_SENDS_SNAPSHOT_WEB"
+SERVER_REQUESTS_HISTORY_EXPERIMENT = "SERVER_REQUESTS_HISTORY_EXPERIMENT"
+SERVER_SENDS_HISTORY_WEB = "SERVER_SENDS_HISTORY_WEB"
 
 WEB_JOINS_ROOM_SERVER = "WEB_JOINS_ROOM_SERVER"
 WEB_REQUESTS_ROOM_SERVER = "WEB_REQUESTS_ROOM_SERVER"
 WEB_SENDS_DATA_SERVER = "WEB_SENDS_DATA_SERVER"
 WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER = "WEB_NOTIFIES_DATA_WERE_RECEIVED_SERVER"
-WEB_EMITS_EVENT_SERVER = "WEB_EMITS_EVENT_SERVER"
\ No newline at end of file
+WEB_EMITS_EVENT_SERVER = "WEB_EMITS_EVENT_SERVER"
+WEB_SENDS_PATCH_SERVER = "WEB_SENDS_PATCH_SERVER"
+WEB_REQUESTS_SNAPSHOT_SERVER = "WEB_REQUESTS_SNAPSHOT_SERVER"
+WEB_REQUESTS_HISTORY_SERVER = "WEB_REQUESTS_HISTORY_SERVER"
+
+CLIENT_REQUESTS_ENCODING_SERVER = "CLIENT_REQUESTS_ENCODING_SERVER"
+SERVER_SENDS_ENCODING_CLIENT = "SERVER_SENDS_ENCODING_CLIENT"
+
+# key of the (opt-in) trace on the variables payloads and their acks, see utils/tracing.py
+TRACE_KEY = "_trace"
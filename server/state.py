@@ -0,0 +1,146 @@
+"""Versioned state of the experiment variables, one for each room."""
+import time
+
+
+class RoomState:
+    """The variables of a room and their sequence numbers.
+
+    Every accepted patch increments the room sequence number (``seq``), and each key
+    remembers the sequence number of its last change. A patch carries the last ``seq``
+    known by its sender (``base``): a key changed after that base was changed by someone
+    else in the meantime, so that change is stale and it's rejected. The writer (sid) of
+    each key is remembered too: a client's own back-to-back patches carry the same base,
+    because the echo of the first one hasn't arrived yet, and they aren't conflicts.
+
+    It's also the last known state of the experiment: joining clients are answered from
+    it, with the time of the last experiment message (``updated``), until the experiment
+    disconnects. The clients of the room (``members``, their role by sid), the encoding
+    of the clients that negotiated one and the worker of each client (``hosts``) are kept
+    here too, so every worker knows them.
+    """
+
+    def __init__(self):
+        self.variables = {}
+        self.seq = 0
+        self.keySeq = {}
+        self.keyWriter = {}
+        self.data = None
+        self.updated = None
+        self.members = {}
+        self.encodings = {}
+        self.hosts = {}
+
+    def isEmpty(self) -> bool:
+        """Checks if the experiment has sent its variables."""
+        return len(self.variables) == 0
+
+    def join(self, sid, role: str, encoding: str = None, host: str = None):
+        """Adds a client of the room, its encoding if it isn't the default one and its worker."""
+        self.members[sid] = role
+        self.hosts[sid] = host
+        if encoding is None:
+            self.encodings.pop(sid, None)
+        else:
+            self.encodings[sid] = encoding
+
+    def leave(self, sid):
+        """Removes a client of the room, it returns its role."""
+        self.encodings.pop(sid, None)
+        self.hosts.pop(sid, None)
+        return self.members.pop(sid, None)
+
+    def hasEncoding(self, role: str, encoding: str) -> bool:
+        """Checks if some client with a role uses an encoding."""
+        return any(self.members.get(sid) == role for sid, value in self.encodings.items() if value == encoding)
+
+    def hasMember(self, role: str) -> bool:
+        """Checks if some client of the room has a role."""
+        return role in self.members.values()
+
+    def workers(self) -> set:
+        """Returns the workers (host ids) with some client of the room."""
+        return set(self.hosts.values())
+
+    def isCached(self) -> bool:
+        """Checks if there is something to answer a joining client with."""
+        return not self.isEmpty() or self.data is not None
+
+    def touch(self):
+        """Records that the experiment has just sent a message."""
+        self.updated = time.time()
+
+    def setData(self, data):
+        """Keeps the last data message of the experiment (the non versioned route), dicts
+        are merged so each key keeps its latest value."""
+        if isinstance(self.data, dict) and isinstance(data, dict):
+            self.data = {**self.data, **data}
+        else:
+            self.data = data
+        self.touch()
+
+    def evict(self):
+        """Forgets the cached state, ex. when the experiment disconnects. The seq is kept,
+        so bases of old patches are still comparable, and so are the clients still in the
+        room (they leave one by one)."""
+        self.variables = {}
+        self.keySeq = {}
+        self.keyWriter = {}
+        self.data = None
+        self.updated = None
+
+    def dump(self) -> dict:
+        """Returns the cached state (not the clients), to copy it to another worker."""
+        return {
+            "variables": dict(self.variables), "seq": self.seq, "keySeq": dict(self.keySeq),
+            "keyWriter": dict(self.keyWriter), "data": self.data, "updated": self.updated,
+        }
+
+    def load(self, dump: dict):
+        """Replaces the cached state with a dump of another copy."""
+        self.variables = dict(dump["variables"])
+        self.seq = dump["seq"]
+        self.keySeq = dict(dump["keySeq"])
+        self.keyWriter = dict(dump["keyWriter"])
+        self.data = dump["data"]
+        self.updated = dump["updated"]
+
+    def age(self) -> float:
+        """Returns the seconds since the last experiment message, or None."""
+        return None if self.updated is None else time.time() - self.updated
+
+    def applyPatch(self, patch: dict, sid=None) -> tuple:
+        """Applies the fresh changes of a patch like {"base": 7, "changes": {"speed": 2}}.
+        Args:
+            patch: the patch.
+            sid: the client that sent it, keys it changed last are never stale for it.
+        Returns:
+            the accepted patch (with its new seq) or None, and the list of rejected keys.
+        """
+        base = patch.get("base")
+        accepted, rejected = {}, []
+        for key, value in patch.get("changes", {}).items():
+            stale = base is not None and self.keySeq.get(key, 0) > base
+            if stale and (sid is None or self.keyWriter.get(key) != sid):
+                rejected.append(key)
+            else:
+                accepted[key] = value
+        if len(accepted) == 0:
+            return None, rejected
+        self.seq += 1
+        self.variables.update(accepted)
+        for key in accepted:
+            self.keySeq[key] = self.seq
+            self.keyWriter[key] = sid
+        return {"seq": self.seq, "changes": accepted}, rejected
+
+    def setVariables(self, variables: dict, sid=None):
+        """Replaces all the variables, ex. when the experiment (re)connects."""
+        self.seq += 1
+        self.variables = dict(variables)
+        self.keySeq = {key: self.seq for key in self.variables}
+        self.keyWriter = {key: sid for key in self.variables}
+
+    def snapshot(self) -> dict:
+        """Returns all the variables, the current seq and the staleness of the state:
+        the time of the last experiment message and its age in seconds."""
+        return {"seq": self.seq, "variables": dict(self.variables), "updated": self.updated, "age": self.age()}
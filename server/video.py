@@ -0,0 +1,98 @@
+"""Relay of the encoded video frames of the experiments to the web clients of their rooms."""
+from typing import Callable, Union
+import time
+
+
+class Viewer:
+    """A web client watching the video of a room, with a slot for a single frame."""
+
+    __slots__ = ("room", "pending", "sentAt", "token", "sent", "dropped")
+
+    def __init__(self, room: str):
+        self.room = room
+        self.pending = None
+        self.sentAt = None
+        self.token = 0
+        self.sent = 0
+        self.dropped = 0
+
+
+class VideoRelay:
+    """Fans out the frames of each room to its viewers, frames are never decoded.
+
+    A frame is sent to a viewer when it has acknowledged the previous one, otherwise it
+    waits on the viewer slot, replacing (dropping) the frame that was waiting there. So a
+    slow browser gets fewer frames instead of a queue, and the server keeps at most one
+    frame per viewer. A frame not acknowledged in ``ackTimeout`` seconds is given up, so
+    clients that don't acknowledge get a frame each ``ackTimeout``.
+
+    Args:
+        send: a coroutine function like ``send(sid, frame, callback)``, the callback must
+                be called when the client acknowledges the frame.
+        ackTimeout: max wait time for an acknowledgment, in seconds.
+    """
+
+    def __init__(self, send: Callable, ackTimeout: Union[int, float] = 1):
+        self.send = send
+        self.ackTimeout = ackTimeout
+        self.rooms = {}
+        self.viewers = {}
+        self.frames = 0
+
+    def add(self, sid, room: str):
+        """Adds a viewer of a room, or moves it to another room."""
+        self.remove(sid)
+        self.viewers[sid] = Viewer(room)
+        self.rooms.setdefault(room, set()).add(sid)
+
+    def remove(self, sid):
+        viewer = self.viewers.pop(sid, None)
+        if viewer is not None:
+            sids = self.rooms.get(viewer.room)
+            sids.discard(sid)
+            if not sids:
+                del self.rooms[viewer.room]
+
+    async def push(self, room: str, frame):
+        """Offers a frame of a room to each one of its viewers."""
+        self.frames += 1
+        for sid in list(self.rooms.get(room, ())):
+            viewer = self.viewers.get(sid)
+            if viewer is None:
+                continue
+            if viewer.sentAt is not None and time.monotonic() - viewer.sentAt < self.ackTimeout:
+                if viewer.pending is not None:
+                    viewer.dropped += 1
+                viewer.pending = frame
+            else:
+                await self.transmit(sid, viewer, frame)
+
+    async def transmit(self, sid, viewer: Viewer, frame):
+        viewer.pending = None
+        viewer.sentAt = time.monotonic()
+        viewer.token += 1
+        viewer.sent += 1
+        token = viewer.token
+
+        async def acknowledge(*args):
+            await self.acknowledge(sid, token)
+
+        await self.send(sid, frame, acknowledge)
+
+    async def acknowledge(self, sid, token: int):
+        """Frees the slot of a viewer, and sends the frame that was waiting on it."""
+        viewer = self.viewers.get(sid)
+        if viewer is None or viewer.token != token:
+            return
+        viewer.sentAt = None
+        if viewer.pending is not None:
+            await self.transmit(sid, viewer, viewer.pending)
+
+    def stats(self) -> dict:
+        """Returns the received frames, and the sent and dropped frames of the viewers."""
+        return {
+            "frames": self.frames,
+            "viewers": len(self.viewers),
+            "sent": sum(viewer.sent for viewer in self.viewers.values()),
+            "dropped": sum(viewer.dropped for viewer in self.viewers.values()),
+        }
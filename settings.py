@@ -10,6 +10,7 @@ config = dotenv_values(".env")
 serverSettings: dict = {
     "address": config.get('SOCKETIO_SERVER_ADDRESS', "http://localhost:3000"),
     "request_timeout": 10,
+    "transports": ["websocket"],  # a relay with several workers only accepts websocket clients
 }
 
 # ------------------------- STREAM SETTINGS -----------------------------------
@@ -24,6 +25,43 @@ streamSettings = {
     "enabled": True,
 }
 
+# -------------------------- MJPEG SETTINGS ------------------------------------
+
+mjpegSettings = {
+    "fps": streamSettings["fps"],
+    "quality": streamSettings["quality"],
+    "colorsubsampling": streamSettings["colorsubsampling"],
+    "fastdct": streamSettings["fastdct"],
+    "encoderWorkers": 2,  # processes for encoding, 0 encodes on threads
+    "recordSeconds": 60,  # last seconds kept in memory for clips, 0 disables it
+    "recordBytes": 64 * 1024 * 1024,  # memory for the recorded frames of each camera
+    "maxClips": 20,  # exported clips kept on the clips folder, the oldest ones are deleted
+    "ladder": [  # [quality, scale] renditions for adaptive clients, best first
+        [40, 1.0],
+        [30, 0.75],
+        [20, 0.5],
+        [10, 0.25],
+    ],
+}
+
+# ------------------------- DISPLAY SETTINGS -----------------------------------
+
+displaySettings = {
+    "camera": "webcam",
+    "fps": 12,  # max repaints of the local preview, independent of the capture fps
+    "width": 400,
+    "height": 300,
+}
+
+# ------------------------- HISTORY SETTINGS -----------------------------------
+
+historySettings = {
+    "capacity": 100000,  # samples kept in memory, the oldest ones are overwritten
+    "maxColumns": 32,
+    "points": 500,  # default points of the windows sent through the socket
+    "maxEvents": 1000,  # events and text messages of the serial device kept in memory
+}
+
 # ------------------------- CAMERA SETTINGS ------------------------------------
 
 cameraSettings = {
@@ -33,7 +71,7 @@ cameraSettings = {
         "size": [600, 400],
         "flipX": True,
         "flipY": False,
-        "emitterIsEnabled": False,
+        "emitterIsEnabled": True,  # notifies new frames to the GUI and the MJPEG server
         "backgroundIsEnabled": True,
         "processing": processing,
         "processingParams": {},
@@ -52,5 +90,9 @@ serialSettings = {
         "portsRefreshTime": 5,
         "emitterIsEnabled": True,
         "emitAsDict": True,
+        "binary": True,  # use binary frames if the sketch supports them, else JSON lines
+        "schema": ["play", "direction", "speed"],  # same order of the sketch indexes
+        "ackWindow": 4,  # variables writes waiting for an ack, new changes are coalesced
+        "ackTimeout": 1.0,  # seconds before writing the latest variables again
     },
 }
\ No newline at end of file
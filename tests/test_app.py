@@ -0,0 +1,92 @@
+import asyncio
+from server import app
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_the_state_of_a_room_is_dropped_when_its_last_client_leaves():
+    async def main():
+        await app.replicate("addMember", "room", "a", app.EXPERIMENT, None, None)
+        await app.replicate("addMember", "room", "b", app.WEB, None, None)
+        await app.replicate("setSnapshot", "room", "a", {"speed": 1})
+        await app.replicate("removeMember", "room", "a")
+        assert "room" in app.states and app.states["room"].isEmpty()
+        await app.replicate("removeMember", "room", "b")
+
+    run(main())
+    assert "room" not in app.states
+
+
+def test_clients_without_a_room_have_no_state():
+    assert app.stateOf("nobody") == (None, None)
+    assert None not in app.states
+
+
+class Bus(app.LocalBusManager):
+    """A bus that keeps the published messages instead of sending them."""
+
+    def __init__(self):
+        super().__init__("unused")
+        self.host_id = "here"
+        self.published = []
+        self.emits = []
+
+    async def publish(self, message):
+        self.published.append(message)
+
+    async def _publish(self, message):
+        self.emits.append(message)
+
+
+def test_operations_stay_on_the_bus_while_earlier_ones_are_on_their_way(monkeypatch):
+    bus = Bus()
+    monkeypatch.setattr(app.sio, "manager", bus)
+
+    async def main():
+        await app.replicate("addMember", "solo", "a", app.EXPERIMENT, None, "here")
+        await app.replicate("setSnapshot", "solo", "a", {"speed": 1})
+        assert [m["operation"] for m in bus.published] == ["addMember", "setSnapshot"]
+        for message in bus.published:
+            await app.receiveStateMessage(message)
+        # every client of the room is here, so it doesn't use the bus anymore
+        await app.replicate("applyPatch", "solo", "a", {"changes": {"speed": 2}}, None, True, None)
+        assert len(bus.published) == 2 and app.states["solo"].variables == {"speed": 2}
+        await app.replicate("removeMember", "solo", "a")
+        await app.receiveStateMessage(bus.published[-1])
+
+    run(main())
+    assert "solo" not in app.states and app.inFlight == {}
+
+
+def test_a_worker_joining_a_room_waits_for_its_state(monkeypatch):
+    bus = Bus()
+    monkeypatch.setattr(app.sio, "manager", bus)
+
+    def message(operation, sid, *args, host="there"):
+        return {"method": "state", "operation": operation, "room": "shared", "sid": sid, "args": args, "host_id": host}
+
+    async def main():
+        await app.receiveStateMessage(message("addMember", "a", app.EXPERIMENT, None, "there"))
+        await app.receiveStateMessage(message("setSnapshot", "a", {"speed": 1}))
+        await app.replicate("addMember", "shared", "b", app.WEB, None, "here")
+        await app.receiveStateMessage(bus.published[-1])
+        assert "shared" in app.syncing
+        # it's applied after the state of the room, as on the other worker
+        await app.receiveStateMessage(message("applyPatch", "a", {"base": 1, "changes": {"speed": 2}}, None, True, None))
+        assert app.states["shared"].variables == {"speed": 1}
+        dump = {"variables": {"speed": 1}, "seq": 1, "keySeq": {"speed": 1}, "keyWriter": {"speed": "a"}, "data": None, "updated": None}
+        await app.receiveStateMessage(message("restore", None, "here", dump))
+        state = app.states["shared"]
+        assert "shared" not in app.syncing and app.awaiting == {}
+        assert (state.seq, state.variables) == (2, {"speed": 2})
+        assert state.workers() == {"there", "here"}
+        # the room has clients on another worker, so its operations use the bus
+        await app.replicate("applyPatch", "shared", "b", {"base": 2, "changes": {"speed": 3}}, None, False, None)
+        assert bus.published[-1]["operation"] == "applyPatch"
+        for sid, host in (("a", "there"), ("b", "here")):
+            await app.receiveStateMessage(message("removeMember", sid, host=host))
+
+    run(main())
+    assert "shared" not in app.states
@@ -0,0 +1,82 @@
+import asyncio
+import numpy as np
+from utils.broadcaster import FrameBroadcaster, Subscriber
+
+
+class Camera:
+    """A camera with a new frame on each read."""
+
+    def read(self):
+        return np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+class SlowEncoder:
+    def __init__(self, seconds: float = 0.05, failures: int = 0):
+        self.seconds = seconds
+        self.failures = failures
+
+    async def encode(self, name, frame, renditions, **kwargs):
+        await asyncio.sleep(self.seconds)
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("encoder failure")
+        return {rendition: b"jpeg%d" % rendition[0] for rendition in renditions}
+
+
+def test_subscribers_arriving_during_an_encode_get_the_next_frame():
+    async def main():
+        broadcaster = FrameBroadcaster(Camera(), encoder=SlowEncoder(), fps=50)
+        first = broadcaster.subscribe(rendition=(40, 1.0))
+        second = broadcaster.subscribe(rendition=(20, 0.5))
+        try:
+            await asyncio.wait_for(first.__anext__(), 1)
+            part = await asyncio.wait_for(second.__anext__(), 1)
+            return part, broadcaster.task is not None
+        finally:
+            await first.aclose()
+            await second.aclose()
+
+    part, running = asyncio.run(main())
+    assert part.endswith(b"jpeg20\r\n")
+    assert running
+
+
+def test_failed_producers_are_restarted(capsys):
+    async def main():
+        broadcaster = FrameBroadcaster(Camera(), encoder=SlowEncoder(0.01, failures=1), fps=50)
+        subscriber = broadcaster.subscribe(rendition=(40, 1.0))
+        try:
+            return await asyncio.wait_for(subscriber.__anext__(), 3)
+        finally:
+            await subscriber.aclose()
+
+    assert asyncio.run(main()).endswith(b"jpeg40\r\n")
+    assert "encoder failure" in capsys.readouterr().out
+
+
+def test_adapt_steps_up_when_the_next_rendition_fits():
+    async def main():
+        broadcaster = FrameBroadcaster(Camera(), fps=10, ladder=[[40, 1.0], [20, 0.5]])
+        subscriber = Subscriber(rendition=broadcaster.ladder[1], adaptive=True)
+        subscriber.level = 1
+        broadcaster.sizes = {broadcaster.ladder[0]: 4000, broadcaster.ladder[1]: 1000}
+        subscriber.throughput = 30000
+        broadcaster.adapt(subscriber)
+        stayed = subscriber.level
+        subscriber.throughput = 90000
+        broadcaster.adapt(subscriber)
+        return stayed, subscriber.level
+
+    assert asyncio.run(main()) == (1, 0)
+
+
+def test_adapt_steps_down_on_dropped_frames():
+    async def main():
+        broadcaster = FrameBroadcaster(Camera(), fps=10, ladder=[[40, 1.0], [20, 0.5]])
+        subscriber = Subscriber(rendition=broadcaster.ladder[0], adaptive=True)
+        subscriber.throughput = 1e9
+        subscriber.dropped = 1
+        broadcaster.adapt(subscriber)
+        return subscriber.rendition
+
+    assert asyncio.run(main()) == (20, 0.5)
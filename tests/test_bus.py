@@ -0,0 +1,53 @@
+import asyncio
+import os
+import pickle
+import tempfile
+from server.bus import BusHub, pack, readFrame
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_hub_forwards_every_message_to_every_peer_in_order():
+    async def main(address):
+        hub = asyncio.create_task(BusHub(address).serve())
+        while not os.path.exists(address):
+            await asyncio.sleep(0.01)
+        peers = [await asyncio.open_unix_connection(address) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        for i, (_, writer) in enumerate(peers):
+            writer.write(pack({"method": "test", "value": i}))
+            await writer.drain()
+            await asyncio.sleep(0.01)
+        received = []
+        for reader, _ in peers:
+            received.append([pickle.loads(await readFrame(reader))["value"] for _ in range(3)])
+        for _, writer in peers:
+            writer.close()
+        hub.cancel()
+        return received
+
+    with tempfile.TemporaryDirectory() as folder:
+        received = run(main(os.path.join(folder, "bus.sock")))
+    assert received == [[0, 1, 2]] * 3
+
+
+def test_hub_keeps_forwarding_when_a_peer_leaves():
+    async def main(address):
+        hub = asyncio.create_task(BusHub(address).serve())
+        while not os.path.exists(address):
+            await asyncio.sleep(0.01)
+        (reader, writer), (_, gone) = [await asyncio.open_unix_connection(address) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        gone.close()
+        await asyncio.sleep(0.05)
+        writer.write(pack({"method": "test", "value": 1}))
+        await writer.drain()
+        message = pickle.loads(await asyncio.wait_for(readFrame(reader), 1))
+        writer.close()
+        hub.cancel()
+        return message
+
+    with tempfile.TemporaryDirectory() as folder:
+        assert run(main(os.path.join(folder, "bus.sock")))["value"] == 1
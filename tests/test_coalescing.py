@@ -0,0 +1,116 @@
+import asyncio
+from server.coalescing import Coalescer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_first_message_is_sent_right_away_and_bursts_are_merged():
+    async def main():
+        sent = []
+
+        async def send(key, data):
+            sent.append((key, data))
+
+        coalescer = Coalescer(send, rate=20)
+        await coalescer.post("room", {"speed": 1, "play": True})
+        await coalescer.post("room", {"speed": 2})
+        await coalescer.post("room", {"speed": 3})
+        assert sent == [("room", {"speed": 1, "play": True})]
+        await asyncio.sleep(0.1)
+        return sent, coalescer
+
+    sent, coalescer = run(main())
+    assert sent[1:] == [("room", {"speed": 3})]
+    assert (coalescer.received, coalescer.sent) == (3, 2)
+
+
+def test_keys_are_independent_and_non_dicts_are_replaced():
+    async def main():
+        sent = []
+
+        async def send(key, data):
+            sent.append((key, data))
+
+        coalescer = Coalescer(send, rate=20)
+        await coalescer.post("a", "first")
+        await coalescer.post("b", {"x": 1})
+        await coalescer.post("a", "second")
+        await coalescer.post("a", "third")
+        await asyncio.sleep(0.1)
+        return sent
+
+    assert run(main()) == [("a", "first"), ("b", {"x": 1}), ("a", "third")]
+
+
+def test_pending_dicts_are_copies():
+    async def main():
+        sent = []
+
+        async def send(key, data):
+            sent.append(data)
+
+        coalescer = Coalescer(send, rate=20)
+        await coalescer.post("room", {"speed": 1})
+        posted = {"speed": 2}
+        await coalescer.post("room", posted)
+        await coalescer.post("room", {"play": True})
+        await coalescer.flush("room")
+        return sent, posted
+
+    sent, posted = run(main())
+    assert sent[-1] == {"speed": 2, "play": True}
+    assert posted == {"speed": 2}
+
+
+def test_rate_zero_sends_every_message():
+    async def main():
+        sent = []
+
+        async def send(key, data):
+            sent.append(data)
+
+        coalescer = Coalescer(send, rate=0)
+        for i in range(5):
+            await coalescer.post("room", {"i": i})
+        return sent
+
+    assert run(main()) == [{"i": i} for i in range(5)]
+
+
+def test_delayed_flushes_are_kept_and_their_failures_logged(caplog):
+    async def main():
+        async def send(key, data):
+            if data == {"speed": 2}:
+                raise ValueError("closed")
+
+        coalescer = Coalescer(send, rate=20)
+        await coalescer.post("room", {"speed": 1})
+        await coalescer.post("room", {"speed": 2})
+        await asyncio.sleep(0.02)
+        await asyncio.sleep(0.06)
+        return coalescer
+
+    coalescer = run(main())
+    assert coalescer.tasks == set()
+    assert "flush failed" in caplog.text
+
+
+def test_discard_forgets_a_key():
+    async def main():
+        sent = []
+
+        async def send(key, data):
+            sent.append(data)
+
+        coalescer = Coalescer(send, rate=20)
+        await coalescer.post("room", {"speed": 1})
+        await coalescer.post("room", {"speed": 2})
+        coalescer.discard("room")
+        await asyncio.sleep(0.1)
+        return sent, coalescer
+
+    sent, coalescer = run(main())
+    assert sent == [{"speed": 1}]
+    assert coalescer.pending == {} and coalescer.lastSent == {} and coalescer.timers == {}
@@ -0,0 +1,90 @@
+import time
+import numpy as np
+from utils.history import History
+
+
+def filled(samples: int, capacity: int = 1000) -> History:
+    history = History(capacity=capacity, points=10)
+    for i in range(samples):
+        history.record({"speed": i, "play": i % 2 == 0, "name": "skipped"}, timestamp=i)
+    return history
+
+
+def test_record_keeps_numbers_and_last_values():
+    history = History(capacity=10)
+    history.record({"speed": 1, "name": "x"}, timestamp=0)
+    history.record({"play": True}, timestamp=1)
+    times, values = history.window(start=None)
+    assert set(values) == {"speed", "play"}
+    assert list(values["speed"]) == [1, 1]
+    assert np.isnan(values["play"][0]) and values["play"][1] == 1
+
+
+def test_ring_overwrites_the_oldest_samples():
+    history = filled(25, capacity=10)
+    times, values = history.window()
+    assert len(history) == 10
+    assert list(values["speed"]) == list(range(15, 25))
+    assert np.all(np.diff(times) > 0)
+
+
+def test_window_uses_wall_clock_times():
+    history = History(capacity=10)
+    history.record({"speed": 1})
+    now = time.time()
+    times, values = history.window(start=now - 5, end=now + 5)
+    assert len(times) == 1 and abs(times[0] - now) < 1
+    assert len(history.window(start=now + 5)[0]) == 0
+
+
+def test_max_columns():
+    history = History(capacity=10, maxColumns=1)
+    history.record({"a": 1, "b": 2})
+    assert list(history.columns) == ["a"]
+
+
+def test_decimate_keeps_the_peaks():
+    history = History(capacity=1000)
+    for i in range(1000):
+        history.record({"speed": 100 if i == 501 else 0, "low": -50 if i == 250 else 0}, timestamp=i)
+    times, values = history.decimate(points=20)
+    assert len(times) == 20 and len(values["speed"]) == 20
+    assert values["speed"].max() == 100 and values["low"].min() == -50
+    assert np.all(np.diff(times) >= 0)
+
+
+def test_decimate_small_windows_are_not_changed():
+    history = filled(5)
+    times, values = history.decimate(points=10)
+    assert len(times) == 5
+
+
+def test_window_from_request():
+    history = History(capacity=1000, points=10)
+    for i in range(100):
+        history.record({"speed": i})
+    window = history.windowFromRequest({"seconds": 60, "columns": ["speed", "missing"], "sid": "web"})
+    assert len(window["t"]) == 10
+    assert list(window["columns"]) == ["speed"]
+    assert window["sid"] == "web"
+    assert history.windowFromRequest({"seconds": 60, "end": time.time() - 3600})["t"] == []
+
+
+def test_to_list_converts_nan_to_none():
+    assert History.toList(np.array([1.0, np.nan])) == [1.0, None]
+
+
+def test_events_are_sent_on_the_windows():
+    history = History(capacity=10)
+    history.record({"speed": 1})
+    history.recordEvent("event", "received")
+    window = history.windowFromRequest({"seconds": 60})
+    assert [row[1:] for row in window["events"]] == [["event", "received"]]
+    assert history.windowFromRequest({"start": time.time() + 10})["events"] == []
+
+
+def test_events_are_bounded():
+    history = History(capacity=10, maxEvents=2)
+    for i in range(3):
+        history.recordEvent("data", f"line {i}")
+    assert [row[2] for row in history.eventsWindow()] == ["line 1", "line 2"]
@@ -0,0 +1,57 @@
+import time
+import numpy as np
+from utils.processing import Annotate, BufferRing, Flip, Pipeline
+
+
+def frame(value: int) -> np.ndarray:
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_held_outputs_are_not_overwritten():
+    pipeline = Pipeline(Flip(1))
+    held = [pipeline(frame(i)) for i in range(6)]
+    assert [int(output[0, 0, 0]) for output in held] == list(range(6))
+
+
+def test_free_buffers_are_reused():
+    pipeline = Pipeline(Flip(1))
+    for i in range(10):
+        output = pipeline(frame(i))
+    assert int(output[0, 0, 0]) == 9
+    assert len(pipeline.stages[0].ring.buffers) == 3
+
+
+def test_views_keep_their_buffer_in_use():
+    ring = BufferRing(size=1)
+    key = ((2, 2), np.uint8)
+    assert ring.next(key) is None
+    ring.adopt(np.zeros((2, 2), dtype=np.uint8))
+    view = ring.next(key)[:1]
+    assert ring.next(key) is None
+    del view
+    assert ring.next(key) is ring.buffers[0]
+
+
+def test_the_ring_reuses_buffers_in_turns_past_its_limit():
+    ring = BufferRing(size=2, limit=2)
+    key = ((2, 2), np.uint8)
+    assert ring.next(key) is None
+    ring.adopt(np.zeros((2, 2), dtype=np.uint8))
+    ring.adopt(np.zeros((2, 2), dtype=np.uint8))
+    held = list(ring.buffers)
+    assert ring.next(key) is held[0]
+    assert ring.next(key) is held[1]
+
+
+def test_worker_returns_nothing_until_the_first_frame_is_processed():
+    pipeline = Pipeline(Annotate("lab"), worker=True)
+    try:
+        assert pipeline(frame(1)) is None
+        for _ in range(100):
+            time.sleep(0.01)
+            if pipeline.latest is not None:
+                break
+        output = pipeline(frame(2))
+        assert output is not None and output.shape == (4, 6, 3)
+    finally:
+        pipeline.stop()
@@ -0,0 +1,97 @@
+import os
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from utils.recorder import FrameRing, jpegSize, pruneClips, writeAVI
+
+
+def jpeg(width: int = 32, height: int = 16, value: int = 0) -> bytes:
+    image = np.full((height, width, 3), value, dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_jpeg_size():
+    assert jpegSize(jpeg(32, 16)) == (32, 16)
+    assert jpegSize(b"not a jpeg") == (0, 0)
+
+
+def test_ring_evicts_old_frames():
+    ring = FrameRing(seconds=1, fps=10, capacity=1 << 20)
+    for i in range(30):
+        ring.append(jpeg(value=i), timestamp=i * 0.1)
+    frames, timestamps = ring.frames()
+    assert timestamps[-1] - timestamps[0] <= 1
+    assert bytes(frames[-1]) == jpeg(value=29)
+
+
+def test_ring_evicts_frames_overwritten_on_the_arena():
+    frame = jpeg()
+    ring = FrameRing(seconds=60, fps=10, capacity=len(frame) * 3 + 1)
+    for i in range(10):
+        ring.append(frame, timestamp=i)
+    frames, timestamps = ring.frames()
+    assert len(frames) == 3 and timestamps == [7, 8, 9]
+    assert all(bytes(f) == frame for f in frames)
+    ring.append(b"x" * (ring.capacity + 1))
+    assert len(ring) == 3
+
+
+def test_ring_frames_of_the_last_seconds():
+    ring = FrameRing(seconds=10, fps=10)
+    for i in range(50):
+        ring.append(jpeg(), timestamp=i * 0.1)
+    assert len(ring.frames(1)[0]) == 11
+
+
+def test_write_avi(tmp_path):
+    frames = [jpeg(value=i) for i in range(3)]
+    path = str(tmp_path / "clip.avi")
+    assert writeAVI(path, frames, fps=10) == 3
+    assert writeAVI(path, []) == 0
+    data = open(path, "rb").read()
+    assert data[:4] == b"RIFF" and data[8:12] == b"AVI "
+    assert struct.unpack("<I", data[4:8])[0] == len(data) - 8
+    assert data.count(b"00dc") == 6
+    assert frames[1] in data
+    capture = cv2.VideoCapture(path)
+    if capture.isOpened():
+        ok, image = capture.read()
+        assert ok and image.shape[:2] == (16, 32)
+    capture.release()
+
+
+def test_export_while_frames_are_appended(tmp_path):
+    frame = jpeg()
+    ring = FrameRing(seconds=1, fps=100, capacity=len(frame) * 20)
+    stop = threading.Event()
+
+    def feed():
+        while not stop.is_set():
+            ring.append(frame)
+
+    thread = threading.Thread(target=feed)
+    thread.start()
+    try:
+        for i in range(20):
+            path = str(tmp_path / f"clip{i}.avi")
+            frames = ring.export(path, 1)
+            data = open(path, "rb").read() if frames else b""
+            assert data.count(frame) == frames
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_prune_clips(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"clip{i}.avi"
+        path.write_bytes(b"clip")
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    (tmp_path / "notes.txt").write_text("kept")
+    assert pruneClips(str(tmp_path), maxClips=3) == 2
+    assert sorted(os.listdir(tmp_path)) == ["clip2.avi", "clip3.avi", "clip4.avi", "notes.txt"]
+    assert pruneClips(str(tmp_path), maxClips=0, maxAge=96.5) == 2
+    assert sorted(os.listdir(tmp_path)) == ["clip4.avi", "notes.txt"]
+    assert pruneClips(str(tmp_path / "missing")) == 0
@@ -0,0 +1,76 @@
+import asyncio
+import base64
+import numpy as np
+from utils.runtime import AsyncMockup, AsyncSocketIO, AsyncStreamer
+
+
+class Port:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.in_waiting = 1
+
+    def read(self, size):
+        return self.chunks.pop(0)
+
+
+class Device:
+    name = "arduino"
+
+    def __init__(self, chunks):
+        self.serial = Port(chunks)
+        self.lineBuffer = b""
+        self.lineOverflow = False
+        self.lines = []
+
+    def handleLine(self, line):
+        self.lines.append(line)
+
+
+def test_overlong_serial_lines_are_dropped():
+    mockup = AsyncMockup(maxLineLength=8)
+    device = Device([b"$a,1\n$b", b"0123456789", b"abc\n$c,3", b"\n"])
+    for _ in range(4):
+        mockup.readSerial(device)
+    assert device.lines == [b"$a,1\n", b"$c,3\n"]
+    assert device.lineBuffer == b"" and not device.lineOverflow
+    mockup.loop.close()
+
+
+def test_messages_are_counted_while_disconnected():
+    socket = AsyncSocketIO()
+    socket.emit("EVENT", {"speed": 1})
+    socket.emit("EVENT", {"speed": 2})
+    assert socket.dropped == 2
+
+
+class Socket:
+    def __init__(self):
+        self.sent = []
+
+    def isConnected(self):
+        return True
+
+    async def send(self, event, frames, pack=True):
+        self.sent.append((event, frames, pack))
+
+
+def test_streamer_sends_encoded_frames_until_it_stops():
+    async def main():
+        socket = Socket()
+        frame = np.zeros((32, 32, 3), dtype=np.uint8)
+        streamer = AsyncStreamer(socket, reader=lambda: frame, endpoint="VIDEO", fps=50)
+        task = asyncio.create_task(streamer.serve())
+        await asyncio.sleep(0.15)
+        streamer.setPause(True)
+        await asyncio.sleep(0.05)
+        count = len(socket.sent)
+        await asyncio.sleep(0.1)
+        streamer.stop()
+        await asyncio.wait_for(task, 1)
+        return socket.sent, count
+
+    sent, count = asyncio.run(main())
+    assert count > 0 and len(sent) == count
+    event, jpeg, pack = sent[0]
+    # base64 JPEGs, like the remio streamer
+    assert event == "VIDEO" and not pack and base64.b64decode(jpeg)[:2] == b"\xff\xd8"
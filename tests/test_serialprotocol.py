@@ -0,0 +1,153 @@
+import random
+import struct
+import pytest
+from utils.serialprotocol import FrameCodec, FramedSerial, Outbox, cobsDecode, cobsEncode, crc16, parseAck
+
+
+@pytest.mark.parametrize("size", [0, 1, 253, 254, 255, 508, 600])
+def test_cobs_round_trip_around_the_block_size(size):
+    data = bytes(random.Random(size).randrange(1, 256) for _ in range(size))
+    for payload in (data, b"\x00" + data, data + b"\x00", data[:127] + b"\x00" + data[127:]):
+        encoded = cobsEncode(payload)
+        assert 0 not in encoded
+        assert cobsDecode(encoded) == payload
+
+
+def test_cobs_full_block_has_no_extra_zero():
+    data = bytes([1]) * 254
+    assert cobsEncode(data) == bytes([255]) + data + bytes([1])
+    assert cobsDecode(cobsEncode(data + b"\x00")) == data + b"\x00"
+
+
+def test_cobs_rejects_malformed_data():
+    with pytest.raises(ValueError):
+        cobsDecode(bytes([5, 1, 2]))
+    with pytest.raises(ValueError):
+        cobsDecode(bytes([0]))
+
+
+def test_crc16_check_value():
+    assert crc16(b"123456789") == 0x29B1
+
+
+def test_variables_frame_round_trip():
+    codec = FrameCodec(["play", "speed", "direction"])
+    frame = codec.encodeVariables({"play": True, "speed": 2.5, "direction": False, "seq": 7, "other": 1})
+    assert frame[0] == 0xFE and frame.endswith(b"\n") and b"\n" not in frame[:-1]
+    kind, value, binary = codec.decode(frame)
+    assert (kind, binary) == ("variables", True)
+    assert value == {"play": True, "speed": 2.5, "direction": False, "seq": 7}
+
+
+def test_long_frames_cross_the_cobs_block():
+    codec = FrameCodec([f"v{i}" for i in range(63)])
+    variables = {f"v{i}": i * 1000 + 1 for i in range(63)}
+    frame = codec.encodeVariables(variables)
+    assert len(frame) > 254
+    assert codec.decode(frame) == ("variables", variables, True)
+
+
+def test_event_frame_round_trip():
+    codec = FrameCodec()
+    assert codec.decode(codec.encodeEvent("received,3")) == ("event", "received,3", True)
+
+
+def test_corrupted_frames_are_rejected():
+    codec = FrameCodec(["speed"])
+    frame = bytearray(codec.encodeVariables({"speed": 1}))
+    frame[3] ^= 0x01
+    with pytest.raises(ValueError):
+        codec.decode(bytes(frame))
+    truncated = codec.frame(bytes([0x01]) + struct.pack("<B", 1 << 6 | 0) + b"\x01")
+    with pytest.raises(ValueError):
+        codec.decode(truncated)
+
+
+def test_text_lines():
+    codec = FrameCodec()
+    assert codec.decode(b"$received,2\n") == ("event", "received,2", False)
+    assert codec.decode(b'{"speed": 1}\n') == ("variables", {"speed": 1}, False)
+    assert codec.decode(b"{not json\n") == ("text", "{not json", False)
+    assert codec.decode(b"hello\r\n") == ("text", "hello", False)
+
+
+def test_parse_ack():
+    assert parseAck("received,12") == 12
+    assert parseAck("received") == -1
+    assert parseAck("status,ok") is None
+
+
+class Device:
+    def __init__(self):
+        self.writes = []
+
+    def __call__(self, variables, seq):
+        self.writes.append((seq, variables))
+
+
+def test_outbox_latest_wins_while_the_window_is_full():
+    device = Device()
+    outbox = Outbox(device, window=1)
+    outbox.post({"speed": 1})
+    outbox.post({"speed": 2})
+    outbox.post({"speed": 3})
+    assert device.writes == [(1, {"speed": 1})]
+    outbox.ack(1)
+    assert device.writes == [(1, {"speed": 1}), (2, {"speed": 3})]
+    outbox.ack(2)
+    assert len(device.writes) == 2 and outbox.waiting() == 0
+
+
+def test_outbox_window_and_cumulative_acks():
+    device = Device()
+    outbox = Outbox(device, window=2)
+    for speed in range(4):
+        outbox.post({"speed": speed})
+        outbox.flush()
+    assert [seq for seq, _ in device.writes] == [1, 2]
+    assert outbox.waiting() == 2
+    outbox.ack(2)
+    assert device.writes[-1] == (3, {"speed": 3})
+    assert outbox.waiting() == 1
+    outbox.ack(-1)
+    assert outbox.waiting() == 0
+
+
+def test_outbox_tagged_acks():
+    acks = []
+    device = Device()
+    outbox = Outbox(device, window=4, onAck=lambda tag, seconds: acks.append((tag, seconds)))
+    outbox.post({"speed": 1}, tag="trace")
+    outbox.post({"speed": 2})
+    outbox.ack(2)
+    assert [tag for tag, _ in acks] == ["trace"]
+    assert acks[0][1] >= 0
+
+
+def test_outbox_rewrites_the_latest_state_after_a_timeout():
+    device = Device()
+    outbox = Outbox(device, window=1, ackTimeout=-1)
+    outbox.post({"speed": 1})
+    outbox.expire()
+    assert device.writes == [(1, {"speed": 1}), (2, {"speed": 1})]
+    outbox.reset()
+    outbox.flush()
+    assert device.writes[-1] == (3, {"speed": 1})
+
+
+def test_stray_text_lines_keep_the_binary_protocol():
+    device = FramedSerial(name="arduino", schema=["speed"], port=None)
+    messages = []
+
+    def receive(data):
+        messages.append(data)
+
+    device.on("data", receive)
+    device.on("variables", receive)
+    device.handleLine(b"$binary,ok\n")
+    device.handleLine(b"debug: boot\n")
+    device.handleLine(device.codec.encodeVariables({"speed": 2}))
+    assert device.isBinary()
+    device.handleLine(b'{"speed": 1}\n')
+    assert not device.isBinary()
+    assert messages == [{"arduino": "debug: boot"}, {"arduino": {"speed": 2}}, {"arduino": {"speed": 1}}]
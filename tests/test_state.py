@@ -0,0 +1,122 @@
+from server.state import RoomState
+
+
+def test_join_and_leave():
+    state = RoomState()
+    state.join("a", "web", "msgpack")
+    state.join("b", "experiment")
+    assert state.hasMember("web") and state.hasMember("experiment")
+    assert state.hasEncoding("web", "msgpack")
+    assert not state.hasEncoding("experiment", "msgpack")
+    assert state.leave("a") == "web"
+    assert not state.hasMember("web")
+    assert "a" not in state.encodings
+    assert state.leave("a") is None
+
+
+def test_join_again_without_encoding():
+    state = RoomState()
+    state.join("a", "web", "msgpack")
+    state.join("a", "web")
+    assert not state.hasEncoding("web", "msgpack")
+
+
+def test_apply_patch():
+    state = RoomState()
+    accepted, rejected = state.applyPatch({"base": 0, "changes": {"speed": 2, "play": True}})
+    assert accepted == {"seq": 1, "changes": {"speed": 2, "play": True}}
+    assert rejected == []
+    assert state.variables == {"speed": 2, "play": True}
+
+
+def test_apply_patch_rejects_stale_keys():
+    state = RoomState()
+    state.applyPatch({"base": 0, "changes": {"speed": 2}})
+    accepted, rejected = state.applyPatch({"base": 0, "changes": {"speed": 3, "play": True}})
+    assert accepted == {"seq": 2, "changes": {"play": True}}
+    assert rejected == ["speed"]
+    assert state.variables["speed"] == 2
+    accepted, rejected = state.applyPatch({"base": 0, "changes": {"speed": 4}})
+    assert accepted is None and rejected == ["speed"]
+    assert state.seq == 2
+
+
+def test_own_back_to_back_patches_are_accepted():
+    state = RoomState()
+    state.setVariables({"speed": 0}, "experiment")
+    base = state.seq
+    accepted, rejected = state.applyPatch({"base": base, "changes": {"speed": 1}}, "web")
+    assert accepted == {"seq": 2, "changes": {"speed": 1}} and rejected == []
+    accepted, rejected = state.applyPatch({"base": base, "changes": {"speed": 2}}, "web")
+    assert accepted == {"seq": 3, "changes": {"speed": 2}} and rejected == []
+    assert state.variables["speed"] == 2
+
+
+def test_patches_over_changes_of_other_clients_are_rejected():
+    state = RoomState()
+    state.setVariables({"speed": 0, "play": False}, "experiment")
+    base = state.seq
+    state.applyPatch({"base": base, "changes": {"speed": 1}}, "a")
+    accepted, rejected = state.applyPatch({"base": base, "changes": {"speed": 2, "play": True}}, "b")
+    assert accepted == {"seq": 3, "changes": {"play": True}} and rejected == ["speed"]
+    accepted, rejected = state.applyPatch({"base": base, "changes": {"play": False}}, "a")
+    assert accepted is None and rejected == ["play"]
+    assert state.variables == {"speed": 1, "play": True}
+
+
+def test_apply_patch_without_base():
+    state = RoomState()
+    state.applyPatch({"base": 0, "changes": {"speed": 2}})
+    accepted, _ = state.applyPatch({"changes": {"speed": 5}})
+    assert accepted["changes"] == {"speed": 5}
+
+
+def test_evict_keeps_seq_members_and_encodings():
+    state = RoomState()
+    state.join("a", "web", "msgpack")
+    state.join("b", "experiment")
+    state.setVariables({"speed": 1})
+    state.setData({"temperature": 20})
+    state.evict()
+    assert state.isEmpty() and not state.isCached()
+    assert state.age() is None
+    assert state.seq == 1
+    assert state.members == {"a": "web", "b": "experiment"}
+    assert state.hasEncoding("web", "msgpack")
+    accepted, rejected = state.applyPatch({"base": 0, "changes": {"speed": 2}})
+    assert accepted == {"seq": 2, "changes": {"speed": 2}} and rejected == []
+
+
+def test_set_data_merges_dicts():
+    state = RoomState()
+    state.setData({"a": 1, "b": 1})
+    state.setData({"b": 2})
+    assert state.data == {"a": 1, "b": 2}
+    state.setData("text")
+    assert state.data == "text"
+    assert state.isCached() and state.age() >= 0
+
+
+def test_workers_of_the_members():
+    state = RoomState()
+    state.join("a", "web", host="w1")
+    state.join("b", "experiment", host="w2")
+    state.join("c", "web", host="w2")
+    assert state.workers() == {"w1", "w2"}
+    state.leave("a")
+    assert state.workers() == {"w2"}
+
+
+def test_a_dump_copies_the_cached_state_but_not_the_members():
+    state = RoomState()
+    state.join("a", "web", host="w1")
+    state.setVariables({"speed": 1}, "b")
+    state.applyPatch({"base": 1, "changes": {"speed": 2}}, "a")
+    state.setData({"temperature": 20})
+    copy = RoomState()
+    copy.join("c", "web", host="w2")
+    copy.load(state.dump())
+    assert copy.dump() == state.dump() and copy.variables == {"speed": 2}
+    assert copy.members == {"c": "web"}
+    accepted, _ = copy.applyPatch({"base": 1, "changes": {"speed": 3}}, "a")
+    assert accepted == {"seq": 3, "changes": {"speed": 3}}
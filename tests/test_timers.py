@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from utils.timers import AsyncTimerScheduler, CountTimer, PausableTimer, TimerScheduler
+
+
+def test_calls_run_in_deadline_order():
+    scheduler = TimerScheduler()
+    calls = []
+    done = threading.Event()
+    try:
+        scheduler.schedule(0.06, lambda: (calls.append(3), done.set()))
+        scheduler.schedule(0.02, lambda: calls.append(1))
+        scheduler.schedule(0.04, lambda: calls.append(2))
+        assert done.wait(2)
+        assert calls == [1, 2, 3]
+    finally:
+        scheduler.stop()
+
+
+def test_cancelled_calls_never_run():
+    scheduler = TimerScheduler()
+    calls = []
+    done = threading.Event()
+    try:
+        call = scheduler.schedule(0.02, lambda: calls.append("cancelled"))
+        scheduler.schedule(0.04, done.set)
+        call.cancel()
+        call.cancel()
+        assert scheduler.cancelled == 1
+        assert scheduler.pending() == 1
+        assert done.wait(2)
+        assert calls == [] and scheduler.cancelled == 0
+    finally:
+        scheduler.stop()
+
+
+def test_executed_calls_are_not_counted_when_cancelled():
+    scheduler = TimerScheduler()
+    done = threading.Event()
+    try:
+        call = scheduler.schedule(0, done.set)
+        assert done.wait(2)
+        call.cancel()
+        assert scheduler.cancelled == 0
+    finally:
+        scheduler.stop()
+
+
+def test_heap_is_compacted_when_mostly_cancelled():
+    scheduler = TimerScheduler()
+    try:
+        calls = [scheduler.schedule(60, lambda: None) for _ in range(100)]
+        for call in calls[:90]:
+            call.cancel()
+        assert len(scheduler.heap) < 100
+        assert scheduler.pending() == 10
+    finally:
+        scheduler.stop()
+    assert scheduler.heap == [] and scheduler.cancelled == 0
+
+
+def test_pausable_timer_keeps_its_period():
+    scheduler = TimerScheduler()
+    calls = []
+    timer = PausableTimer(0.02, lambda: calls.append(time.monotonic()), scheduler=scheduler)
+    try:
+        timer.resume()
+        time.sleep(0.15)
+        timer.pause()
+        count = len(calls)
+        assert count >= 4 and not timer.isActive()
+        time.sleep(0.05)
+        assert len(calls) == count
+        timer.stop()
+        timer.resume()
+        assert not timer.isActive()
+    finally:
+        scheduler.stop()
+
+
+def test_count_timer_update():
+    scheduler = TimerScheduler()
+    calls = []
+    timer = CountTimer(lambda: calls.append(1), interval=60, scheduler=scheduler)
+    try:
+        assert not timer.update()
+        timer.start()
+        assert not timer.update()
+        timer.lastTime -= 61
+        assert timer.update()
+        assert calls == [1]
+        assert not timer.update()
+        timer.stop()
+        timer.lastTime -= 61
+        assert not timer.update()
+    finally:
+        scheduler.stop()
+
+
+def test_async_scheduler_runs_on_the_loop():
+    async def main():
+        scheduler = AsyncTimerScheduler()
+        calls = []
+        scheduler.schedule(0.02, lambda: calls.append(2))
+        scheduler.schedule(0.01, lambda: calls.append(1))
+        scheduler.schedule(0.01, lambda: calls.append("cancelled")).cancel()
+        await asyncio.sleep(0.1)
+        return calls, scheduler.pending()
+
+    assert asyncio.run(main()) == ([1, 2], 0)
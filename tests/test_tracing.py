@@ -0,0 +1,41 @@
+import pytest
+from server.routes import TRACE_KEY
+from utils.metrics import Registry
+from utils.tracing import Tracer, hopDurations, popTrace, stamp
+
+
+def test_pop_trace():
+    data = {"speed": 1, TRACE_KEY: {"id": "a"}}
+    assert popTrace(data) == {"id": "a"}
+    assert data == {"speed": 1}
+    assert popTrace(data) is None
+    assert popTrace("text") is None
+
+
+def test_stamp():
+    trace = stamp({"id": "a"}, "relayIn")
+    assert trace["relayIn"] > 0
+
+
+def test_hop_durations():
+    trace = {"relayIn": 1000, "relayOut": 1002, "rigIn": 5000, "rigOut": 5010, "relayAck": 1032}
+    durations = hopDurations(trace)
+    assert durations["relay"] == pytest.approx(0.002)
+    assert durations["rig"] == pytest.approx(0.010)
+    assert durations["relayRoundTrip"] == pytest.approx(0.030)
+    assert durations["rigNetwork"] == pytest.approx(0.020)
+
+
+def test_hops_need_both_stamps():
+    assert hopDurations({"relayIn": 1000, "rigOut": 2000}) == {}
+    assert hopDurations({"relayIn": 1005, "relayOut": 1000}) == {"relay": 0}
+
+
+def test_tracer_observes_hops():
+    registry = Registry()
+    tracer = Tracer(registry, name="hops")
+    tracer.observe({"relayIn": 1000, "relayOut": 1001})
+    tracer.observeHop("serial", 0.004)
+    text = registry.render()
+    assert 'hops_count{hop="relay"} 1' in text
+    assert 'hops_count{hop="serial"} 1' in text
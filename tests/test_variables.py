@@ -0,0 +1,65 @@
+from utils.history import History
+from utils.variables import Variables
+
+
+def test_patch_returns_changed_keys():
+    variables = Variables({"speed": 0, "play": False})
+    variables["speed"] = 2
+    assert variables.patch() == {"base": 0, "changes": {"speed": 2}}
+    assert variables.patch() == {"base": 0, "changes": {}}
+
+
+def test_apply_patch_in_order():
+    variables = Variables({"speed": 0, "play": False})
+    assert variables.applyPatch({"seq": 1, "changes": {"speed": 2}}) == {"speed": 2}
+    assert variables.seq == 1
+    assert variables.applyPatch('{"seq": 2, "changes": {"speed": 2}}') == {}
+    assert variables.seq == 2
+
+
+def test_apply_patch_ignores_old_and_flags_gaps():
+    variables = Variables({"speed": 0})
+    variables.applyPatch({"seq": 1, "changes": {"speed": 2}})
+    assert variables.applyPatch({"seq": 1, "changes": {"speed": 3}}) is None
+    assert variables["speed"] == 2
+    assert variables.applyPatch({"seq": 5, "changes": {"speed": 4}}) is None
+    assert variables.outOfSync
+    assert variables["speed"] == 2
+
+
+def test_echoes_of_own_patches_keep_newer_values():
+    variables = Variables({"speed": 0})
+    variables["speed"] = 1
+    variables.patch()
+    variables["speed"] = 2
+    assert variables.patch() == {"base": 0, "changes": {"speed": 2}}
+    variables["speed"] = 3
+    assert variables.applyPatch({"seq": 1, "changes": {"speed": 1}}) == {}
+    assert variables.applyPatch({"seq": 2, "changes": {"speed": 2}}) == {}
+    assert variables["speed"] == 3
+    assert variables.patch() == {"base": 2, "changes": {"speed": 3}}
+    variables.applyPatch({"seq": 3, "changes": {"speed": 3}})
+    assert variables.applyPatch({"seq": 4, "changes": {"speed": 4}}) == {"speed": 4}
+    assert variables["speed"] == 4
+
+
+def test_apply_snapshot_resyncs():
+    variables = Variables({"speed": 0})
+    variables.applyPatch({"seq": 5, "changes": {"speed": 4}})
+    variables["play"] = True
+    variables.patch()
+    variables["play"] = False
+    variables.applySnapshot({"seq": 9, "variables": {"speed": 7}})
+    assert variables.snapshot() == {"seq": 9, "variables": {"speed": 7}}
+    assert not variables.outOfSync
+    assert variables.patch()["changes"] == {}
+    assert variables.pending == {}
+    assert variables.applyPatch({"seq": 10, "changes": {"speed": 8}}) == {"speed": 8}
+
+
+def test_changes_are_recorded_on_the_history():
+    history = History(capacity=10)
+    variables = Variables({"speed": 0}, history=history)
+    variables.applyPatch({"seq": 1, "changes": {"speed": 3}})
+    times, values = history.window()
+    assert list(values["speed"]) == [0, 3]
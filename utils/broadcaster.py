@@ -0,0 +1,456 @@
+"""Frame broadcasting utils."""
+import asyncio
+import struct
+import time
+from typing import Union
+import numpy as np
+from utils.encoders import ThreadEncoder
+from utils.metrics import Registry
+from utils.recorder import FrameRing
+
+
+BOUNDARY = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+
+# WebSocket frames header: frame id (uint32) and capture time in ms (float64), little endian.
+HEADER = struct.Struct("<Id")
+
+
+class Subscriber:
+    """A client of the broadcaster, with a small queue that drops stale frames.
+    Args:
+        maxsize: max number of frames waiting to be sent.
+        rendition: a (quality, scale) tuple.
+        adaptive: the rendition could be changed according to the client throughput?
+        kind: "multipart" or "websocket", the way frames are packed for this client.
+        client: an id of the client, used on metrics labels.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 2,
+        rendition: tuple = None,
+        adaptive: bool = False,
+        kind: str = "multipart",
+        client: str = "",
+    ):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.rendition = rendition
+        self.kind = kind
+        self.client = client
+        self.adaptive = adaptive
+        self.level = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.lastDropped = 0
+        self.sentBytes = 0
+        self.throughput = 0.0
+
+    def put(self, part: bytes):
+        """Enqueues a frame, if the queue is full the oldest frame is dropped."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(part)
+
+    async def get(self) -> bytes:
+        """Waits for the next frame."""
+        part = await self.queue.get()
+        self.delivered += 1
+        return part
+
+    def observeSend(self, size: int, seconds: float, smoothing: float = 0.2):
+        """Updates the measured throughput (bytes/sec) with a sent frame."""
+        self.sentBytes += size
+        rate = size / max(seconds, 1e-6)
+        if self.throughput == 0:
+            self.throughput = rate
+        else:
+            self.throughput += smoothing * (rate - self.throughput)
+
+    def droppedSinceLastCheck(self) -> int:
+        """Returns the frames dropped since the last call."""
+        dropped = self.dropped - self.lastDropped
+        self.lastDropped = self.dropped
+        return dropped
+
+
+class FrameBroadcaster:
+    """Encodes the frames of a camera once and shares them with every subscriber.
+
+    A single producer task is started when the first subscriber arrives and it stops
+    when the last one leaves. It waits for new frames of the camera (``frame-available``
+    events, or polling if the camera emitter is disabled), so repeated frames are never
+    sent, and it paces the output against fixed deadlines so the encode time doesn't
+    lower the frame rate. Every subscriber receives the same bytes object through its
+    own bounded queue, so a slow client only loses frames for itself. Frames are packed
+    as multipart parts or as WebSocket messages (``HEADER`` followed by the JPEG), each
+    packing is done once per frame.
+
+    Subscribers ask for a rendition, a (quality, scale) pair. Each rendition is encoded
+    at most once per frame and cached for all the clients asking for it. Adaptive
+    subscribers move along the ladder according to their dropped frames and their
+    measured throughput. A subscriber whose rendition wasn't encoded for a frame (it
+    arrived or moved during the encode) gets the next one. If the producer fails, the
+    error is printed and it's restarted.
+
+    Args:
+        camera: a remio camera device.
+        name: name of the camera.
+        encoder: a ThreadEncoder or a ProcessPoolEncoder, it could be shared by
+                    several broadcasters.
+        fps: max frames per second.
+        quality: JPEG quantization factor of the full rendition.
+        colorspace: source colorspace of the frames.
+        colorsubsampling: subsampling factor for color channels.
+        fastdct: use the fastest DCT method?
+        ladder: list of (quality, scale) renditions, from the best to the smallest.
+        queueSize: max frames waiting for each subscriber.
+        adaptInterval: seconds between adaptive rendition checks.
+        registry: a metrics registry, it could be shared by several broadcasters.
+        recorder: a FrameRing to keep the recent frames of the full rendition. When it's
+                    set, the producer runs even without subscribers.
+
+    Metrics:
+        mjpeg_frame_interval_seconds: time between new camera frames.
+        mjpeg_processing_seconds: time of the camera processing function.
+        mjpeg_processing_stage_seconds: time of each stage, when processing is a Pipeline.
+        mjpeg_encode_seconds: time encoding all the renditions of a frame.
+        mjpeg_send_seconds: time sending a frame to a client.
+        mjpeg_frames_total, mjpeg_sent_bytes_total, mjpeg_dropped_frames_total: counters.
+        mjpeg_clients, mjpeg_fps, mjpeg_target_fps: gauges.
+
+    Example:
+        broadcaster = FrameBroadcaster(camera, fps=12)
+        async for part in broadcaster.subscribe(rendition=(20, 0.5)):
+            ...
+    """
+
+    def __init__(
+        self,
+        camera=None,
+        name: str = "default",
+        encoder=None,
+        fps: int = 12,
+        quality: int = 40,
+        colorspace: str = "bgr",
+        colorsubsampling: str = "422",
+        fastdct: bool = True,
+        ladder: list = None,
+        queueSize: int = 2,
+        adaptInterval: Union[int, float] = 2,
+        registry: Registry = None,
+        recorder: FrameRing = None,
+    ):
+        self.camera = camera
+        self.name = name
+        self.encoder = ThreadEncoder() if encoder is None else encoder
+        self.fps = fps
+        self.quality = quality
+        self.colorspace = colorspace
+        self.colorsubsampling = colorsubsampling
+        self.fastdct = fastdct
+        self.queueSize = queueSize
+        self.adaptInterval = adaptInterval
+        if ladder is None:
+            ladder = [[quality, 1.0], [quality * 3 // 4, 0.75], [quality // 2, 0.5], [10, 0.25]]
+        self.ladder = [self.rendition(q, s) for q, s in ladder]
+        self.jpegs = {}
+        self.cache = {}
+        self.sizes = {}
+        self.frameId = 0
+        self.timestamp = 0.0
+        self.lastFrame = None
+        self.lastAdapt = 0.0
+        self.lastPublish = 0.0
+        self.achievedFps = 0.0
+        self.subscribers = set()
+        self.newFrame = asyncio.Event()
+        self.encodeLock = asyncio.Lock()
+        self.loop: Union[asyncio.AbstractEventLoop, None] = None
+        self.task: Union[asyncio.Task, None] = None
+        if hasattr(self.camera, "on"):
+            self.camera.on("frame-available", self.notify)
+        self.recorder = recorder
+        self.registry = Registry() if registry is None else registry
+        self.configureMetrics()
+
+    def configureMetrics(self):
+        """Creates the metrics of this camera. Per client values are collected on demand."""
+        registry = self.registry
+        self.intervalMetric = registry.histogram(
+            "mjpeg_frame_interval_seconds", "Time between new camera frames.", ["camera"],
+            buckets=(0.01, 0.02, 0.04, 0.067, 0.083, 0.1, 0.15, 0.2, 0.5, 1.0),
+        ).labels(self.name)
+        self.processingMetric = registry.histogram(
+            "mjpeg_processing_seconds", "Time of the camera processing function.", ["camera"]
+        ).labels(self.name)
+        self.stageMetric = registry.histogram(
+            "mjpeg_processing_stage_seconds", "Time of each stage of the processing pipeline.", ["camera", "stage"]
+        )
+        self.encodeMetric = registry.histogram(
+            "mjpeg_encode_seconds", "Time encoding all the renditions of a frame.", ["camera"]
+        ).labels(self.name)
+        self.framesMetric = registry.counter(
+            "mjpeg_frames_total", "Published frames.", ["camera"]
+        ).labels(self.name)
+        self.sendMetric = registry.histogram(
+            "mjpeg_send_seconds", "Time sending a frame to a client.", ["camera", "client"]
+        )
+        self.bytesMetric = registry.counter(
+            "mjpeg_sent_bytes_total", "Bytes sent to a client.", ["camera", "client"]
+        )
+        self.droppedMetric = registry.counter(
+            "mjpeg_dropped_frames_total", "Frames dropped for a slow client.", ["camera", "client"]
+        )
+        self.clientsMetric = registry.gauge("mjpeg_clients", "Connected clients.", ["camera"])
+        self.fpsMetric = registry.gauge("mjpeg_fps", "Achieved frames per second.", ["camera"])
+        self.targetFpsMetric = registry.gauge("mjpeg_target_fps", "Target frames per second.", ["camera"])
+        registry.addCollector(self.collectMetrics)
+        self.instrumentProcessing()
+
+    def collectMetrics(self):
+        """Updates the gauges and the per client counters, it's called before rendering."""
+        self.clientsMetric.labels(self.name).set(len(self.subscribers))
+        self.fpsMetric.labels(self.name).set(self.achievedFps if self.isActive() else 0)
+        self.targetFpsMetric.labels(self.name).set(self.fps)
+        for subscriber in list(self.subscribers):
+            self.bytesMetric.labels(self.name, subscriber.client).value = subscriber.sentBytes
+            self.droppedMetric.labels(self.name, subscriber.client).value = subscriber.dropped
+
+    def instrumentProcessing(self):
+        """Wraps the processing function of the camera to measure its time."""
+        processing = getattr(self.camera, "processing", None)
+        if processing is None or getattr(processing, "instrumented", False):
+            return
+        if hasattr(processing, "instrument"):
+            processing.instrument(self.stageMetric, self.name)
+
+        def timedProcessing(frame, **kwargs):
+            t0 = time.perf_counter()
+            frame = processing(frame, **kwargs)
+            self.processingMetric.observe(time.perf_counter() - t0)
+            return frame
+
+        timedProcessing.instrumented = True
+        timedProcessing.__wrapped__ = processing
+        self.camera.processing = timedProcessing
+
+    @staticmethod
+    def rendition(quality: int = 40, scale: float = 1.0) -> tuple:
+        """Returns a valid (quality, scale) rendition. Values are rounded to steps of 5
+        for the quality and 0.05 for the scale, so clients can't flood the cache."""
+        quality = min(max(5 * round(quality / 5), 5), 95)
+        scale = min(max(round(scale * 20) / 20, 0.05), 1.0)
+        return quality, scale
+
+    def hasSubscribers(self) -> bool:
+        """Checks if someone is waiting for frames."""
+        return len(self.subscribers) > 0
+
+    def isActive(self) -> bool:
+        """Checks if the producer must run, for subscribers or for recording."""
+        return self.hasSubscribers() or self.recorder is not None
+
+    def notify(self, *args):
+        """Wakes up the producer, it's called from the camera thread."""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.newFrame.set)
+
+    def readCamera(self) -> Union[np.ndarray, None]:
+        """Returns the current camera frame."""
+        if hasattr(self.camera, "getFrame"):
+            return self.camera.getFrame()
+        return self.camera.read()
+
+    async def read(self) -> Union[np.ndarray, None]:
+        """Returns the current camera frame. Lazy cameras process the frame when it's
+        read, so it's done on a thread to keep the loop free."""
+        if getattr(self.camera, "lazy", False):
+            return await asyncio.get_running_loop().run_in_executor(None, self.readCamera)
+        return self.readCamera()
+
+    async def nextFrame(self) -> Union[np.ndarray, None]:
+        """Waits for a frame that wasn't published before."""
+        while self.isActive():
+            self.newFrame.clear()
+            frame = await self.read()
+            if frame is not None and frame is not self.lastFrame:
+                self.setFrame(frame)
+                return frame
+            try:
+                await asyncio.wait_for(self.newFrame.wait(), timeout=1 / self.fps)
+            except asyncio.TimeoutError:
+                pass
+
+    def setFrame(self, frame: np.ndarray):
+        """Takes a new camera frame, the encodes of the previous one are discarded."""
+        now = time.time()
+        if self.timestamp > 0:
+            self.intervalMetric.observe(now - self.timestamp)
+        self.lastFrame = frame
+        self.timestamp = now
+        self.frameId += 1
+        self.jpegs = {}
+        self.cache = {}
+
+    async def encodeRenditions(self, frame: np.ndarray, renditions: set) -> dict:
+        """Encodes a frame once for each rendition that isn't encoded yet."""
+        async with self.encodeLock:
+            missing = {r for r in renditions if r not in self.jpegs}
+            if len(missing) > 0:
+                t0 = time.perf_counter()
+                jpegs = await self.encoder.encode(
+                    self.name,
+                    frame,
+                    missing,
+                    colorspace=self.colorspace,
+                    colorsubsampling=self.colorsubsampling,
+                    fastdct=self.fastdct,
+                )
+                self.encodeMetric.observe(time.perf_counter() - t0)
+                if frame is self.lastFrame:
+                    self.jpegs.update(jpegs)
+                return {r: self.jpegs.get(r, jpegs.get(r)) for r in renditions}
+            return {r: self.jpegs[r] for r in renditions}
+
+    async def snapshot(self, rendition: tuple = None) -> Union[tuple, None]:
+        """Returns the latest frame as a (jpeg, frameId, timestamp) tuple. A frame is
+        never encoded twice: if the producer is running its last encode is reused, else
+        the current frame is encoded once and cached.
+        Args:
+            rendition: a (quality, scale) tuple, the full rendition is used if it's None.
+        """
+        rendition = self.ladder[0] if rendition is None else self.rendition(*rendition)
+        if self.task is None:
+            frame = await self.read()
+            if frame is not None and frame is not self.lastFrame:
+                self.setFrame(frame)
+        frame, frameId, timestamp = self.lastFrame, self.frameId, self.timestamp
+        if frame is None:
+            return None
+        jpegs = await self.encodeRenditions(frame, {rendition})
+        return jpegs[rendition], frameId, timestamp
+
+    def pack(self, kind: str, jpeg: bytes) -> bytes:
+        """Packs an encoded frame for a kind of client."""
+        if kind == "websocket":
+            return HEADER.pack(self.frameId & 0xFFFFFFFF, self.timestamp * 1000) + jpeg
+        return BOUNDARY + jpeg + b"\r\n"
+
+    def publish(self, jpegs: dict):
+        """Shares the encoded renditions of a new frame with all the subscribers."""
+        now = time.perf_counter()
+        if self.lastPublish > 0:
+            self.achievedFps += 0.1 * (1 / max(now - self.lastPublish, 1e-6) - self.achievedFps)
+        self.lastPublish = now
+        self.framesMetric.inc()
+        if self.recorder is not None:
+            self.recorder.append(jpegs[self.ladder[0]], self.timestamp)
+        self.sizes.update({r: len(jpeg) for r, jpeg in jpegs.items()})
+        for subscriber in self.subscribers:
+            if subscriber.rendition not in jpegs:
+                continue
+            key = (subscriber.rendition, subscriber.kind)
+            if key not in self.cache:
+                self.cache[key] = self.pack(subscriber.kind, jpegs[subscriber.rendition])
+            subscriber.put(self.cache[key])
+
+    def adapt(self, subscriber: Subscriber):
+        """Moves an adaptive subscriber along the ladder.
+
+        It steps down when the client drops frames or can't keep the current bitrate,
+        and steps up when its throughput has room (twice) for the next rendition. The size
+        of a rendition that wasn't encoded yet is estimated from the current one and the
+        scale ratio.
+        """
+        size = self.sizes.get(subscriber.rendition, 0)
+        dropped = subscriber.droppedSinceLastCheck()
+        level = subscriber.level
+        if dropped > 0 or subscriber.throughput < size * self.fps:
+            level = min(level + 1, len(self.ladder) - 1)
+        elif level > 0:
+            upper = self.ladder[level - 1]
+            upperSize = self.sizes.get(upper, size * (upper[1] / subscriber.rendition[1]) ** 2)
+            if subscriber.throughput > 2 * upperSize * self.fps:
+                level -= 1
+        subscriber.level = level
+        subscriber.rendition = self.ladder[level]
+
+    def adaptSubscribers(self):
+        """Checks the adaptive subscribers each adaptInterval seconds."""
+        now = self.loop.time()
+        if now - self.lastAdapt >= self.adaptInterval:
+            self.lastAdapt = now
+            for subscriber in self.subscribers:
+                if subscriber.adaptive:
+                    self.adapt(subscriber)
+
+    async def run(self):
+        """Producer loop, it encodes each new frame once per rendition while there are
+        subscribers or a recorder."""
+        period = 1 / self.fps
+        deadline = self.loop.time()
+        self.lastAdapt = deadline
+        try:
+            while self.isActive():
+                delay = deadline - self.loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                frame = await self.nextFrame()
+                if frame is None:
+                    break
+                renditions = {s.rendition for s in self.subscribers}
+                if self.recorder is not None:
+                    renditions.add(self.ladder[0])
+                jpegs = await self.encodeRenditions(frame, renditions)
+                self.publish(jpegs)
+                self.adaptSubscribers()
+                deadline = max(deadline + period, self.loop.time())
+        finally:
+            self.task = None
+
+    def startProducer(self):
+        """Starts the producer task if it isn't running."""
+        if self.task is None:
+            self.loop = asyncio.get_running_loop()
+            self.task = self.loop.create_task(self.run())
+            self.task.add_done_callback(self.producerDone)
+
+    def producerDone(self, task: asyncio.Task):
+        """Prints the error of a failed producer and restarts it, a second later."""
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"-> FrameBroadcaster {self.name} :: {task.exception()!r}")
+        if self.isActive():
+            self.loop.call_later(1, self.restartProducer)
+
+    def restartProducer(self):
+        if self.isActive():
+            self.startProducer()
+
+    async def subscribe(self, rendition: tuple = None, kind: str = "multipart", client: str = ""):
+        """Yields every new packed frame until the subscriber leaves.
+        Args:
+            rendition: a (quality, scale) tuple. If it's None, the rendition is
+                        picked from the client throughput.
+            kind: "multipart" or "websocket".
+            client: an id of the client, used on metrics labels.
+        """
+        adaptive = rendition is None
+        rendition = self.ladder[0] if adaptive else self.rendition(*rendition)
+        subscriber = Subscriber(self.queueSize, rendition, adaptive=adaptive, kind=kind, client=client)
+        sendMetric = self.sendMetric.labels(self.name, client)
+        self.subscribers.add(subscriber)
+        self.startProducer()
+        try:
+            while True:
+                part = await subscriber.get()
+                t0 = time.perf_counter()
+                yield part
+                elapsed = time.perf_counter() - t0
+                subscriber.observeSend(len(part), elapsed)
+                sendMetric.observe(elapsed)
+        finally:
+            self.subscribers.discard(subscriber)
+            for metric in (self.sendMetric, self.bytesMetric, self.droppedMetric):
+                metric.remove(self.name, client)
@@ -0,0 +1,152 @@
+"""JPEG encoders for the MJPEG server."""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context, shared_memory
+from typing import Union
+import numpy as np
+import simplejpeg
+import cv2
+
+
+def encodeJPEG(
+    frame: np.ndarray = None,
+    quality: int = 30,
+    colorspace: str = "bgr",
+    colorsubsampling: str = "444",
+    fastdct: bool = True,
+) -> bytes:
+    """Encodes an image array as JPEG.
+    Args:
+        frame: image array
+        quality: JPEG quantization factor
+        colorspace: source colorspace
+        colorsubsampling: subsampling factor for color channels
+        fastdct: use the fastest DCT method?
+    """
+    if frame.ndim == 2:
+        frame = frame[:, :, np.newaxis]
+        colorspace = "GRAY"
+    return simplejpeg.encode_jpeg(frame, quality, colorspace, colorsubsampling, fastdct)
+
+
+def scaleFrame(frame: np.ndarray = None, scale: float = 1.0) -> np.ndarray:
+    """Downscales an image array, the frame is returned untouched if scale is 1."""
+    if scale >= 1:
+        return frame
+    h, w = frame.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def encodeRendition(frame: np.ndarray = None, rendition: tuple = (40, 1.0), **params) -> bytes:
+    """Encodes a frame with a (quality, scale) rendition."""
+    quality, scale = rendition
+    return encodeJPEG(scaleFrame(frame, scale), quality=quality, **params)
+
+
+# Shared memory blocks attached by a worker process, by name.
+attachedBlocks = {}
+
+
+def encodeShared(name: str, shape: tuple, dtype: str, rendition: tuple, **params) -> bytes:
+    """Encodes a frame stored on a shared memory block. It runs on a worker process."""
+    block = attachedBlocks.get(name)
+    if block is None:
+        if len(attachedBlocks) >= 16:
+            for old in attachedBlocks.values():
+                old.close()
+            attachedBlocks.clear()
+        block = shared_memory.SharedMemory(name=name)
+        attachedBlocks[name] = block
+    frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return encodeRendition(frame, rendition, **params)
+
+
+class ThreadEncoder:
+    """Encodes frames on a thread pool executor.
+    Args:
+        executor: a thread pool, if it's None the loop default executor is used.
+    """
+
+    def __init__(self, executor: Union[Executor, None] = None):
+        self.executor = executor
+
+    async def encode(self, key: str, frame: np.ndarray, renditions: set, **params) -> dict:
+        """Encodes a frame once for each rendition.
+        Args:
+            key: name of the frames source.
+            frame: image array.
+            renditions: set of (quality, scale) tuples.
+            params: colorspace, colorsubsampling and fastdct params.
+        """
+        loop = asyncio.get_running_loop()
+        renditions = list(renditions)
+        jpegs = await asyncio.gather(
+            *[
+                loop.run_in_executor(self.executor, partial(encodeRendition, frame, r, **params))
+                for r in renditions
+            ]
+        )
+        return dict(zip(renditions, jpegs))
+
+    def close(self):
+        """Releases the encoder resources."""
+
+
+class ProcessPoolEncoder:
+    """Encodes frames on a pool of processes, so several cameras can use several cores.
+
+    Frames are copied once to a shared memory block per source and the workers read them
+    from there, so arrays are never pickled. A source must not publish a new frame until
+    the encodes of the previous one have finished.
+
+    Args:
+        workers: number of processes.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        self.blocks = {}
+
+    def share(self, key: str, frame: np.ndarray) -> shared_memory.SharedMemory:
+        """Copies a frame to the shared memory block of its source."""
+        block = self.blocks.get(key)
+        if block is None or block.size < frame.nbytes:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            self.blocks[key] = block
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=block.buf)[...] = frame
+        return block
+
+    async def encode(self, key: str, frame: np.ndarray, renditions: set, **params) -> dict:
+        """Encodes a frame once for each rendition.
+        Args:
+            key: name of the frames source.
+            frame: image array.
+            renditions: set of (quality, scale) tuples.
+            params: colorspace, colorsubsampling and fastdct params.
+        """
+        loop = asyncio.get_running_loop()
+        block = self.share(key, frame)
+        renditions = list(renditions)
+        jpegs = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self.pool,
+                    partial(encodeShared, block.name, frame.shape, frame.dtype.str, r, **params),
+                )
+                for r in renditions
+            ]
+        )
+        return dict(zip(renditions, jpegs))
+
+    def close(self):
+        """Stops the workers and releases the shared memory blocks."""
+        self.pool.shutdown(wait=False)
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks.clear()
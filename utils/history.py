@@ -0,0 +1,202 @@
+"""A bounded time series history of the variables, stored by columns on NumPy arrays."""
+from collections import deque
+from threading import Lock
+from typing import Union
+import time
+import numpy as np
+
+
+class History:
+    """A fixed size ring of timestamped samples, one NumPy array for each variable.
+
+    Each record is a sample of every column: values that aren't on the record keep their
+    last value, so a column could be plotted as a step line. Only numbers and booleans
+    are stored. Memory is allocated up front, ``capacity * (columns + 1) * 8`` bytes,
+    and the oldest samples are overwritten. Events and text messages of the serial device
+    are kept apart, as rows tagged by kind on a ring of ``maxEvents`` rows.
+
+    Samples are indexed by ``time.monotonic()``, so the index stays sorted when the wall
+    clock is adjusted. Times of the windows are wall clock times (``time.time()``),
+    converted with the current offset between both clocks.
+
+    Example:
+        history = History(capacity=100000)
+        history.record({"speed": 20, "play": True})
+        history.recordEvent("event", "received")
+        window = history.decimate(start=time.time() - 60, points=500)
+
+    Args:
+        capacity: max number of samples.
+        columns: initial column names, other columns are added when they are recorded.
+        maxColumns: max number of columns, new ones are ignored after it.
+        points: default number of points of a decimated window.
+        maxEvents: max number of events and text messages.
+    """
+
+    def __init__(
+        self, capacity: int = 100000, columns: list = [], maxColumns: int = 32, points: int = 500, maxEvents: int = 1000
+    ):
+        self.capacity = capacity
+        self.maxColumns = maxColumns
+        self.points = points
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.columns = {}
+        self.last = {}
+        self.index = 0
+        self.count = 0
+        self.events = deque(maxlen=maxEvents)
+        self.lock = Lock()
+        for name in columns:
+            self.addColumn(name)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the samples, in bytes."""
+        return self.times.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    def addColumn(self, name: str) -> bool:
+        """Adds a column without past samples, it returns False if the limit was reached."""
+        if name in self.columns:
+            return True
+        if len(self.columns) >= self.maxColumns:
+            return False
+        self.columns[name] = np.full(self.capacity, np.nan, dtype=np.float64)
+        return True
+
+    def record(self, values: dict, timestamp: float = None):
+        """Records a sample.
+        Args:
+            values: a dict of variables, non numeric values are skipped.
+            timestamp: time of the sample on the ``time.monotonic()`` clock, now by default.
+        """
+        numbers = {
+            key: float(value)
+            for key, value in values.items()
+            if isinstance(value, (bool, int, float, np.number))
+        }
+        with self.lock:
+            for key, value in numbers.items():
+                if self.addColumn(key):
+                    self.last[key] = value
+            i = self.index
+            self.times[i] = time.monotonic() if timestamp is None else timestamp
+            for name, column in self.columns.items():
+                column[i] = self.last.get(name, np.nan)
+            self.index = (i + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def recordEvent(self, kind: str, message: str, timestamp: float = None):
+        """Records an event or a text message of the serial device.
+        Args:
+            kind: tag of the row, ex. "event" or "data".
+            message: the event or the text, ex. "received".
+            timestamp: time of the row on the ``time.monotonic()`` clock, now by default.
+        """
+        with self.lock:
+            self.events.append((time.monotonic() if timestamp is None else timestamp, kind, str(message)))
+
+    @staticmethod
+    def clockOffset() -> float:
+        """Returns the wall clock time minus the monotonic time, in seconds."""
+        return time.time() - time.monotonic()
+
+    def chronological(self, array: np.ndarray) -> np.ndarray:
+        """Returns a copy of the recorded part of an array, oldest first."""
+        if self.count < self.capacity:
+            return array[: self.count].copy()
+        return np.concatenate((array[self.index :], array[: self.index]))
+
+    def window(self, start: float = None, end: float = None, columns: list = None) -> tuple:
+        """Returns the samples between two times.
+        Args:
+            start: from this time (seconds), the oldest sample by default.
+            end: until this time (seconds), the last sample by default.
+            columns: names of the columns, all of them by default.
+        Returns:
+            the times and a dict of values by column.
+        """
+        offset = self.clockOffset()
+        with self.lock:
+            names = [name for name in (columns or self.columns) if name in self.columns]
+            times = self.chronological(self.times)
+            lo = 0 if start is None else np.searchsorted(times, start - offset, "left")
+            hi = len(times) if end is None else np.searchsorted(times, end - offset, "right")
+            values = {name: self.chronological(self.columns[name])[lo:hi] for name in names}
+        return times[lo:hi] + offset, values
+
+    def eventsWindow(self, start: float = None, end: float = None) -> list:
+        """Returns the events and text messages between two wall clock times, like
+        [[time, kind, message], ...], oldest first."""
+        offset = self.clockOffset()
+        with self.lock:
+            rows = list(self.events)
+        return [
+            [timestamp + offset, kind, message]
+            for timestamp, kind, message in rows
+            if (start is None or timestamp + offset >= start) and (end is None or timestamp + offset <= end)
+        ]
+
+    def decimate(self, start: float = None, end: float = None, points: int = None, columns: list = None) -> tuple:
+        """Returns a window with at most ``points`` samples by column, for plotting.
+
+        The window is split in ``points / 2`` buckets and each bucket gives its min and max
+        values (at the first and last time of the bucket), so peaks are never lost.
+        Args:
+            start: from this time (seconds), the oldest sample by default.
+            end: until this time (seconds), the last sample by default.
+            points: max number of points, ``self.points`` by default.
+            columns: names of the columns, all of them by default.
+        Returns:
+            the times and a dict of values by column.
+        """
+        times, values = self.window(start, end, columns)
+        points = points or self.points
+        buckets = max(points // 2, 1)
+        if len(times) <= points:
+            return times, values
+        starts = np.linspace(0, len(times), buckets, endpoint=False).astype(np.int64)
+        ends = np.append(starts[1:], len(times)) - 1
+        decimatedTimes = np.empty(buckets * 2)
+        decimatedTimes[0::2] = times[starts]
+        decimatedTimes[1::2] = times[ends]
+        decimated = {}
+        for name, column in values.items():
+            decimated[name] = np.empty(buckets * 2)
+            decimated[name][0::2] = np.fmin.reduceat(column, starts)
+            decimated[name][1::2] = np.fmax.reduceat(column, starts)
+        return decimatedTimes, decimated
+
+    @staticmethod
+    def toList(array: np.ndarray) -> list:
+        """Converts an array to a JSON friendly list, NaN are None."""
+        return [None if value != value else value for value in array.tolist()]
+
+    def toDict(self, start: float = None, end: float = None, points: int = None, columns: list = None) -> dict:
+        """Returns a decimated window as a dict, to be sent through the socket.
+        Returns:
+            a dict like {"t": [...], "columns": {"speed": [...]}, "events": [[t, "event", "received"]],
+            "start": t0, "end": t1}.
+        """
+        times, values = self.decimate(start, end, points, columns)
+        return {
+            "t": times.tolist(),
+            "columns": {name: self.toList(column) for name, column in values.items()},
+            "events": self.eventsWindow(start, end),
+            "start": start,
+            "end": end,
+        }
+
+    def windowFromRequest(self, request: Union[dict, None] = None) -> dict:
+        """Returns a decimated window for a request like {"seconds": 60, "points": 500},
+        or {"start": t0, "end": t1}, and optionally {"columns": ["speed"]}."""
+        request = request or {}
+        start, end = request.get("start"), request.get("end")
+        if start is None and request.get("seconds") is not None:
+            start = (end or time.time()) - request["seconds"]
+        window = self.toDict(start, end, request.get("points"), request.get("columns"))
+        if "sid" in request:
+            window["sid"] = request["sid"]
+        return window
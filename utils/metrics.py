@@ -0,0 +1,188 @@
+"""Some lightweight metrics, rendered on the Prometheus text format."""
+from bisect import bisect_left
+from typing import Callable, Union
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def formatLabels(names: tuple, values: tuple, extra: str = "") -> str:
+    """Returns the labels of a sample, ex. {camera="webcam",client="1"}."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterChild:
+    """A counter value for a set of labels."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: Union[int, float] = 1):
+        """Increments the counter."""
+        self.value += amount
+
+
+class GaugeChild:
+    """A gauge value for a set of labels."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: Union[int, float]):
+        """Updates the gauge."""
+        self.value = value
+
+
+class HistogramChild:
+    """A histogram for a set of labels.
+    Args:
+        buckets: sorted upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Records a value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """A family of samples with the same name and label names.
+    Args:
+        name: metric name.
+        help: description of the metric.
+        labels: label names.
+    """
+
+    kind = "untyped"
+    child = CounterChild
+
+    def __init__(self, name: str, help: str = "", labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labels)
+        self.children = {}
+
+    def labels(self, *values):
+        """Returns the child of a set of label values. Keep it to avoid repeated lookups."""
+        child = self.children.get(values)
+        if child is None:
+            child = self.newChild()
+            self.children[values] = child
+        return child
+
+    def newChild(self):
+        return self.child()
+
+    def remove(self, *values):
+        """Removes the child of a set of label values, ex. when a client leaves."""
+        self.children.pop(values, None)
+
+    def samples(self):
+        """Yields the text lines of the samples."""
+        for values, child in list(self.children.items()):
+            yield f"{self.name}{formatLabels(self.labelNames, values)} {child.value}"
+
+    def render(self) -> str:
+        """Returns the metric on the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+    child = CounterChild
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+    child = GaugeChild
+
+
+class Histogram(Metric):
+    """Counts the observed values on buckets.
+    Args:
+        buckets: sorted upper bounds of the buckets.
+    """
+
+    kind = "histogram"
+    child = HistogramChild
+
+    def __init__(self, name: str, help: str = "", labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def newChild(self):
+        return HistogramChild(self.buckets)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else bound
+                labels = formatLabels(self.labelNames, values, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = formatLabels(self.labelNames, values)
+            yield f"{self.name}_sum{labels} {child.sum}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    """A collection of metrics.
+
+    Collectors are functions called before rendering, they are useful to update gauges
+    that are cheaper to compute on demand than on every change.
+
+    Example:
+        registry = Registry()
+        frames = registry.counter("frames_total", "Published frames.", ["camera"])
+        frames.labels("webcam").inc()
+        print(registry.render())
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric, if a metric with the same name exists it's returned instead."""
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str = "", labels: tuple = ()) -> Counter:
+        """Creates (or returns) a counter."""
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str = "", labels: tuple = ()) -> Gauge:
+        """Creates (or returns) a gauge."""
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str = "", labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Creates (or returns) a histogram."""
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def addCollector(self, collector: Callable):
+        """Adds a function to be called before rendering."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Returns all the metrics on the Prometheus text format."""
+        for collector in self.collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
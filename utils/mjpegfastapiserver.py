@@ -1,14 +1,64 @@
-import asyncio
 from threading import Thread
-from fastapi import FastAPI
+import asyncio
+import contextlib
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response, FileResponse
 from remio import Camera
 import uvicorn
+from utils.broadcaster import FrameBroadcaster
+from utils.encoders import ThreadEncoder, ProcessPoolEncoder
+from utils.metrics import Registry
+from utils.recorder import FrameRing, pruneClips
+
+
+class EmbeddedServer(uvicorn.Server):
+    """A uvicorn server running on an event loop owned by the app, signals are left to it."""
+
+    def install_signal_handlers(self):
+        pass
+
+    def capture_signals(self):
+        return contextlib.nullcontext()
 
 
 class MJPEGAsyncServer:
-    """A MJPEG async server made with FastAPI."""
+    """A MJPEG async server made with FastAPI.
+
+    Every camera is served on ``/cam/{name}``, and the first one on ``endpoint`` too.
+    The last frame is available as a still image on ``/snapshot.jpg`` and
+    ``/cam/{name}/snapshot.jpg``, with ETag and Last-Modified headers for conditional
+    requests. ``/ws`` and ``/cam/{name}/ws`` push the same encoded frames as binary
+    WebSocket messages, each one with a header (frame id, capture time) before the JPEG.
+    ``/metrics`` exposes the video path metrics on the Prometheus text format.
+    If recording is enabled, the last seconds of each camera are kept in memory and
+    ``/clip.avi?seconds=30`` (or ``/cam/{name}/clip.avi``) dumps them as a MJPEG/AVI clip.
+    Clients could ask for a rendition with query params, ex. ``/?quality=20&scale=0.5``.
+    Without params the rendition is picked from the client throughput.
+
+    Args:
+        camera: a remio camera device.
+        fps: max frames per second.
+        ip: server address.
+        port: server port.
+        endpoint: streaming route.
+        cameras: a dict of camera devices (or a remio Cameras instance) to be served
+                    instead of a single camera.
+        quality: JPEG quantization factor of the full rendition.
+        colorsubsampling: subsampling factor for color channels.
+        fastdct: use the fastest DCT method?
+        ladder: list of (quality, scale) renditions used by adaptive clients.
+        encoderWorkers: number of processes for encoding. If it's 0, frames are encoded
+                    on threads of the server process.
+        recordSeconds: seconds of video kept in memory for each camera, 0 disables it.
+        recordBytes: memory for the recorded frames of each camera, in bytes.
+        clipsFolder: folder where the exported clips are saved.
+        maxClips: max number of clips kept on the clips folder, the oldest ones are deleted.
+        maxClipAge: max age of the kept clips in seconds, None keeps them until maxClips.
+    """
 
     def __init__(
         self,
@@ -17,19 +67,71 @@ class MJPEGAsyncServer:
         ip: str = "0.0.0.0",
         port: int = 8080,
         endpoint: str = "/",
+        cameras: dict = None,
+        quality: int = 40,
+        colorsubsampling: str = "422",
+        fastdct: bool = True,
+        ladder: list = None,
+        encoderWorkers: int = 0,
+        recordSeconds: int = 0,
+        recordBytes: int = 64 * 1024 * 1024,
+        clipsFolder: str = "clips",
+        maxClips: int = 20,
+        maxClipAge: float = None,
         *args,
         **kwargs
     ):
-        self.camera = camera
+        if cameras is None:
+            cameras = {getattr(camera, "name", "default"): camera}
+        elif hasattr(cameras, "devices"):
+            cameras = cameras.devices
+        self.cameras = cameras
+        self.camera = camera if camera is not None else next(iter(cameras.values()))
         self.ip = ip
         self.port = port
         self.fps = fps
         self.endpoint = endpoint
+        self.epoch = format(int(time.time()), "x")
+        self.clipsFolder = clipsFolder
+        self.maxClips = maxClips
+        self.maxClipAge = maxClipAge
+        if encoderWorkers > 0:
+            self.encoder = ProcessPoolEncoder(workers=encoderWorkers)
+        else:
+            self.encoder = ThreadEncoder()
+        self.registry = Registry()
+        self.broadcasters = {
+            name: FrameBroadcaster(
+                device,
+                name=name,
+                encoder=self.encoder,
+                fps=fps,
+                quality=quality,
+                colorspace="bgr",
+                colorsubsampling=colorsubsampling,
+                fastdct=fastdct,
+                ladder=ladder,
+                registry=self.registry,
+                recorder=FrameRing(recordSeconds, fps, recordBytes) if recordSeconds > 0 else None,
+            )
+            for name, device in self.cameras.items()
+        }
+        self.broadcaster = next(iter(self.broadcasters.values()))
         self.server: FastAPI = FastAPI()
         self.server.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
         self.server.add_route(self.endpoint, self.streaming_route)
+        self.server.add_route("/cam/{name}", self.streaming_route)
+        self.server.add_route("/snapshot.jpg", self.snapshot_route)
+        self.server.add_route("/cam/{name}/snapshot.jpg", self.snapshot_route)
+        self.server.add_route("/metrics", self.metrics_route)
+        self.server.add_route("/clip.avi", self.clip_route)
+        self.server.add_route("/cam/{name}/clip.avi", self.clip_route)
+        self.server.add_websocket_route("/ws", self.websocket_route)
+        self.server.add_websocket_route("/cam/{name}/ws", self.websocket_route)
+        self.server.add_event_handler("startup", self.startRecording)
         self.thread: Thread = Thread(target=self.run, daemon=True)
         self.loop = None
+        self.uvicorn = None
 
     def start(self):
         """Starts server loop on a separated thread."""
@@ -37,35 +139,149 @@ class MJPEGAsyncServer:
 
     def stop(self):
         """Stops server"""
-        self.thread.join(1)
-
-    async def camera_read(self):
-        """Camera read loop."""
-        while True:
-            yield self.camera.jpeg(quality=30, colorspace="bgr")
-            await asyncio.sleep(1 / self.fps)
-
-    async def streaming(self, *args, **kwargs):
-        """Streaming loop."""
-        async for frame in self.camera_read():
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n"
-                + frame
-                + b"\r\n"
-            )
+        if self.uvicorn is not None:
+            self.uvicorn.should_exit = True
+        self.encoder.close()
+        if self.thread.is_alive():
+            self.thread.join(1)
+
+    def startRecording(self):
+        """Starts the producers of the cameras that are recorded."""
+        for broadcaster in self.broadcasters.values():
+            if broadcaster.recorder is not None:
+                broadcaster.startProducer()
 
-    async def streaming_route(self, *args, **kwargs):
+    def getBroadcaster(self, request):
+        """Returns the broadcaster of the camera asked on the route (an HTTP request or a
+        websocket), or None."""
+        name = request.path_params.get("name")
+        if name is None:
+            return self.broadcaster
+        return self.broadcasters.get(name)
+
+    def parseRendition(self, params: dict = {}):
+        """Returns the (quality, scale) rendition asked by a client, or None."""
+        if "quality" not in params and "scale" not in params:
+            return None
+        quality, scale = self.broadcaster.ladder[0]
+        return int(params.get("quality", quality)), float(params.get("scale", scale))
+
+    @staticmethod
+    def clientId(connection) -> str:
+        """Returns an id (address:port) for the client of a request or a websocket."""
+        client = connection.client
+        return f"{client.host}:{client.port}" if client is not None else ""
+
+    async def streaming(
+        self, broadcaster: FrameBroadcaster, rendition: tuple = None, client: str = "", *args, **kwargs
+    ):
+        """Streaming loop, frames are encoded once per rendition and shared by all the clients."""
+        async for part in broadcaster.subscribe(rendition, client=client):
+            yield part
+
+    async def streaming_route(self, request, *args, **kwargs):
         """Route for view the streaming."""
+        broadcaster = self.getBroadcaster(request)
+        if broadcaster is None:
+            return PlainTextResponse("camera not found", status_code=404)
+        try:
+            rendition = self.parseRendition(request.query_params)
+        except ValueError:
+            return PlainTextResponse("quality must be an int and scale a float", status_code=400)
         return StreamingResponse(
-            self.streaming(),
+            self.streaming(broadcaster, rendition, self.clientId(request)),
             headers={"Content-Type": "multipart/x-mixed-replace; boundary=frame"},
         )
 
+    async def websocket_route(self, websocket: WebSocket):
+        """Route for view the streaming through a WebSocket, frames are sent as binary messages."""
+        broadcaster = self.getBroadcaster(websocket)
+        if broadcaster is None:
+            await websocket.close(code=1008)
+            return
+        try:
+            rendition = self.parseRendition(websocket.query_params)
+        except ValueError:
+            await websocket.close(code=1003)
+            return
+        await websocket.accept()
+        try:
+            client = self.clientId(websocket)
+            async for message in broadcaster.subscribe(rendition, kind="websocket", client=client):
+                await websocket.send_bytes(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    async def metrics_route(self, *args, **kwargs):
+        """Route for the metrics, on the Prometheus text format."""
+        return PlainTextResponse(self.registry.render(), media_type="text/plain; version=0.0.4")
+
+    async def clip_route(self, request, *args, **kwargs):
+        """Route for download the last seconds of a camera as a MJPEG/AVI clip."""
+        broadcaster = self.getBroadcaster(request)
+        if broadcaster is None or broadcaster.recorder is None:
+            return PlainTextResponse("recording is not enabled for this camera", status_code=404)
+        try:
+            seconds = float(request.query_params.get("seconds", broadcaster.recorder.seconds))
+        except ValueError:
+            return PlainTextResponse("seconds must be a number", status_code=400)
+        filename = f"{broadcaster.name}-{time.strftime('%Y%m%d-%H%M%S')}.avi"
+        path = os.path.join(self.clipsFolder, filename)
+        loop = asyncio.get_running_loop()
+        frames = await loop.run_in_executor(None, broadcaster.recorder.export, path, seconds)
+        if frames == 0:
+            return PlainTextResponse("there are no recorded frames", status_code=503)
+        await loop.run_in_executor(None, pruneClips, self.clipsFolder, self.maxClips, self.maxClipAge)
+        return FileResponse(path, media_type="video/x-msvideo", filename=filename)
+
+    @staticmethod
+    def notModified(request, etag: str, timestamp: float) -> bool:
+        """Checks the conditional headers of a request."""
+        ifNoneMatch = request.headers.get("if-none-match")
+        if ifNoneMatch is not None:
+            return etag in [tag.strip() for tag in ifNoneMatch.split(",")] or ifNoneMatch.strip() == "*"
+        ifModifiedSince = request.headers.get("if-modified-since")
+        if ifModifiedSince is not None:
+            try:
+                return int(timestamp) <= parsedate_to_datetime(ifModifiedSince).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def snapshot_route(self, request, *args, **kwargs):
+        """Route for the last frame as a still image, it's never re-encoded."""
+        broadcaster = self.getBroadcaster(request)
+        if broadcaster is None:
+            return PlainTextResponse("camera not found", status_code=404)
+        try:
+            rendition = self.parseRendition(request.query_params)
+        except ValueError:
+            return PlainTextResponse("quality must be an int and scale a float", status_code=400)
+        snapshot = await broadcaster.snapshot(rendition)
+        if snapshot is None:
+            return PlainTextResponse("frame not available", status_code=503)
+        jpeg, frameId, timestamp = snapshot
+        quality, scale = broadcaster.ladder[0] if rendition is None else broadcaster.rendition(*rendition)
+        etag = f'"{broadcaster.name}-{self.epoch}-{frameId}-{quality}-{scale}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(timestamp, usegmt=True),
+            "Cache-Control": "no-cache",
+        }
+        if self.notModified(request, etag, timestamp):
+            return Response(status_code=304, headers=headers)
+        return Response(jpeg, media_type="image/jpeg", headers=headers)
+
     def run(self):
         """Executes the server loop."""
         uvicorn.run(self.server, host=self.ip, port=self.port, access_log=True)
 
+    async def serve(self):
+        """Serves on the running event loop instead of a thread, until stop is called."""
+        config = uvicorn.Config(self.server, host=self.ip, port=self.port, access_log=True)
+        self.uvicorn = EmbeddedServer(config)
+        await self.uvicorn.serve()
+
 
 if __name__ == "__main__":
     camera = Camera(src=0, size=[800, 600], flipX=True).loadDevice()
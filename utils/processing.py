@@ -1,4 +1,8 @@
 """Some processing utils."""
+from threading import Thread, Condition, Lock
+from typing import Callable, Union
+import sys
+import time
 import numpy as np
 import cv2
 
@@ -7,3 +11,403 @@ def processing(frame: np.ndarray = None):
     """It applies some processing to the image"""
     # frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     return frame
+
+
+class BufferRing:
+    """A few output buffers reused in turns. Consumers keep a reference to a frame while
+    they use it (the encoder threads, the GUI, the cache of the last frame), so a buffer
+    is only reused when nobody else references it (or a view of it). While every buffer
+    is in use the ring grows, up to ``limit`` buffers; past it they are reused in turns.
+    Args:
+        size: number of buffers before any reuse.
+        limit: max number of buffers.
+    """
+
+    def __init__(self, size: int = 3, limit: int = 16):
+        self.size = size
+        self.limit = max(limit, size)
+        self.buffers = []
+        self.index = 0
+        self.key = None
+
+    def next(self, key: tuple) -> Union[None, np.ndarray]:
+        """Returns the next free buffer, or None while the ring is being filled (or
+        grows), then the stage allocates the result and the ring adopts it.
+        Args:
+            key: shape and dtype of the input, buffers are dropped when it changes.
+        """
+        if key != self.key:
+            self.buffers = []
+            self.key = key
+        if len(self.buffers) < self.size:
+            return None
+        count = len(self.buffers)
+        for step in range(1, count + 1):
+            index = (self.index + step) % count
+            # referenced by the list and by the getrefcount argument only
+            if sys.getrefcount(self.buffers[index]) <= 2:
+                self.index = index
+                return self.buffers[index]
+        if count < self.limit:
+            return None
+        self.index = (self.index + 1) % count
+        return self.buffers[self.index]
+
+    def adopt(self, array: np.ndarray):
+        """Keeps an array allocated by a stage as a buffer."""
+        self.buffers.append(array)
+        self.index = len(self.buffers) - 1
+
+
+class Stage:
+    """A processing step. Subclasses implement ``apply(frame, dst)``, where ``dst`` is
+    a reused buffer (or None the first times) to write the result on.
+    Args:
+        name: name for timings and metrics, the class name by default.
+        buffers: number of reused output buffers.
+    """
+
+    draws = False  # draws on its input instead of writing a new image
+
+    def __init__(self, name: str = None, buffers: int = 3):
+        self.name = name or type(self).__name__.lower()
+        self.ring = BufferRing(buffers)
+        self.seconds = 0.0
+
+    def apply(self, frame: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
+        return frame
+
+    def __call__(self, frame: np.ndarray, owned: bool = False) -> tuple:
+        """Processes a frame.
+        Args:
+            frame: input image.
+            owned: the input is a buffer of the pipeline, so it could be drawn on.
+        Returns:
+            the result, and if it's owned by the pipeline.
+        """
+        if self.draws and owned:
+            return self.apply(frame, frame), True
+        dst = self.ring.next((frame.shape, frame.dtype))
+        if self.draws:
+            if dst is None:
+                dst = frame.copy()
+                self.ring.adopt(dst)
+            else:
+                np.copyto(dst, frame)
+            return self.apply(dst, dst), True
+        result = self.apply(frame, dst)
+        if dst is None:
+            self.ring.adopt(result)
+        return result, True
+
+
+class Flip(Stage):
+    """Flips the image.
+    Args:
+        code: 0 flips vertically, 1 horizontally and -1 both.
+    """
+
+    def __init__(self, code: int = 1, **kwargs):
+        super().__init__(**kwargs)
+        self.code = code
+
+    def apply(self, frame, dst=None):
+        return cv2.flip(frame, self.code, dst=dst)
+
+
+class Crop(Stage):
+    """Crops a region of the image, it's a view so nothing is copied.
+    Args:
+        x: left column.
+        y: top row.
+        width: region width.
+        height: region height.
+    """
+
+    def __init__(self, x: int = 0, y: int = 0, width: int = None, height: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+
+    def __call__(self, frame, owned=False):
+        right = None if self.width is None else self.x + self.width
+        bottom = None if self.height is None else self.y + self.height
+        return frame[self.y : bottom, self.x : right], owned
+
+
+class Resize(Stage):
+    """Resizes the image.
+    Args:
+        size: (width, height) of the result.
+        interpolation: a cv2 interpolation flag.
+    """
+
+    def __init__(self, size: tuple = (640, 480), interpolation: int = cv2.INTER_AREA, **kwargs):
+        super().__init__(**kwargs)
+        self.size = tuple(size)
+        self.interpolation = interpolation
+
+    def apply(self, frame, dst=None):
+        return cv2.resize(frame, self.size, dst=dst, interpolation=self.interpolation)
+
+
+class ColorConvert(Stage):
+    """Converts the image to another colorspace.
+    Args:
+        code: a cv2 color conversion code, ex. cv2.COLOR_BGR2GRAY.
+    """
+
+    def __init__(self, code: int = cv2.COLOR_BGR2GRAY, **kwargs):
+        super().__init__(**kwargs)
+        self.code = code
+
+    def apply(self, frame, dst=None):
+        return cv2.cvtColor(frame, self.code, dst=dst)
+
+
+class Overlay(Stage):
+    """Blends an image (ex. a logo or a mask) over a region of the frame.
+    Args:
+        image: the image to blend, with the same channels of the frame.
+        x: left column of the region.
+        y: top row of the region.
+        alpha: opacity of the image.
+    """
+
+    draws = True
+
+    def __init__(self, image: np.ndarray = None, x: int = 0, y: int = 0, alpha: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.image = image
+        self.x, self.y = x, y
+        self.alpha = alpha
+
+    def apply(self, frame, dst=None):
+        height, width = self.image.shape[:2]
+        region = frame[self.y : self.y + height, self.x : self.x + width]
+        image = self.image[: region.shape[0], : region.shape[1]]
+        if self.alpha >= 1.0:
+            np.copyto(region, image)
+        else:
+            cv2.addWeighted(region, 1 - self.alpha, image, self.alpha, 0, dst=region)
+        return frame
+
+
+class Annotate(Stage):
+    """Writes a text on the frame.
+    Args:
+        text: a string, or a function that returns it (ex. a clock).
+        origin: (x, y) of the bottom left corner of the text.
+        color: text color.
+        scale: font scale.
+        thickness: line thickness.
+    """
+
+    draws = True
+
+    def __init__(
+        self,
+        text: Union[str, Callable] = "",
+        origin: tuple = (10, 30),
+        color: tuple = (255, 255, 255),
+        scale: float = 0.8,
+        thickness: int = 2,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.text = text
+        self.origin = tuple(origin)
+        self.color = color
+        self.scale = scale
+        self.thickness = thickness
+
+    def apply(self, frame, dst=None):
+        text = self.text() if callable(self.text) else self.text
+        cv2.putText(frame, text, self.origin, cv2.FONT_HERSHEY_SIMPLEX, self.scale, self.color, self.thickness)
+        return frame
+
+
+class Pipeline:
+    """A chain of processing stages, it could be used as the ``processing`` function of a
+    camera. Stages write on reused buffers, so frames are not allocated on each capture.
+
+    With ``worker=True`` frames are processed on a separated thread: the capture loop
+    only hands the new frame over and gets the last processed one (None until the first
+    one is ready), so slow processing never blocks it (frames are skipped instead).
+
+    Example:
+        pipeline = Pipeline(Crop(0, 0, 400, 300), ColorConvert(cv2.COLOR_BGR2GRAY), Annotate("lab"))
+        cameraSettings["webcam"]["processing"] = pipeline
+
+    Args:
+        stages: processing stages, in order.
+        worker: process on a worker thread?
+        smoothing: smoothing factor of the timings.
+    """
+
+    def __init__(self, *stages: Stage, worker: bool = False, smoothing: float = 0.1):
+        self.stages = list(stages)
+        self.smoothing = smoothing
+        self.seconds = 0.0
+        self.metrics = []
+        self.worker = worker
+        self.pending = None
+        self.latest = None
+        self.condition = Condition()
+        self.running = False
+        self.thread = None
+        if worker:
+            self.start()
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        """Executes every stage and measures its time."""
+        if frame is None:
+            return None
+        t0 = start = time.perf_counter()
+        owned = False
+        for i, stage in enumerate(self.stages):
+            frame, owned = stage(frame, owned)
+            now = time.perf_counter()
+            stage.seconds += self.smoothing * ((now - t0) - stage.seconds)
+            if self.metrics:
+                self.metrics[i].observe(now - t0)
+            t0 = now
+        self.seconds += self.smoothing * ((t0 - start) - self.seconds)
+        return frame
+
+    def __call__(self, frame: np.ndarray = None, **kwargs) -> np.ndarray:
+        if not self.worker:
+            return self.process(frame)
+        with self.condition:
+            self.pending = frame
+            self.condition.notify()
+        return self.latest
+
+    def start(self):
+        """Starts the worker thread."""
+        self.running = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Worker loop, it processes the newest frame and skips the others."""
+        while self.running:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                frame, self.pending = self.pending, None
+            if frame is not None:
+                self.latest = self.process(frame)
+
+    def stop(self):
+        """Stops the worker thread."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(1)
+
+    def timings(self) -> dict:
+        """Returns the smoothed time of each stage and the total, in seconds."""
+        timings = {stage.name: stage.seconds for stage in self.stages}
+        timings["total"] = self.seconds
+        return timings
+
+    def instrument(self, histogram, *labels):
+        """Observes the time of each stage on a histogram, labeled by stage name.
+        Args:
+            histogram: a utils.metrics Histogram.
+            labels: label values before the stage name, ex. the camera name.
+        """
+        self.metrics = [histogram.labels(*labels, stage.name) for stage in self.stages]
+
+
+class LazyCamera:
+    """Runs the processing of a camera on demand, instead of on each capture.
+
+    The capture loop only counts the new frames, and the processing function runs the
+    first time a consumer (the GUI, the MJPEG server, the streamer) asks for a frame.
+    The result is cached by frame id, so each frame is processed once no matter how many
+    consumers read it, and never if nobody does. Other attributes are taken from the camera.
+
+    Args:
+        camera: a remio camera device.
+    """
+
+    lazy = True
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.name = camera.name
+        self.processing = camera.processing
+        self.processingParams = camera.getProcessingParams()
+        self.raw = None
+        self.rawId = 0
+        self.frame = None
+        self.frameId = 0
+        self.lock = Lock()
+        camera.setProcessing(self.capture)
+
+    def __getattr__(self, name):
+        return getattr(self.camera, name)
+
+    def capture(self, frame: np.ndarray = None, **kwargs) -> np.ndarray:
+        """Takes a new frame, it's called from the capture loop."""
+        self.raw = frame
+        self.rawId += 1
+        return frame
+
+    def getFrame(self) -> Union[None, np.ndarray]:
+        """Returns the current frame, it's processed if it wasn't before."""
+        with self.lock:
+            if self.frameId != self.rawId:
+                raw, self.frameId = self.raw, self.rawId
+                if raw is not None and self.processing is not None:
+                    raw = self.processing(raw, **self.processingParams)
+                self.frame = raw
+            return self.frame
+
+    def read(self, timeout: Union[int, float] = 0) -> Union[None, np.ndarray]:
+        """Returns the current frame, or the background if the camera isn't available."""
+        if self.camera.isConnected() and self.camera.isThreaded():
+            return self.getFrame()
+        return self.camera.read(timeout=timeout)
+
+    def setProcessing(self, processing: Callable = None, **kwargs):
+        """Updates the processing function and its params."""
+        with self.lock:
+            self.processing = processing
+            self.processingParams = kwargs
+            self.frameId = 0
+
+
+class LazyCameras:
+    """Lazy processing for all the devices of a remio Cameras instance, with the same
+    read methods, ex. ``streamer.setReader(LazyCameras(cameras).read)``.
+    Args:
+        cameras: a remio Cameras instance.
+    """
+
+    def __init__(self, cameras):
+        self.cameras = cameras
+        self.devices = {name: LazyCamera(device) for name, device in cameras.devices.items()}
+
+    def __getitem__(self, name):
+        return self.devices[name]
+
+    def __len__(self):
+        return len(self.devices)
+
+    def getFrameOf(self, deviceName: str = "default") -> Union[None, np.ndarray]:
+        """Returns the current frame of a camera."""
+        if deviceName in self.devices:
+            return self.devices[deviceName].getFrame()
+
+    def read(self, timeout: Union[int, float] = 0, asDict: bool = True):
+        """Returns the current frame of each camera, as a dict or a list (or a single
+        frame if there is only one camera)."""
+        if len(self.devices) < 2:
+            return next(iter(self.devices.values())).read(timeout=timeout)
+        if asDict:
+            return {name: device.read(timeout=timeout) for name, device in self.devices.items()}
+        return [device.read(timeout=timeout) for device in self.devices.values()]
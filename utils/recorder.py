@@ -0,0 +1,240 @@
+"""Recording utils: a ring of encoded frames and a MJPEG/AVI clip writer."""
+import mmap
+import os
+import struct
+import time
+from threading import Lock
+from typing import Union
+import numpy as np
+
+
+def jpegSize(jpeg: Union[bytes, memoryview]) -> tuple:
+    """Returns the (width, height) of a JPEG image, reading its SOF marker."""
+    data = bytes(jpeg[: min(len(jpeg), 65536)])
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xC0, 0xC1, 0xC2):
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return width, height
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        i += 2 + struct.unpack(">H", data[i + 2 : i + 4])[0]
+    return 0, 0
+
+
+class MappedWriter:
+    """An append-only file writer over a memory map. The file size must be known
+    in advance, it's allocated once and the data is copied straight to the map.
+    Args:
+        path: file path.
+        size: final size of the file in bytes.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.file = open(path, "wb+")
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.position = 0
+
+    def write(self, data: Union[bytes, memoryview]):
+        """Appends data after the last write."""
+        end = self.position + len(data)
+        self.map[self.position : end] = data
+        self.position = end
+
+    def close(self):
+        """Flushes the map and closes the file."""
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+def writeAVI(path: str, frames: list, fps: float = 12, size: tuple = None) -> int:
+    """Writes JPEG frames as a MJPEG/AVI clip, frames are not re-encoded.
+    Args:
+        path: file path.
+        frames: list of JPEG images (bytes or memoryviews).
+        fps: frames per second of the clip.
+        size: (width, height) of the frames, it's read from the first frame if it's None.
+    Returns:
+        the number of frames written.
+    """
+    if len(frames) == 0:
+        return 0
+    width, height = jpegSize(frames[0]) if size is None else size
+    chunks = [8 + len(f) + len(f) % 2 for f in frames]
+    moviSize = 4 + sum(chunks)
+    hdrlSize = 4 + (8 + 56) + 8 + (4 + (8 + 56) + (8 + 40))
+    idxSize = 16 * len(frames)
+    riffSize = 4 + (8 + hdrlSize) + (8 + moviSize) + (8 + idxSize)
+    maxFrame = max(len(f) for f in frames)
+
+    writer = MappedWriter(path, 8 + riffSize)
+    writer.write(b"RIFF" + struct.pack("<I", riffSize) + b"AVI ")
+    writer.write(b"LIST" + struct.pack("<I", hdrlSize) + b"hdrl")
+    writer.write(b"avih" + struct.pack(
+        "<15I", 56, int(1e6 / fps), int(maxFrame * fps), 0, 0x10, len(frames), 0, 1,
+        maxFrame, width, height, 0, 0, 0, 0,
+    ))
+    writer.write(b"LIST" + struct.pack("<I", 4 + (8 + 56) + (8 + 40)) + b"strl")
+    writer.write(b"strh" + struct.pack(
+        "<I4s4sIHHIIIIIIiI4h", 56, b"vids", b"MJPG", 0, 0, 0, 0,
+        1000, int(fps * 1000), 0, len(frames), maxFrame, -1, 0, 0, 0, width, height,
+    ))
+    writer.write(b"strf" + struct.pack(
+        "<IIiiHH4sIiiII", 40, 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0,
+    ))
+    writer.write(b"LIST" + struct.pack("<I", moviSize) + b"movi")
+    offsets = []
+    offset = 4
+    for frame in frames:
+        offsets.append(offset)
+        writer.write(b"00dc" + struct.pack("<I", len(frame)))
+        writer.write(frame)
+        if len(frame) % 2:
+            writer.write(b"\x00")
+        offset += 8 + len(frame) + len(frame) % 2
+    writer.write(b"idx1" + struct.pack("<I", idxSize))
+    for frame, offset in zip(frames, offsets):
+        writer.write(b"00dc" + struct.pack("<III", 0x10, offset, len(frame)))
+    writer.close()
+    return len(frames)
+
+
+class FrameRing:
+    """A bounded ring of recent encoded frames, on memory allocated once.
+
+    Frames are copied into a fixed byte arena and indexed by fixed-size arrays, old
+    frames are evicted when they are older than ``seconds`` or when their space is
+    needed. While a clip is being exported the ring is frozen, so exported frames
+    can't be overwritten; frames published in the meantime are not recorded. The index is
+    only changed under ``lock``, so an export can't start while a frame is being appended.
+
+    Args:
+        seconds: max age of the recorded frames.
+        fps: expected frames per second, used to size the index.
+        capacity: size of the arena in bytes.
+    """
+
+    def __init__(self, seconds: Union[int, float] = 60, fps: int = 12, capacity: int = 64 * 1024 * 1024):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.slots = int(seconds * fps * 2) + 1
+        self.offsets = np.zeros(self.slots, dtype=np.int64)
+        self.sizes = np.zeros(self.slots, dtype=np.int64)
+        self.timestamps = np.zeros(self.slots, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+        self.position = 0
+        self.frozen = False
+        self.lock = Lock()
+        self.exportLock = Lock()
+
+    def __len__(self):
+        return self.count
+
+    def oldest(self) -> int:
+        """Returns the slot of the oldest frame."""
+        return (self.head - self.count) % self.slots
+
+    def evictOldest(self):
+        """Forgets the oldest frame."""
+        self.count -= 1
+
+    def append(self, jpeg: bytes, timestamp: float = None):
+        """Records an encoded frame."""
+        with self.lock:
+            self._append(jpeg, timestamp)
+
+    def _append(self, jpeg: bytes, timestamp: float = None):
+        size = len(jpeg)
+        if self.frozen or size > self.capacity:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.position + size > self.capacity:
+            while self.count > 0 and self.offsets[self.oldest()] >= self.position:
+                self.evictOldest()
+            self.position = 0
+        start, end = self.position, self.position + size
+        while self.count > 0:
+            slot = self.oldest()
+            offset = self.offsets[slot]
+            overlaps = offset < end and start < offset + self.sizes[slot]
+            if overlaps or self.count >= self.slots or timestamp - self.timestamps[slot] > self.seconds:
+                self.evictOldest()
+            else:
+                break
+        self.view[start:end] = jpeg
+        self.offsets[self.head] = start
+        self.sizes[self.head] = size
+        self.timestamps[self.head] = timestamp
+        self.head = (self.head + 1) % self.slots
+        self.count += 1
+        self.position = end
+
+    def frames(self, seconds: Union[int, float] = None) -> tuple:
+        """Returns the recorded frames (memoryviews of the arena) of the last seconds,
+        and their timestamps."""
+        seconds = self.seconds if seconds is None else seconds
+        slots = [(self.oldest() + i) % self.slots for i in range(self.count)]
+        if len(slots) == 0:
+            return [], []
+        since = self.timestamps[slots[-1]] - seconds
+        slots = [s for s in slots if self.timestamps[s] >= since]
+        frames = [self.view[self.offsets[s] : self.offsets[s] + self.sizes[s]] for s in slots]
+        return frames, [float(self.timestamps[s]) for s in slots]
+
+    def export(self, path: str, seconds: Union[int, float] = None) -> int:
+        """Writes the last seconds as a MJPEG/AVI clip, without re-encoding.
+        Returns:
+            the number of frames written.
+        """
+        with self.exportLock:
+            with self.lock:
+                self.frozen = True
+                frames, timestamps = self.frames(seconds)
+            try:
+                fps = 12
+                if len(timestamps) > 1 and timestamps[-1] > timestamps[0]:
+                    fps = (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+                folder = os.path.dirname(path)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                return writeAVI(path, frames, fps=fps)
+            finally:
+                with self.lock:
+                    self.frozen = False
+
+
+def pruneClips(folder: str, maxClips: int = 20, maxAge: Union[int, float] = None) -> int:
+    """Deletes the oldest clips of a folder, keeping the last ``maxClips`` ones.
+    Args:
+        folder: folder of the clips.
+        maxClips: max number of kept clips, 0 keeps all of them.
+        maxAge: clips older than it (seconds) are deleted too, None keeps them.
+    Returns:
+        the number of deleted clips.
+    """
+    try:
+        paths = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".avi")]
+        clips = sorted(((os.path.getmtime(path), path) for path in paths), reverse=True)
+    except OSError as e:
+        print(f"-> Clips pruning error :: {e}")
+        return 0
+    now = time.time()
+    deleted = 0
+    for i, (mtime, path) in enumerate(clips):
+        if (maxClips and i >= maxClips) or (maxAge is not None and now - mtime > maxAge):
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError as e:
+                print(f"-> Clips pruning error :: {e}")
+    return deleted
@@ -0,0 +1,478 @@
+"""An asyncio runtime for headless experiments.
+
+A single event loop runs the MJPEG server, the socketio client and its video streamer,
+the serial devices and the variables supervision, so every callback runs on the loop
+thread. Only the blocking work goes to executors: the camera captures (a thread for each
+camera) and the encoding.
+uvloop is used when it's installed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from typing import Callable, Union
+import asyncio
+import signal
+from remio import Cameras
+from remio.mjpeg import MJPEGEncoder
+from remio.serialio import Serials
+from socketio import AsyncClient
+from server.routes import CLIENT_REQUESTS_ENCODING_SERVER, SERVER_SENDS_ENCODING_CLIENT
+from utils.timers import AsyncTimerScheduler
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def newEventLoop() -> asyncio.AbstractEventLoop:
+    """Returns a new event loop, an uvloop one if it's available."""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def decodePayload(data):
+    """Decodes a msgpack (binary) payload, other payloads are returned as they are."""
+    if msgpack is not None and isinstance(data, (bytes, bytearray)):
+        return msgpack.unpackb(data)
+    return data
+
+
+class AsyncSocketIO(AsyncClient):
+    """A socketio client for the runtime loop, with the same interface of the remio
+    CustomSocketIO: ``emit`` could be called from any thread and it doesn't wait.
+
+    With ``encoding="msgpack"`` it asks the server for msgpack payloads on each connection,
+    payloads are packed and unpacked here, so handlers get the same dicts. Messages emitted
+    while it's disconnected are dropped (and counted), the experiment sends its snapshot
+    when it connects again.
+
+    Args:
+        address: server address.
+        reconnectDelay: wait time between the first connection attempts.
+        transports: allowed transports, ex. ["websocket"] for a server with several workers.
+        encoding: "json" or "msgpack" (if it's installed).
+    """
+
+    def __init__(
+        self,
+        address: str = None,
+        reconnectDelay: Union[int, float] = 2,
+        transports: list = None,
+        encoding: str = "json",
+        *args,
+        **kwargs
+    ):
+        try:
+            # signals are handled by the runtime, not by engineio
+            super().__init__(*args, handle_sigint=False, **kwargs)
+        except TypeError:
+            super().__init__(*args, **kwargs)
+        self.address = address
+        self.reconnectDelay = reconnectDelay
+        self.transports = transports
+        self.encoding = encoding if msgpack is not None else "json"
+        self.negotiated = "json"
+        self.connectionHandler = None
+        self.loop = None
+        self.dropped = 0
+        super().on("connect", self.negotiate)
+        super().on(SERVER_SENDS_ENCODING_CLIENT, self.setEncoding)
+
+    def on(self, event: str, handler: Callable = None, **kwargs):
+        if event == "connection":
+            self.connectionHandler = handler
+            super().on("disconnect", handler, **kwargs)
+        elif handler is None:
+            return super().on(event, **kwargs)
+        else:
+            super().on(event, self.decoding(handler), **kwargs)
+
+    @staticmethod
+    def decoding(handler: Callable) -> Callable:
+        """Wraps a handler, so it gets the msgpack payloads decoded."""
+        if msgpack is None:
+            return handler
+        if asyncio.iscoroutinefunction(handler):
+            async def decoded(*args):
+                return await handler(*map(decodePayload, args))
+        else:
+            def decoded(*args):
+                return handler(*map(decodePayload, args))
+        return decoded
+
+    async def negotiate(self):
+        """Asks the server for the encoding on each connection, then calls the connection handler."""
+        self.negotiated = "json"
+        if self.dropped > 0:
+            print(f"socket:: {self.dropped} messages were dropped while disconnected")
+            self.dropped = 0
+        if self.encoding != "json":
+            await super().emit(CLIENT_REQUESTS_ENCODING_SERVER, [self.encoding, "json"])
+        if self.connectionHandler is not None:
+            result = self.connectionHandler()
+            if asyncio.iscoroutine(result):
+                await result
+
+    def setEncoding(self, encoding: str):
+        self.negotiated = encoding
+
+    def isConnected(self) -> bool:
+        return self.connected
+
+    async def send(self, event: str, *args, pack: bool = True, **kwargs):
+        """Emits a message, packed with the negotiated encoding unless it's already binary
+        (pack=False), ex. video frames."""
+        if pack and self.negotiated == "msgpack":
+            args = tuple(arg if arg is None else msgpack.packb(arg) for arg in args)
+        try:
+            await super().emit(event, *args, **kwargs)
+        except Exception as e:
+            print("socket:: ", e)
+
+    def emit(self, *args, **kwargs):
+        """Queues a message on the loop."""
+        if self.loop is None or not self.connected:
+            if self.dropped == 0:
+                print(f"socket:: not connected, {args[0]} and the next messages are dropped")
+            self.dropped += 1
+            return
+        coroutine = self.send(*args, **kwargs)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(coroutine)
+        else:
+            asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def serve(self):
+        """Connects with the server, retrying until it's available. Once connected the
+        client reconnects by itself."""
+        self.loop = asyncio.get_running_loop()
+        if self.address is None:
+            return
+        while not self.connected:
+            try:
+                await self.connect(self.address, transports=self.transports)
+            except Exception as e:
+                print("socket:: ", e)
+                await asyncio.sleep(self.reconnectDelay)
+
+    async def stop(self):
+        try:
+            await self.disconnect()
+        except Exception as e:
+            print("Socket:: ", e)
+
+
+class AsyncStreamer:
+    """Streams the camera frames through the socketio client, like the remio SocketStreamer
+    but as a task of the runtime loop: frames are encoded on an executor (base64 JPEGs, like
+    remio), and they are only read while the client is connected and the streamer isn't
+    paused.
+
+    Args:
+        socket: an AsyncSocketIO client.
+        reader: a read frame function, ex. ``cameras.read``.
+        endpoint: route to stream the video.
+        fps: frames per second.
+        enabled: could it be started?
+        (the other arguments are taken by the remio MJPEGEncoder, ex. quality)
+    """
+
+    def __init__(
+        self,
+        socket: AsyncSocketIO,
+        reader: Callable = None,
+        endpoint: str = "",
+        fps: int = 10,
+        enabled: bool = True,
+        *args,
+        **kwargs
+    ):
+        self.socket = socket
+        self.reader = reader
+        self.endpoint = endpoint
+        self.fps = fps
+        self.enabled = enabled
+        self.encoder = MJPEGEncoder(*args, **kwargs)
+        self.paused = False
+        self.running = False
+
+    def setReader(self, reader: Callable = None):
+        """Updates the reader function."""
+        self.reader = reader
+
+    def setPause(self, value: bool = True):
+        """Updates the pause/resume state."""
+        self.paused = value
+
+    def setEnabled(self, value: bool = True):
+        """Updates enabled value."""
+        self.enabled = value
+
+    async def serve(self):
+        """Streams until stop is called, a frame each 1/fps seconds at most."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(1, thread_name_prefix="stream")
+        self.running = True
+        try:
+            while self.running:
+                start = loop.time()
+                if not self.paused and self.reader is not None and self.socket.isConnected():
+                    frames = self.reader()
+                    if frames is not None:
+                        frames = await loop.run_in_executor(executor, self.encoder.multipleEncode, frames)
+                        await self.socket.send(self.endpoint, frames, pack=False)
+                await asyncio.sleep(max(0, 1 / self.fps - (loop.time() - start)))
+        finally:
+            executor.shutdown(wait=False)
+
+    def stop(self):
+        self.running = False
+
+
+class AsyncMockup:
+    """Runs the cameras, serial devices, socketio client and video streamer of a mockup on
+    a single event loop, it has the same interface of the remio Mockup.
+
+    Serial devices are read when their file descriptor is readable (on POSIX), and the
+    periodic work (reconnections, ports, negotiation, acks) is done by a task. Other
+    coroutines, ex. ``mjpegserver.serve``, could be added with ``addTask``. Timers
+    should use ``self.scheduler``, so their callbacks run on the loop too.
+
+    Args:
+        cameraSettings: settings for camera devices.
+        serialSettings: settings for serial devices.
+        serverSettings: settings to connect with a socketio server.
+        streamSettings: settings for the video streamer.
+        tick: period in seconds of the serial devices housekeeping.
+        maxLineLength: longer serial lines are dropped, so a device that never sends a
+                newline can't grow the buffer.
+    """
+
+    def __init__(
+        self,
+        cameraSettings: dict = {},
+        serialSettings: dict = {},
+        serverSettings: dict = {},
+        streamSettings: dict = {},
+        tick: Union[int, float] = 0.1,
+        maxLineLength: int = 4096,
+        *args,
+        **kwargs
+    ):
+        self.loop = newEventLoop()
+        asyncio.set_event_loop(self.loop)
+        self.scheduler = AsyncTimerScheduler(self.loop)
+        self.camera = Cameras(devices=cameraSettings)
+        self.serial = Serials(devices=serialSettings)
+        self.socket = AsyncSocketIO(**serverSettings)
+        self.streamer = AsyncStreamer(socket=self.socket, reader=self.camera.read, **streamSettings)
+        self.tick = tick
+        self.maxLineLength = maxLineLength
+        self.tasks = []
+        self.factories = []
+        self.stopEvent = asyncio.Event()
+        self.thread = None
+
+    def addTask(self, factory: Callable):
+        """Adds a coroutine function to be run with the mockup, ex. ``mjpegserver.serve``."""
+        self.factories.append(factory)
+
+    def start(
+        self,
+        camera: bool = False,
+        serial: bool = False,
+        socket: bool = False,
+        streamer: bool = False,
+        wait: bool = True,
+        **kwargs
+    ):
+        """It starts differents programs.
+
+        Args:
+            camera: start camera?
+            serial: start serial?
+            socket: start socket?
+            streamer: start stream?
+            wait: block the thread who calls this function? Otherwise the loop runs on a
+                    separated thread.
+        """
+        coroutine = self.run(camera, serial, socket, streamer)
+        if wait:
+            self.loop.run_until_complete(coroutine)
+        else:
+            self.thread = Thread(target=self.loop.run_until_complete, args=(coroutine,), daemon=True)
+            self.thread.start()
+
+    async def run(self, camera: bool = False, serial: bool = False, socket: bool = False, streamer: bool = False):
+        """Runs everything until stop is called."""
+        self.installSignalHandlers()
+        if camera:
+            self.tasks += [self.loop.create_task(self.capture(device)) for device in self.camera.devices.values()]
+        if serial:
+            self.tasks += [self.loop.create_task(self.attend(device)) for device in self.serial.devices.values()]
+        if socket:
+            self.tasks.append(self.loop.create_task(self.connectSocket()))
+        if streamer:
+            self.tasks.append(self.loop.create_task(self.streamer.serve()))
+        self.tasks += [self.loop.create_task(factory()) for factory in self.factories]
+
+        await self.stopEvent.wait()
+        print("  Mockup:: STOPING...")
+        self.streamer.stop()
+        await self.socket.stop()
+        if self.tasks:
+            done, pending = await asyncio.wait(self.tasks, timeout=3)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def installSignalHandlers(self):
+        """Stops the mockup on SIGINT/SIGTERM, ex. CTRL + C."""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # not the main thread, or not supported (Windows)
+
+    async def connectSocket(self):
+        await self.socket.serve()
+        # old engineio versions take SIGINT on connection
+        self.installSignalHandlers()
+
+    def stop(self):
+        """Stops the mockup, it could be called from any thread."""
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.stopEvent.set)
+
+    def isStopping(self) -> bool:
+        return self.stopEvent.is_set()
+
+    # Cameras
+    async def capture(self, camera):
+        """Capture loop of a remio camera, the blocking reads are done on its executor."""
+        executor = ThreadPoolExecutor(1, thread_name_prefix=f"capture-{camera.name}")
+        camera.running.set()  # frames are read by this loop, so it's seen as threaded
+        try:
+            await self.loop.run_in_executor(executor, camera.loadDevice)
+            while not self.isStopping():
+                if not camera.pauseEvent.is_set():
+                    await asyncio.sleep(self.tick)
+                elif camera.isConnected():
+                    await self.loop.run_in_executor(executor, camera.update)
+                    if camera.fps is not None:
+                        await asyncio.sleep(camera.delay)
+                else:
+                    await asyncio.sleep(camera.reconnectDelay)
+                    await self.loop.run_in_executor(executor, camera.loadDevice)
+        finally:
+            camera.running.clear()
+            if camera.device is not None:
+                await self.loop.run_in_executor(executor, camera.device.release)
+            executor.shutdown(wait=False)
+
+    # Serial
+    async def attend(self, device):
+        """Connects a serial device and does its periodic work, incoming data is read by
+        ``readSerial`` when the port is readable."""
+        elapsed = 0
+        try:
+            while not self.isStopping():
+                device.checkConnectionStatus()
+                if not device.isOpen():
+                    self.detach(device)
+                    if device.hasDevice():
+                        await self.loop.run_in_executor(None, device.connect)
+                        if device.isOpen():
+                            self.attach(device)
+                            continue
+                    await asyncio.sleep(device.reconnectDelay)
+                    continue
+                if hasattr(device, "tick"):
+                    device.tick()
+                elapsed += self.tick
+                if device.portsRefreshTime > 0 and elapsed >= device.portsRefreshTime:
+                    elapsed = 0
+                    ports = await self.loop.run_in_executor(None, device.ports)
+                    if ports != device.lastDevicesList:
+                        device.lastDevicesList = ports
+                        device.emit("ports", ports)
+                await asyncio.sleep(self.tick)
+        finally:
+            self.detach(device)
+            device.disconnect()
+
+    def attach(self, device):
+        """Reads a serial device when it's readable, or on an executor where file
+        descriptors can't be watched (ex. Windows)."""
+        device.lineBuffer = b""
+        device.lineOverflow = False
+        try:
+            self.loop.add_reader(device.serial.fileno(), self.readSerial, device)
+            device.reader = "fd"
+        except (NotImplementedError, AttributeError, ValueError):
+            device.reader = self.loop.create_task(self.pollSerial(device))
+
+    def detach(self, device):
+        reader = getattr(device, "reader", None)
+        if reader == "fd":
+            try:
+                self.loop.remove_reader(device.serial.fileno())
+            except Exception:
+                pass
+        elif reader is not None:
+            reader.cancel()
+        device.reader = None
+
+    def readSerial(self, device):
+        """Reads the available bytes of a serial device and handles its lines."""
+        try:
+            data = device.serial.read(device.serial.in_waiting or 1)
+        except Exception as e:
+            print(f"-> Serial - {device.name} :: {e}")
+            self.detach(device)
+            device.serial.close()
+            return
+        lines = (device.lineBuffer + data).split(b"\n")
+        device.lineBuffer = lines.pop()
+        if device.lineOverflow and len(lines) > 0:
+            # the end of a dropped line
+            lines.pop(0)
+            device.lineOverflow = False
+        if len(device.lineBuffer) > self.maxLineLength:
+            print(f"-> Serial - {device.name} :: line longer than {self.maxLineLength} bytes, dropped")
+            device.lineBuffer = b""
+            device.lineOverflow = True
+        for line in lines:
+            self.handleSerialLine(device, line + b"\n")
+
+    async def pollSerial(self, device):
+        while device.isOpen() and not self.isStopping():
+            try:
+                line = await self.loop.run_in_executor(None, device.serial.readline)
+            except Exception as e:
+                print(f"-> Serial - {device.name} :: {e}")
+                device.serial.close()
+                return
+            self.handleSerialLine(device, line)
+
+    def handleSerialLine(self, device, line: bytes):
+        try:
+            if hasattr(device, "handleLine"):
+                device.handleLine(line)
+            elif len(line.strip()) > 0:
+                data = line.decode().rstrip()
+                device.emit("data", {device.name: data} if device.emitAsDict else data)
+        except Exception as e:
+            print(f"-> Serial - {device.name} :: {e}")
@@ -0,0 +1,439 @@
+"""A compact framed binary protocol for the serial device, with a fallback to JSON lines.
+
+Frame format (see arduino/mockup/mockup.ino):
+
+    0xFE | COBS(kind, body..., crc16) XOR 0x0A | "\\n"
+
+The payload is COBS encoded, so it has no zeros, and then XORed with 0x0A, so it has no
+newlines; then frames still end with "\\n" and they could be read as lines. 0xFE is
+never valid on UTF-8 text, so frames and the old JSON/$event lines can't be confused.
+
+Kinds:
+    0x01 variables: a list of fields, each one is a byte (type << 6 | index) and the
+        value, where index is the position of the variable on the schema and the type
+        is 0 for bool (1 byte), 1 for int32 or 2 for float32 (little endian).
+    0x02 event: an ASCII event, ex. "received" or "status,ok".
+
+The link starts with JSON lines; "$binary" is sent to the device, and if it answers
+"$binary,ok" both sides switch to binary frames. Old sketches ignore the request.
+
+Variables written through the outbox carry a sequence number, the "seq" key on JSON
+and the field index 63 (int32) on frames, and the device answers "received,<seq>".
+Writes posted with a tag (ex. a trace id) emit an "ack" event with the time until it.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Union
+import json
+import struct
+import time
+from remio.serialio import Serial, Serials
+
+
+FRAME_MARKER = 0xFE
+FRAME_VARIABLES = 0x01
+FRAME_EVENT = 0x02
+TYPE_BOOL, TYPE_INT, TYPE_FLOAT = 0, 1, 2
+SEQ_INDEX = 0x3F
+SEQ_KEY = "seq"
+NEWLINE = 0x0A
+UNMASK = bytes(b ^ NEWLINE for b in range(256))
+
+
+def crc16(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/CCITT-FALSE of some bytes."""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        crc &= 0xFFFF
+    return crc
+
+
+def cobsEncode(data: bytes) -> bytes:
+    """Consistent Overhead Byte Stuffing, the result has no zeros."""
+    out = bytearray()
+    for block in data.split(b"\x00"):
+        while len(block) >= 254:
+            out.append(255)
+            out += block[:254]
+            block = block[254:]
+        out.append(len(block) + 1)
+        out += block
+    return bytes(out)
+
+
+def cobsDecode(data: bytes) -> bytes:
+    """Decodes COBS data, it raises ValueError if it's malformed."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        code = data[i]
+        end = i + code
+        if code == 0 or end > len(data):
+            raise ValueError("malformed COBS data")
+        out += data[i + 1 : end]
+        i = end
+        if code < 255 and i < len(data):
+            out.append(0)
+    return bytes(out)
+
+
+class FrameCodec:
+    """Encodes and decodes the messages of the serial device.
+    Args:
+        schema: the variable names, in the same order of the sketch indexes.
+    """
+
+    def __init__(self, schema: list = []):
+        self.schema = list(schema)
+        self.indexes = {name: i for i, name in enumerate(self.schema)}
+
+    def frame(self, payload: bytes) -> bytes:
+        """Wraps a payload as a frame."""
+        payload += struct.pack(">H", crc16(payload))
+        return bytes([FRAME_MARKER]) + cobsEncode(payload).translate(UNMASK) + b"\n"
+
+    def encodeVariables(self, variables: dict) -> bytes:
+        """Returns a variables frame, variables out of the schema are skipped."""
+        payload = bytearray([FRAME_VARIABLES])
+        for name, value in variables.items():
+            index = SEQ_INDEX if name == SEQ_KEY else self.indexes.get(name)
+            if index is None:
+                continue
+            if isinstance(value, bool):
+                payload += struct.pack("<B?", TYPE_BOOL << 6 | index, value)
+            elif isinstance(value, int):
+                payload += struct.pack("<Bi", TYPE_INT << 6 | index, value)
+            else:
+                payload += struct.pack("<Bf", TYPE_FLOAT << 6 | index, float(value))
+        return self.frame(bytes(payload))
+
+    def encodeEvent(self, event: str) -> bytes:
+        """Returns an event frame."""
+        return self.frame(bytes([FRAME_EVENT]) + event.encode("ascii"))
+
+    def decodeVariables(self, body: bytes) -> dict:
+        variables = {}
+        i = 0
+        while i < len(body):
+            kind, index = body[i] >> 6, body[i] & 0x3F
+            if kind == TYPE_BOOL:
+                value, size = bool(body[i + 1]), 1
+            elif kind == TYPE_INT:
+                value, size = struct.unpack_from("<i", body, i + 1)[0], 4
+            else:
+                value, size = struct.unpack_from("<f", body, i + 1)[0], 4
+            if index == SEQ_INDEX:
+                name = SEQ_KEY
+            else:
+                name = self.schema[index] if index < len(self.schema) else str(index)
+            variables[name] = value
+            i += 1 + size
+        return variables
+
+    def decode(self, line: bytes) -> tuple:
+        """Decodes a received line, a binary frame or a JSON/$event/text line.
+        Returns:
+            a (kind, value, binary) tuple, where kind is "variables" (a dict), "event"
+            (a str without the $) or "text"; and binary tells if it was a frame.
+        Raises:
+            ValueError: if a frame is corrupted.
+        """
+        if line[:1] == bytes([FRAME_MARKER]):
+            # only the last newline is removed, the masked bytes could be any other
+            frame = line[1:-1] if line.endswith(b"\n") else line[1:]
+            payload = cobsDecode(frame.translate(UNMASK))
+            if len(payload) < 3 or struct.unpack(">H", payload[-2:])[0] != crc16(payload[:-2]):
+                raise ValueError("frame with a wrong CRC")
+            kind, body = payload[0], payload[1:-2]
+            if kind == FRAME_VARIABLES:
+                try:
+                    return "variables", self.decodeVariables(body), True
+                except (IndexError, struct.error):
+                    raise ValueError("truncated variables frame")
+            if kind == FRAME_EVENT:
+                return "event", body.decode("ascii"), True
+            raise ValueError(f"unknown frame kind {kind}")
+        text = line.decode().strip()
+        if text.startswith("$"):
+            return "event", text[1:], False
+        if text.startswith("{"):
+            try:
+                return "variables", json.loads(text), False
+            except ValueError:
+                pass
+        return "text", text, False
+
+
+def parseAck(event: str) -> Union[None, int]:
+    """Returns the seq of a "received,<seq>" event, -1 for a plain "received" (old
+    sketches) or None if it isn't an ack."""
+    name, _, seq = event.partition(",")
+    if name.strip() != "received":
+        return None
+    try:
+        return int(seq)
+    except ValueError:
+        return -1
+
+
+class Outbox:
+    """Latest-wins queue of the variables written to a device.
+
+    Posted variables replace the pending ones, so a burst of changes (ex. a slider)
+    becomes a single write with the latest state. Writes are numbered and up to
+    ``window`` of them could wait for their ack at the same time; while the window is
+    full new changes are merged on the pending state. Acks are cumulative, and a write
+    without ack after ``ackTimeout`` frees its place and the latest state is written again.
+
+    Args:
+        write: a function that writes a variables dict with its seq.
+        window: max writes waiting for an ack.
+        ackTimeout: seconds to wait for an ack.
+        onAck: a function like ``onAck(tag, seconds)``, called when a tagged write is
+                acknowledged.
+    """
+
+    def __init__(self, write: Callable, window: int = 4, ackTimeout: Union[int, float] = 1, onAck: Callable = None):
+        self.write = write
+        self.window = window
+        self.ackTimeout = ackTimeout
+        self.onAck = onAck
+        self.seq = 0
+        self.pending = None
+        self.pendingTag = None
+        self.latest = None
+        self.inFlight = OrderedDict()
+        self.tags = {}
+        self.lock = Lock()
+
+    def post(self, variables: dict, tag=None):
+        """Queues the latest state of the variables and writes it if the window allows it.
+        The tag of the latest post is kept for its write, ex. a trace id."""
+        with self.lock:
+            self.pending = dict(variables)
+            self.pendingTag = tag
+        self.flush()
+
+    def flush(self):
+        """Writes the pending state if there is room on the window."""
+        with self.lock:
+            if self.pending is None or len(self.inFlight) >= self.window:
+                return
+            self.seq += 1
+            variables, self.pending = self.pending, None
+            self.latest = variables
+            self.inFlight[self.seq] = time.monotonic()
+            if self.pendingTag is not None:
+                self.tags[self.seq] = self.pendingTag
+                self.pendingTag = None
+            seq = self.seq
+        self.write(variables, seq)
+
+    def ack(self, seq: int):
+        """Acknowledges a write and the previous ones, -1 acknowledges the oldest one."""
+        acked = []
+        now = time.monotonic()
+        with self.lock:
+            if seq < 0 and self.inFlight:
+                seq = next(iter(self.inFlight))
+            for key in [key for key in self.inFlight if key <= seq]:
+                sent = self.inFlight.pop(key)
+                if key in self.tags:
+                    acked.append((self.tags.pop(key), now - sent))
+        if self.onAck is not None:
+            for tag, seconds in acked:
+                self.onAck(tag, seconds)
+        self.flush()
+
+    def expire(self):
+        """Drops the writes without ack after the timeout, the latest state is written
+        again if its write was lost. It's called from the read loop of the device."""
+        now = time.monotonic()
+        with self.lock:
+            expired = [seq for seq, sent in self.inFlight.items() if now - sent > self.ackTimeout]
+            for seq in expired:
+                del self.inFlight[seq]
+                self.tags.pop(seq, None)
+            if self.seq in expired and self.pending is None:
+                self.pending = self.latest
+        self.flush()
+
+    def reset(self):
+        """Forgets the writes in flight, ex. when the device is reconnected. The latest
+        state is written again."""
+        with self.lock:
+            self.inFlight.clear()
+            self.tags.clear()
+            if self.pending is None:
+                self.pending = self.latest
+
+    def waiting(self) -> int:
+        """Returns the number of writes waiting for an ack."""
+        return len(self.inFlight)
+
+
+class FramedSerial(Serial):
+    """A remio Serial device that speaks the framed binary protocol when the device
+    supports it, and JSON lines otherwise.
+
+    Instead of a generic "data" event, received messages are emitted by kind:
+    "variables" (a dict), "event" (ex. "received") and "data" (any other text).
+
+    ``postVariables`` writes through an Outbox: rapid changes are coalesced and several
+    writes could wait for their ack, instead of one write per change. Tagged writes emit
+    an "ack" event like {"tag": tag, "seconds": 0.02} when they are acknowledged.
+
+    Args:
+        schema: the variable names, in the same order of the sketch indexes.
+        binary: try to negotiate the binary protocol?
+        negotiationInterval: seconds between negotiation attempts.
+        negotiationAttempts: attempts before staying on JSON lines.
+        ackWindow: max variables writes waiting for an ack.
+        ackTimeout: seconds to wait for an ack before writing the latest state again.
+    """
+
+    def __init__(
+        self,
+        schema: list = [],
+        binary: bool = True,
+        negotiationInterval: Union[int, float] = 2,
+        negotiationAttempts: int = 5,
+        ackWindow: int = 4,
+        ackTimeout: Union[int, float] = 1,
+        *args,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.codec = FrameCodec(schema)
+        self.binaryEnabled = binary
+        self.negotiationInterval = negotiationInterval
+        self.negotiationAttempts = negotiationAttempts
+        self.outbox = Outbox(self.writeSequenced, window=ackWindow, ackTimeout=ackTimeout, onAck=self.emitAck)
+        self.resetNegotiation()
+
+    def resetNegotiation(self):
+        """Goes back to JSON lines, ex. when the device is (re)connected."""
+        self.binary = False
+        self.attemptsLeft = self.negotiationAttempts if self.binaryEnabled else 0
+        self.lastNegotiation = 0
+
+    def isBinary(self) -> bool:
+        """Checks if the binary protocol is being used."""
+        return self.binary
+
+    def connect(self):
+        super().connect()
+        self.resetNegotiation()
+        self.outbox.reset()
+
+    def negotiate(self):
+        """Asks the device for the binary protocol, from time to time until it answers."""
+        if self.binary or self.attemptsLeft <= 0 or not self.serial.isOpen():
+            return
+        now = time.monotonic()
+        if now - self.lastNegotiation >= self.negotiationInterval:
+            self.lastNegotiation = now
+            self.attemptsLeft -= 1
+            self.writeRaw(b"$binary\n")
+
+    def writeRaw(self, data: bytes):
+        """Writes bytes to the device."""
+        if self.serial.isOpen():
+            try:
+                self.serial.write(data)
+            except Exception as e:
+                print(f"-> Serial - {self.name} :: {e}")
+
+    def writeVariables(self, variables: dict):
+        """Writes the variables, as a frame or as a JSON line."""
+        if self.binary:
+            self.writeRaw(self.codec.encodeVariables(variables))
+        else:
+            self.write(variables, asJson=True)
+
+    def writeSequenced(self, variables: dict, seq: int):
+        """Writes the variables with their sequence number."""
+        self.writeVariables({**variables, SEQ_KEY: seq})
+
+    def postVariables(self, variables: dict, tag=None):
+        """Queues the latest state of the variables, see Outbox.
+        Args:
+            variables: all the variables.
+            tag: an id for the "ack" event of the write, ex. a trace id.
+        """
+        self.outbox.post(variables, tag)
+
+    def emitAck(self, tag, seconds: float):
+        self.emitMessage("ack", {"tag": tag, "seconds": seconds})
+
+    def writeEvent(self, event: str):
+        """Writes an event (without the $), as a frame or as a $event line."""
+        if self.binary:
+            self.writeRaw(self.codec.encodeEvent(event))
+        else:
+            self.write(f"${event}")
+
+    def emitMessage(self, kind: str, value):
+        eventName = "data" if kind == "text" else kind
+        self.emit(eventName, {self.name: value} if self.emitAsDict else value)
+
+    def tick(self):
+        """Negotiates the protocol and expires the writes without ack, it's called
+        periodically by the read loop."""
+        self.negotiate()
+        self.outbox.expire()
+
+    def handleLine(self, line: bytes):
+        """Decodes a received line and emits its message.
+        Raises:
+            ValueError: if a frame is corrupted.
+        """
+        if len(line.strip()) == 0:
+            return None
+        kind, value, binary = self.codec.decode(line)
+        if kind == "event" and value == "binary,ok":
+            self.binary = True
+            self.outbox.flush()
+            return None
+        if kind == "event":
+            seq = parseAck(value)
+            if seq is not None:
+                self.outbox.ack(seq)
+        if self.binary and not binary and kind == "variables":
+            # a JSON state line: the device was restarted and it speaks JSON lines again,
+            # other text lines (ex. debug prints) don't change the protocol
+            self.resetNegotiation()
+        self.emitMessage(kind, value)
+        return value
+
+    def readData(self):
+        """Reads and decodes a message."""
+        try:
+            self.tick()
+            return self.handleLine(self.serial.readline())
+        except ValueError as e:
+            print(f"-> Serial - {self.name} :: {e}")
+        except Exception as e:
+            print(f"-> Serial - {self.name} :: {e}")
+            if not self.attemptsLimitReached():
+                self.attempts += 1
+            else:
+                self.attempts = 0
+                try:
+                    self.serial.close()
+                except Exception as e:
+                    print(f"-> Serial - {self.name} :: {e}")
+        return None
+
+
+class FramedSerials(Serials):
+    """Serials with FramedSerial devices."""
+
+    def __init__(self, devices: dict = {}, *args, **kwargs):
+        self.devices = {
+            name: FramedSerial(name=name, **settings)
+            for name, settings in devices.items()
+            if isinstance(settings, dict)
+        }
@@ -1,89 +1,336 @@
-"""Some useful timers."""
+"""Some useful timers.
+
+Timers don't own threads: they are scheduled on a shared TimerScheduler, a single
+thread with a heap of deadlines, or on an AsyncTimerScheduler, which uses the asyncio
+event loop. Callbacks run on the scheduler thread (or the loop), so they should be short.
+"""
 from typing import Union, Callable
-from threading import Thread, Event
+from threading import Thread, Condition, Lock
+import asyncio
+import functools
+import heapq
+import itertools
 import time
 
 
+class ScheduledCall:
+    """A callback scheduled at a deadline (time.monotonic seconds)."""
+
+    __slots__ = ("deadline", "callback", "cancelled", "scheduler")
+
+    def __init__(self, deadline: float, callback: Callable, scheduler=None):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+        self.scheduler = scheduler
+
+    def cancel(self):
+        """Cancels the call, it's never executed."""
+        if not self.cancelled:
+            self.cancelled = True
+            if self.scheduler is not None:
+                self.scheduler.discard(self)
+
+
+class TimerScheduler:
+    """Executes the scheduled calls of many timers on a single thread.
+
+    Deadlines are kept on a heap, and the thread sleeps until the nearest one, so it
+    doesn't wake up for paused timers. The thread is started with the first call.
+    Cancelled calls are removed lazily, and the heap is compacted when most are cancelled.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.cancelled = 0
+        self.condition = Condition()
+        self.running = False
+        self.thread = None
+
+    def schedule(self, delay: Union[int, float], callback: Callable) -> ScheduledCall:
+        """Schedules a callback, it could be called from any thread.
+        Args:
+            delay: seconds to wait.
+            callback: a function without arguments.
+        """
+        call = ScheduledCall(time.monotonic() + max(delay, 0), callback, self)
+        with self.condition:
+            heapq.heappush(self.heap, (call.deadline, next(self.counter), call))
+            if not self.running:
+                self.start()
+            if self.heap[0][2] is call:
+                self.condition.notify()
+        return call
+
+    def discard(self, call: ScheduledCall):
+        """Counts a cancelled call still on the heap, and compacts the heap if it's mostly
+        cancelled. Popped calls are detached from the scheduler, so they aren't counted."""
+        with self.condition:
+            self.cancelled += 1
+            if self.cancelled > 64 and self.cancelled > len(self.heap) // 2:
+                self.heap = [entry for entry in self.heap if not entry[2].cancelled]
+                heapq.heapify(self.heap)
+                self.cancelled = 0
+
+    def pending(self) -> int:
+        """Returns the number of calls waiting for their deadline."""
+        with self.condition:
+            return sum(1 for entry in self.heap if not entry[2].cancelled)
+
+    def start(self):
+        """Starts the scheduler thread."""
+        self.running = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def next(self) -> Union[None, ScheduledCall]:
+        """Waits for the nearest deadline and returns its call, or None when stopped."""
+        with self.condition:
+            while self.running:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                deadline, _, call = self.heap[0]
+                if call.cancelled:
+                    heapq.heappop(self.heap)
+                    self.cancelled = max(self.cancelled - 1, 0)
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    heapq.heappop(self.heap)
+                    call.scheduler = None
+                    return call
+                self.condition.wait(remaining)
+        return None
+
+    def run(self):
+        """Executes the calls when their deadlines pass."""
+        while True:
+            call = self.next()
+            if call is None:
+                break
+            try:
+                call.callback()
+            except Exception as e:
+                print(f"-> TimerScheduler :: {e}")
+
+    def stop(self):
+        """Stops the scheduler thread, pending calls are dropped."""
+        with self.condition:
+            self.running = False
+            for entry in self.heap:
+                entry[2].scheduler = None
+            self.heap.clear()
+            self.cancelled = 0
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(1)
+            self.thread = None
+
+
+class AsyncTimerScheduler:
+    """Executes the scheduled calls on an asyncio event loop, it has the same interface
+    of TimerScheduler and it could be used from any thread.
+    Args:
+        loop: the event loop, the running one by default (then it's created on a coroutine).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.calls = 0
+
+    def schedule(self, delay: Union[int, float], callback: Callable) -> ScheduledCall:
+        """Schedules a callback, it could be called from any thread.
+        Args:
+            delay: seconds to wait.
+            callback: a function without arguments.
+        """
+        call = ScheduledCall(time.monotonic() + max(delay, 0), callback)
+        self.loop.call_soon_threadsafe(self.arm, call)
+        return call
+
+    def arm(self, call: ScheduledCall):
+        if not call.cancelled:
+            self.calls += 1
+            self.loop.call_later(max(call.deadline - time.monotonic(), 0), self.execute, call)
+
+    def execute(self, call: ScheduledCall):
+        self.calls -= 1
+        if call.cancelled:
+            return
+        try:
+            call.callback()
+        except Exception as e:
+            print(f"-> AsyncTimerScheduler :: {e}")
+
+    def pending(self) -> int:
+        """Returns the number of calls waiting on the loop, cancelled ones included."""
+        return self.calls
+
+    def stop(self):
+        """Nothing to stop, the calls die with the loop."""
+
+
+sharedScheduler = None
+sharedSchedulerLock = Lock()
+
+
+def getScheduler() -> TimerScheduler:
+    """Returns the scheduler shared by the timers of the process."""
+    global sharedScheduler
+    with sharedSchedulerLock:
+        if sharedScheduler is None:
+            sharedScheduler = TimerScheduler()
+        return sharedScheduler
+
+
 class PausableTimer:
-    """A timer that executes a recurring task each certain time, using thread events for it.
+    """A timer that executes a recurring task each certain time. It's created paused.
     Args:
         interval: wait time in seconds.
         callback: a function that will be called.
+        scheduler: a TimerScheduler or AsyncTimerScheduler, the shared one by default.
     """
-    def __init__(self, interval: Union[int, float], callback: Callable = None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(
+        self,
+        interval: Union[int, float],
+        callback: Callable = None,
+        *args,
+        scheduler: Union[TimerScheduler, AsyncTimerScheduler] = None,
+        **kwargs
+    ):
         self.interval = interval
-        self.timeout = interval
         self.callback = callback
         self.args = args
         self.kwargs = kwargs
-        self.running = Event()
-        self.pauseEvent = Event()
-        self.thread = Thread(target=self.run, daemon=True)
-        self.start()
-        self.pause()
+        self.scheduler = scheduler or getScheduler()
+        self.lock = Lock()
+        self.call = None
+        self.deadline = None
+        self.remaining = None
+        self.generation = 0
+        self.active = False
         self.quit = False
 
-    def start(self):
-        """Starts timer execution."""
-        self.thread.start()
+    def isActive(self) -> bool:
+        """Checks if the timer is running (not paused or stopped)."""
+        return self.active
 
-    def run(self):
-        """Excutes the recurrent task."""
-        while True:
-            self.pauseEvent.wait()
-            self.running.wait(self.timeout)
-            self.callback(*self.args, **self.kwargs)
-            if self.quit:
-                break
+    def schedule(self, delay: Union[int, float]):
+        """Schedules the next execution, the lock must be held."""
+        if self.call is not None:
+            self.call.cancel()
+        self.generation += 1
+        self.deadline = time.monotonic() + delay
+        self.call = self.scheduler.schedule(delay, functools.partial(self.fire, self.generation))
+
+    def fire(self, generation: int):
+        """Executes the task and schedules the next one while the timer is active."""
+        with self.lock:
+            if not self.active or generation != self.generation:
+                return
+            self.call = None
+        if self.callback is not None:
+            try:
+                self.callback(*self.args, **self.kwargs)
+            except Exception as e:
+                print(f"-> PausableTimer :: {e}")
+        with self.lock:
+            if self.active and generation == self.generation:
+                # next deadline on the same grid, skipping the missed ones
+                delay = self.deadline + self.interval - time.monotonic()
+                if delay < 0:
+                    delay %= self.interval or 1
+                self.schedule(delay)
 
     def resume(self, now: bool = True):
-        """Resumes the task execution."""
-        self.pauseEvent.set()
-        if now:
-            self.running.set()
+        """Resumes the task execution.
+        Args:
+            now: execute the task right now, otherwise it waits the remaining time.
+        """
+        with self.lock:
+            if self.quit:
+                return
+            if now:
+                self.active = True
+                self.schedule(0)
+            elif not self.active:
+                self.active = True
+                self.schedule(self.interval if self.remaining is None else self.remaining)
+            self.remaining = None
 
     def pause(self, reset: bool = False):
         """Pauses the task execution.
         Args:
-            reset: restart the loop execution?
+            reset: restart the loop execution? Otherwise the remaining time is kept.
         """
-        self.pauseEvent.clear()
-        if reset:
-            self.running.clear()
+        with self.lock:
+            if self.active and not reset and self.deadline is not None:
+                self.remaining = max(self.deadline - time.monotonic(), 0)
+            elif reset:
+                self.remaining = None
+            self.active = False
+            self.generation += 1
+            if self.call is not None:
+                self.call.cancel()
+                self.call = None
+
+    def reset(self):
+        """Restarts the wait time, the task is executed after a full interval."""
+        with self.lock:
+            self.remaining = None
+            if self.active:
+                self.schedule(self.interval)
 
     def stop(self):
-        """Stops the timer execution."""
-        self.resume(now=True)
+        """Stops the timer execution, it can't be resumed again."""
+        self.pause(reset=True)
         self.quit = True
 
 
 class CountTimer:
-    """A timer tha executes a task periodically.
+    """A timer tha executes a task periodically, driven by a scheduler.
     Args:
         cb: a callback function.
         interval: time in seconds.
+        scheduler: a TimerScheduler or AsyncTimerScheduler, the shared one by default.
     """
-    def __init__(self, cb, interval: int = 1):
+    def __init__(self, cb, interval: int = 1, scheduler: Union[TimerScheduler, AsyncTimerScheduler] = None):
         self.lastTime = 0
         self.enabled = False
         self.cb = cb
         self.interval = interval
-    
+        self.timer = PausableTimer(interval, self.execute, scheduler=scheduler)
+
     def start(self):
         """Starts the timer."""
         self.lastTime = time.time()
         self.enabled = True
-    
+        self.timer.interval = self.interval
+        self.timer.pause(reset=True)
+        self.timer.resume(now=False)
+
     def stop(self):
         """Stops the timer."""
         self.lastTime = 0
         self.time = 0
         self.enabled = False
+        self.timer.pause(reset=True)
 
-    def update(self):
-        """Checks if the callback must be executed."""
-        if self.enabled:
-            if time.time() - self.lastTime <= self.interval:
-                self.cb()
-                self.lastTime = time.time()
\ No newline at end of file
+    def execute(self):
+        self.lastTime = time.time()
+        self.cb()
+
+    def update(self) -> bool:
+        """For loops that poll the timer: executes the callback if its interval has passed
+        and the scheduler hasn't executed it yet, then the next execution is a full
+        interval later.
+        Returns:
+            True if the callback was executed.
+        """
+        if not self.enabled or time.time() - self.lastTime < self.interval:
+            return False
+        self.timer.reset()
+        self.execute()
+        return True
@@ -0,0 +1,74 @@
+"""Opt-in tracing of the commands of the web clients, from the browser to the serial device.
+
+A traced message carries a dict on ``TRACE_KEY`` with an id and the time (ms) when it
+passed each hop, each one on the clock of its own machine:
+
+    webSent -> relayIn -> relayOut -> rigIn -> rigOut -> relayAck -> webAck
+
+Hops are measured between stamps of the same clock, so the clocks of the browser, the
+relay and the rig don't need to be in sync. The rig measures the serial hop by itself,
+from the write of the variables to their ``$received,<seq>`` ack.
+
+Messages without a trace are relayed as usual, tracing costs a key lookup per message.
+"""
+from typing import Union
+import time
+from server.routes import TRACE_KEY
+from utils.metrics import Registry
+
+
+# seconds, from a local hop to a slow link
+TRACE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# hop: (start stamp, end stamp)
+HOPS = {
+    "relay": ("relayIn", "relayOut"),
+    "rig": ("rigIn", "rigOut"),
+    "relayRoundTrip": ("relayOut", "relayAck"),
+}
+
+
+def popTrace(data) -> Union[dict, None]:
+    """Removes the trace of a payload and returns it, or None if it wasn't traced."""
+    return data.pop(TRACE_KEY, None) if isinstance(data, dict) else None
+
+
+def stamp(trace: dict, name: str) -> dict:
+    """Adds the current time (ms) to a trace."""
+    trace[name] = time.time() * 1000
+    return trace
+
+
+def hopDurations(trace: dict) -> dict:
+    """Returns the duration (seconds) of each hop with both stamps on a trace. The network
+    time between the relay and the rig is the relay round-trip minus the rig hop."""
+    durations = {}
+    for hop, (start, end) in HOPS.items():
+        if start in trace and end in trace:
+            durations[hop] = max(0, trace[end] - trace[start]) / 1000
+    if "relayRoundTrip" in durations and "rig" in durations:
+        durations["rigNetwork"] = max(0, durations["relayRoundTrip"] - durations["rig"])
+    return durations
+
+
+class Tracer:
+    """Observes the hops of the traces on a latency histogram by hop.
+    Args:
+        registry: a metrics registry, ex. the one of the MJPEG server.
+        name: name of the histogram.
+    """
+
+    def __init__(self, registry: Registry = None, name: str = "trace_hop_seconds"):
+        self.registry = Registry() if registry is None else registry
+        self.histogram = self.registry.histogram(
+            name, "Latency of each hop of the traced web commands.", ["hop"], TRACE_BUCKETS
+        )
+
+    def observe(self, trace: dict):
+        """Records the hops of a trace."""
+        for hop, seconds in hopDurations(trace).items():
+            self.histogram.labels(hop).observe(seconds)
+
+    def observeHop(self, hop: str, seconds: Union[int, float]):
+        """Records a hop measured locally, ex. the serial write until its ack."""
+        self.histogram.labels(hop).observe(seconds)
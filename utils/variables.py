@@ -5,12 +5,21 @@ from .timers import PausableTimer
 
 class Variables:
     """A variables dictionary with some extra functionalities, like state backup and supervise intervaled callback.
+
+    Changes are shared as versioned patches: ``patch()`` returns only the keys changed
+    since the last patch, and the relay server numbers every accepted patch of a room
+    with a sequence number (``seq``). ``applyPatch`` applies patches in order, ignores
+    old ones and flags a gap (``outOfSync``), then a snapshot should be requested.
+    Keys of our own patches are pending until their echo arrives, so the echo of an
+    older patch doesn't revert a value changed after it.
     
     Args:
         variables: a dictionary with variables.
         enabled: flag to enable or disable variables control.
         interval: max wait time in seconds for a response.
         supervise: a callback to be executed after wait time passes.
+        scheduler: scheduler of the supervise timer, the shared TimerScheduler by default.
+        history: a utils.history History, every change is recorded on it.
 
     Example:
         variables = Variable({
@@ -26,12 +35,20 @@ class Variables:
         enabled: bool = True,
         interval: Union[float, int] = 2,
         supervise: Callable = None,
+        scheduler=None,
+        history=None,
     ):
         self.variables = variables
         self.backup = variables.copy()
         self.enabled = enabled
         self.streamingStatus = False
-        self.timer = PausableTimer(interval, supervise)
+        self.seq = 0
+        self.changed = set()
+        self.pending = {}
+        self.outOfSync = False
+        self.history = history
+        self.timer = PausableTimer(interval, supervise, scheduler=scheduler)
+        self.record()
 
     def __len__(self):
         return len(self.variables)
@@ -44,6 +61,8 @@ class Variables:
     
     def __setitem__(self, key: str, value):
         self.variables[key] = value
+        self.changed.add(key)
+        self.record()
     
     def isEnabled(self):
         """Checks if variables workflow is enabled."""
@@ -53,15 +72,24 @@ class Variables:
         """Updates the enable status"""
         self.enabled = value
 
+    def record(self):
+        """Records the current values on the history, if there is one."""
+        if self.history is not None:
+            self.history.record(self.variables)
+
     def restore(self):
         """Restores the variables backup."""
         self.variables = self.backup.copy()
+        self.changed.clear()
+        self.record()
 
     def set(self, key: str, value, backup: bool = True, streamingStatus: bool = False):
         """Updates a variable value"""
         if backup:
             self.backup = self.variables.copy()
         self.variables[key] = value
+        self.changed.add(key)
+        self.record()
         self.setStreamingStatus(streamingStatus)
     
     def get(self, key: str):
@@ -80,8 +108,72 @@ class Variables:
         """Updates the variables values."""
         if isinstance(data, str):
             data = json.loads(data)
+        self.changed.update(key for key, value in data.items() if self.variables.get(key) != value)
         self.variables = data
         self.backup = dict(self.variables)
+        self.record()
+
+    def patch(self) -> dict:
+        """Returns the changes since the last patch, and forgets them.
+        Returns:
+            a dict like {"base": seq, "changes": {key: value}}, where base is the last
+            sequence number known, so the server can reject changes made over old values.
+        """
+        changes = {key: self.variables[key] for key in self.changed if key in self.variables}
+        self.changed.clear()
+        for key in changes:
+            self.pending[key] = self.pending.get(key, 0) + 1
+        return {"base": self.seq, "changes": changes}
+
+    def applyPatch(self, data: Union[str, dict] = {}) -> Union[dict, None]:
+        """Applies a patch of the server, like {"seq": 8, "changes": {"speed": 2}}.
+        Returns:
+            the values that really changed (it's empty for the echo of our own patch), or
+            None if it wasn't applied: old patches are ignored, and if some patch was
+            missed nothing is applied and outOfSync is set. Keys of our own patches still
+            waiting for their echo keep the local value.
+        """
+        if isinstance(data, str):
+            data = json.loads(data)
+        seq = data.get("seq", 0)
+        if seq <= self.seq:
+            return None
+        if seq > self.seq + 1:
+            self.outOfSync = True
+            return None
+        changed = {}
+        for key, value in data.get("changes", {}).items():
+            if self.pending.get(key, 0) > 0:
+                # the echo of our own patch, the local value is the same or newer
+                self.pending[key] -= 1
+                if self.pending[key] == 0:
+                    del self.pending[key]
+                continue
+            if self.variables.get(key) != value:
+                changed[key] = value
+            self.variables[key] = value
+            self.changed.discard(key)
+        self.backup = dict(self.variables)
+        self.seq = seq
+        if changed:
+            self.record()
+        return changed
+
+    def snapshot(self) -> dict:
+        """Returns all the variables and their sequence number."""
+        return {"seq": self.seq, "variables": dict(self.variables)}
+
+    def applySnapshot(self, data: Union[str, dict] = {}):
+        """Replaces all the variables by a snapshot of the server."""
+        if isinstance(data, str):
+            data = json.loads(data)
+        self.variables = dict(data.get("variables", {}))
+        self.backup = dict(self.variables)
+        self.seq = data.get("seq", 0)
+        self.changed.clear()
+        self.pending.clear()
+        self.outOfSync = False
+        self.record()
 
     def streamed(self):
         """Returns the current streaming status."""
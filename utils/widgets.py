@@ -1,16 +1,51 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QLabel
 from PyQt5.QtGui import QPixmap, QImage
+from threading import Lock
+import time
 import numpy as np
 import cv2
 
 
+# Qt >= 5.14 reads BGR data directly
+BGR_FORMAT = getattr(QImage, "Format_BGR888", None)
+
+
 class QImageLabel(QLabel):
-    """Custom QLabel with methods to display numpy arrays (opencv images)."""
+    """Custom QLabel with methods to display numpy arrays (opencv images).
+
+    Frames are resized to the label size first, on a reused buffer, and then wrapped by
+    a QImage without copies; so only the small image is converted to a QPixmap. A frame
+    that was already displayed is skipped when its id is given, arrays are never compared
+    by identity since buffers are reused for new frames.
+
+    Args:
+        qlabel: the label of the GUI where images are displayed.
+        nativeBGR: wrap BGR images with QImage.Format_BGR888 instead of converting them
+                    to RGB. It's on when the Qt version has that format (Qt >= 5.14).
+    """
 
-    def __init__(self, qlabel, *args, **kwargs):
+    def __init__(self, qlabel, nativeBGR: bool = True, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.qlabel = qlabel
+        self.nativeBGR = nativeBGR and BGR_FORMAT is not None
+        self.buffer = None
+        self.lastFrameId = None
+        self.lastSize = None
+
+    def fitSize(self, array: np.ndarray, width: int, height: int) -> tuple:
+        """Returns the (width, height) of an image scaled to fit a box, keeping its aspect ratio."""
+        h, w = array.shape[:2]
+        scale = min(width / w, height / h)
+        return max(int(w * scale), 1), max(int(h * scale), 1)
+
+    def resizeToFit(self, array: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Resizes an image to fit a box, on a reused buffer."""
+        w, h = self.fitSize(array, width, height)
+        shape = (h, w) + array.shape[2:]
+        if self.buffer is None or self.buffer.shape != shape or self.buffer.dtype != array.dtype:
+            self.buffer = np.empty(shape, dtype=array.dtype)
+        return cv2.resize(array, (w, h), dst=self.buffer, interpolation=cv2.INTER_LINEAR)
 
     def arrayToPixmap(
         self, array: np.ndarray = None, width: int = 480, height: int = 600
@@ -21,28 +56,88 @@ class QImageLabel(QLabel):
             width: scaled width
             height: scaled height
         """
-        rgb = cv2.cvtColor(array, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        bytesPerLine = ch * w
-        qimage = QImage(rgb.data, w, h, bytesPerLine, QImage.Format_RGB888)
-        qimage = qimage.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
-        qpixmap = QPixmap.fromImage(qimage)
-        return qpixmap
+        image = self.resizeToFit(array, width, height)
+        h, w = image.shape[:2]
+        if image.ndim == 2:
+            qimage = QImage(image.data, w, h, image.strides[0], QImage.Format_Grayscale8)
+        elif self.nativeBGR:
+            qimage = QImage(image.data, w, h, image.strides[0], BGR_FORMAT)
+        else:
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+            qimage = QImage(image.data, w, h, image.strides[0], QImage.Format_RGB888)
+        return QPixmap.fromImage(qimage)
 
     def setImage(
-        self, array: np.ndarray = None, scaledWidth: int = 480, scaledHeight: int = 600
+        self,
+        array: np.ndarray = None,
+        scaledWidth: int = 480,
+        scaledHeight: int = 600,
+        frameId: int = None,
     ):
         """It sets and image array over the label as QPixmap, to be displayed.
         Args:
             array: image array
             scaledWidth: scaled width
             scaledHeight: scaled height
+            frameId: id of the frame, if it's the same of the last displayed frame nothing is done.
+                None always displays the array.
         """
         try:
             if array is not None:
+                size = (scaledWidth, scaledHeight)
+                if frameId is not None and (frameId, size) == (self.lastFrameId, self.lastSize):
+                    return
                 qimage = self.arrayToPixmap(
                     array, width=scaledWidth, height=scaledHeight
                 )
                 self.qlabel.setPixmap(qimage)
+                self.lastFrameId, self.lastSize = frameId, size
         except Exception as e:
             print("--> QImageLabel:: ", e)
+
+
+class FrameNotifier(QObject):
+    """Delivers the new frame notifications of the cameras to the Qt event loop.
+
+    ``notify`` is called from the camera threads and queues a signal to the GUI thread.
+    Notifications are coalesced: while one is waiting to be delivered the others are
+    dropped, so only the latest frame is painted. Deliveries are limited to ``fps``.
+
+    Example:
+        notifier = FrameNotifier(fps=12)
+        notifier.frameReady.connect(lambda name: print("new frame of", name))
+        cameras.on("frame-available", notifier.notify)
+
+    Args:
+        fps: max deliveries per second of each camera, 0 for no limit.
+    """
+
+    notified = pyqtSignal(str)
+    frameReady = pyqtSignal(str)
+
+    def __init__(self, fps: int = 12, parent: QObject = None):
+        super().__init__(parent)
+        self.interval = 1 / fps if fps else 0
+        self.pending = set()
+        self.lastDelivery = {}
+        self.lock = Lock()
+        self.notified.connect(self.deliver)
+
+    def notify(self, name: str = "default"):
+        """Notifies a new frame of a camera, it could be called from any thread."""
+        with self.lock:
+            if name in self.pending:
+                return
+            self.pending.add(name)
+        self.notified.emit(name)
+
+    def deliver(self, name: str):
+        """Emits frameReady on the GUI thread, or waits until the interval has passed."""
+        remaining = self.lastDelivery.get(name, 0) + self.interval - time.monotonic()
+        if remaining > 0:
+            QTimer.singleShot(int(remaining * 1000) + 1, lambda: self.deliver(name))
+            return
+        with self.lock:
+            self.pending.discard(name)
+        self.lastDelivery[name] = time.monotonic()
+        self.frameReady.emit(name)